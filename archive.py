@@ -0,0 +1,408 @@
+"""
+Archive locale des tours en colonnes, partitionnée par jour et relisible en mmap sans la DB.
+
+    archive/2026-10-17/s1760700000123456789.multiplier.npy
+    archive/2026-10-17/s1760700000123456789.timestamp.npy
+    archive/2026-10-17/s1760700000123456789.prediction.npy
+
+Chaque partition (jour, heure murale comme dans RoundStore) contient des segments : un
+.npy brut float64 par colonne. Le bot ajoute un segment à chaque flush ; la compaction
+fusionne les segments d'un jour clos en un seul (préfixe « c », qui remplace les segments
+jusqu'à son numéro de génération) et la rétention supprime les jours trop anciens. La
+lecture mappe les fichiers en mémoire : un jour compacté est lu sans copie, et un scan de
+plusieurs millions de tours ne fait aucune requête DB.
+
+    python archive.py backfill --source db       # export de jetx_logs (jours clos absents)
+    python archive.py compact --retain-days 365
+    python archive.py stats
+"""
+import argparse
+import datetime
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from metrics import REGISTRY
+from rollups import GRANULARITY_SECONDS, ROLLUP_COLUMNS, SUMMARY_COLUMNS, summarize
+from round_index import N_BINS, RangeStats, hist_bins
+from round_store import COLUMNS, to_epoch, to_epochs
+
+DEFAULT_DIR = os.environ.get("ARCHIVE_DIR", "archive")
+DAY = 86400
+EPOCH = datetime.datetime(1970, 1, 1)
+
+ARCHIVE_ROUNDS = REGISTRY.counter("jetx_archive_rounds_written_total", "Tours écrits dans l'archive locale")
+
+def day_of(timestamp):
+    """Partition (AAAA-MM-JJ) d'un horodatage epoch en heure murale."""
+    return (EPOCH + datetime.timedelta(days=int(timestamp // DAY))).strftime("%Y-%m-%d")
+
+def day_start(day):
+    return (datetime.datetime.strptime(day, "%Y-%m-%d") - EPOCH).total_seconds()
+
+def from_epoch(timestamp):
+    """Inverse de to_epoch : datetime naïf en heure murale (pour les requêtes SQL)."""
+    return EPOCH + datetime.timedelta(seconds=float(timestamp))
+
+def _parse_segment(name):
+    """(préfixe, première génération, dernière génération) d'un nom de segment."""
+    kind, generations = name[0], name[1:].split("-")
+    return kind, int(generations[0]), int(generations[-1])
+
+class RoundArchive:
+    def __init__(self, path=DEFAULT_DIR):
+        self.path = path
+
+    # --- Écriture ---
+
+    def _write_segment(self, day, segment, columns):
+        directory = os.path.join(self.path, day)
+        os.makedirs(directory, exist_ok=True)
+        # Chaque colonne est écrite à côté puis renommée : un lecteur ne voit jamais de
+        # fichier tronqué, et un segment auquel il manque une colonne est ignoré
+        for col in COLUMNS:
+            final = os.path.join(directory, f"{segment}.{col}.npy")
+            with open(final + ".tmp", "wb") as f:
+                np.save(f, np.ascontiguousarray(columns[col], dtype=np.float64))
+            os.replace(final + ".tmp", final)
+
+    def append(self, multipliers, timestamps, predictions=None):
+        """Ajoute des tours (horodatages epoch) ; un segment par jour touché."""
+        multipliers = np.asarray(multipliers, dtype=np.float64)
+        timestamps = to_epochs(timestamps)
+        predictions = (np.full(len(multipliers), np.nan) if predictions is None
+                       else np.asarray(predictions, dtype=np.float64))
+        days = timestamps // DAY
+        for value in np.unique(days[~np.isnan(days)]):
+            mask = days == value
+            self._write_segment(day_of(value * DAY), f"s{time.time_ns()}",
+                                {"multiplier": multipliers[mask], "timestamp": timestamps[mask],
+                                 "prediction": predictions[mask]})
+        ARCHIVE_ROUNDS.inc(int((~np.isnan(days)).sum()))
+
+    def write_day(self, day, columns):
+        """Remplace tout le contenu d'un jour par `columns` (un seul segment compacté)."""
+        generation = time.time_ns()
+        self._write_segment(day, f"c{generation}-{generation}", columns)
+        self._remove_superseded(day)
+
+    def compact(self, day):
+        """Fusionne les segments d'un jour en un seul, trié par horodatage. Renvoie le nombre fusionné."""
+        segments = self._segments(day)
+        if len(segments) <= 1:
+            return len(segments)
+        columns = self._concat(day, segments)
+        order = np.argsort(columns["timestamp"], kind="stable")
+        last = max(_parse_segment(s)[2] for s in segments)
+        self._write_segment(day, f"c{_parse_segment(segments[0])[1]}-{last}",
+                            {col: values[order] for col, values in columns.items()})
+        self._remove_superseded(day)
+        return len(segments)
+
+    def compact_closed(self, now=None):
+        """Compacte les jours antérieurs à aujourd'hui."""
+        today = day_of(to_epoch(now or datetime.datetime.now()))
+        return {day: self.compact(day) for day in self.days() if day < today}
+
+    def apply_retention(self, retain_days, now=None):
+        """Supprime les jours de plus de `retain_days` jours ; renvoie les jours supprimés."""
+        if not retain_days:
+            return []
+        oldest = day_of(to_epoch(now or datetime.datetime.now()) - retain_days * DAY)
+        removed = [day for day in self.days() if day < oldest]
+        for day in removed:
+            shutil.rmtree(os.path.join(self.path, day), ignore_errors=True)
+        return removed
+
+    def _remove_superseded(self, day):
+        directory = os.path.join(self.path, day)
+        live = set(self._segments(day))
+        for name in os.listdir(directory):
+            if name.split(".")[0] not in live:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    # --- Lecture ---
+
+    def days(self):
+        try:
+            return sorted(d for d in os.listdir(self.path) if len(d) == 10 and d[4] == "-")
+        except FileNotFoundError:
+            return []
+
+    def _segments(self, day):
+        """Segments complets et encore valides d'un jour, dans l'ordre d'écriture."""
+        directory = os.path.join(self.path, day)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        files = {}
+        for name in names:
+            parts = name.split(".")
+            if len(parts) == 3 and parts[2] == "npy" and parts[1] in COLUMNS:
+                files.setdefault(parts[0], set()).add(parts[1])
+        complete = [s for s, cols in files.items() if len(cols) == len(COLUMNS)]
+        compacted = [s for s in complete if s[0] == "c"]
+        # Le segment compacté le plus récent remplace tout ce qui a été écrit jusqu'à sa génération
+        covered = max((_parse_segment(s)[2] for s in compacted), default=-1)
+        head = [max(compacted, key=lambda s: _parse_segment(s)[2])] if compacted else []
+        tail = sorted((s for s in complete if s[0] == "s" and _parse_segment(s)[1] > covered),
+                      key=lambda s: _parse_segment(s)[1])
+        return head + tail
+
+    def _load(self, day, segment, col):
+        return np.load(os.path.join(self.path, day, f"{segment}.{col}.npy"), mmap_mode="r")
+
+    def _concat(self, day, segments, columns=COLUMNS):
+        out = {}
+        for col in columns:
+            parts = [self._load(day, s, col) for s in segments]
+            # Un seul segment : le tableau mappé est renvoyé tel quel (pas de copie)
+            out[col] = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return out
+
+    def partition(self, day, columns=COLUMNS):
+        """Colonnes d'un jour ; mappées sans copie si le jour est compacté."""
+        segments = self._segments(day)
+        if not segments:
+            return {col: np.empty(0) for col in columns}
+        return self._concat(day, segments, columns)
+
+    def iter_partitions(self, start=None, end=None, columns=COLUMNS):
+        """(jour, colonnes) de chaque jour de [start, end) (epoch), bornes appliquées aux jours extrêmes."""
+        columns = tuple(dict.fromkeys(tuple(columns) + ("timestamp",)))
+        first = day_of(start) if start is not None else None
+        last = day_of(end) if end is not None else None
+        for day in self.days():
+            if (first and day < first) or (last and day > last):
+                continue
+            data = self.partition(day, columns)
+            ts = data["timestamp"]
+            if (first and day == first) or (last and day == last):
+                lo = np.searchsorted(ts, start, side="left") if start is not None else 0
+                hi = np.searchsorted(ts, end, side="left") if end is not None else len(ts)
+                data = {col: values[lo:hi] for col, values in data.items()}
+            if len(data["timestamp"]):
+                yield day, data
+
+    def read(self, start=None, end=None, columns=COLUMNS):
+        """Colonnes des tours de [start, end) (epoch), tous jours confondus."""
+        parts = [data for _, data in self.iter_partitions(start, end, columns)]
+        if not parts:
+            return {col: np.empty(0) for col in columns}
+        if len(parts) == 1:
+            return {col: parts[0][col] for col in columns}
+        return {col: np.concatenate([p[col] for p in parts]) for col in columns}
+
+    def range_stats(self, start, end):
+        """RangeStats des tours de [start, end) ; `truncated` si l'archive commence après `start`."""
+        stats = RangeStats.of(self.read(start, end, columns=("multiplier",))["multiplier"])
+        first = self.first_timestamp()
+        stats.truncated = first is None or first > start
+        return stats
+
+    def last_stats(self, n, end):
+        """RangeStats des `n` derniers tours antérieurs à `end` (moins si l'archive n'en a pas autant)."""
+        parts, count = [], 0
+        last_day = day_of(end)
+        for day in reversed(self.days()):
+            if count >= n:
+                break
+            if day > last_day:
+                continue
+            data = self.partition(day, ("multiplier", "timestamp"))
+            hi = int(np.searchsorted(data["timestamp"], end, side="left"))
+            parts.append(data["multiplier"][max(0, hi - (n - count)):hi])
+            count += len(parts[-1])
+        return RangeStats.of(np.concatenate(parts) if parts else np.empty(0))
+
+    def first_timestamp(self):
+        for day in self.days():
+            ts = self.partition(day, ("timestamp",))["timestamp"]
+            if len(ts):
+                return float(ts[0])
+        return None
+
+    def last_timestamp(self):
+        for day in reversed(self.days()):
+            ts = self.partition(day, ("timestamp",))["timestamp"]
+            if len(ts):
+                return float(ts.max())
+        return None
+
+    def stats(self):
+        days = self.days()
+        rounds = sum(len(self.partition(d, ("timestamp",))["timestamp"]) for d in days)
+        size = 0
+        for root, _, files in os.walk(self.path):
+            size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return {"days": len(days), "rounds": rounds, "bytes": size,
+                "first_day": days[0] if days else None, "last_day": days[-1] if days else None}
+
+def bucket_stats(timestamps, multipliers, granularity):
+    """
+    Agrégats par minute, heure ou jour d'horodatages epoch triés, au format de
+    rollups.load_rollup (mêmes colonnes, mêmes quantiles approchés) ; équivalent vectorisé
+    de rollups.aggregate pour les scans de l'archive.
+    """
+    if granularity not in GRANULARITY_SECONDS:
+        raise ValueError(f"Granularité inconnue : {granularity}")
+    if not len(multipliers):
+        return pd.DataFrame(columns=ROLLUP_COLUMNS + SUMMARY_COLUMNS)
+    x = np.asarray(multipliers, dtype=float)
+    width = GRANULARITY_SECONDS[granularity]
+    keys = np.asarray(timestamps, dtype=float) // width
+    # Horodatages triés : chaque compartiment est un bloc contigu (reduceat)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(x)]))
+    hist = np.bincount(group * N_BINS + hist_bins(x), minlength=len(starts) * N_BINS).reshape(-1, N_BINS)
+    df = pd.DataFrame({
+        "bucket": pd.to_datetime(keys[starts] * width, unit="s"),
+        "n": np.diff(np.r_[starts, len(x)]),
+        "total": np.add.reduceat(x, starts),
+        "total_sq": np.add.reduceat(x * x, starts),
+        "n_ge2": np.add.reduceat((x >= 2.0).astype(np.int64), starts),
+        "min": np.minimum.reduceat(x, starts),
+        "max": np.maximum.reduceat(x, starts),
+    })
+    return summarize(df, hist)
+
+class ArchiveWriter:
+    """
+    Tampon du bot vers l'archive : un segment tous les `flush_every` tours ou toutes les
+    `flush_interval` secondes. Au changement de jour, les jours clos sont compactés et la
+    rétention appliquée.
+    """
+
+    def __init__(self, archive, flush_every=100, flush_interval=60.0, retain_days=None, max_pending=10000):
+        self.archive = archive
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.retain_days = retain_days
+        self.max_pending = max_pending
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._day = None
+
+    def add(self, multiplier, timestamp, prediction=None):
+        self._pending.append((float(multiplier), to_epoch(timestamp), np.nan if prediction is None else prediction))
+        if len(self._pending) > self.max_pending:
+            # Disque indisponible depuis longtemps : la DB reste la référence
+            del self._pending[:len(self._pending) - self.max_pending]
+        if len(self._pending) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        multipliers, timestamps, predictions = (np.array(col, dtype=float) for col in zip(*self._pending))
+        try:
+            self.archive.append(multipliers, timestamps, predictions)
+        except OSError as e:
+            logging.warning(f"Archive : écriture impossible ({len(self._pending)} tours en attente) : {e}")
+            return
+        self._pending = []
+        day = day_of(timestamps[-1])
+        if self._day is not None and day != self._day:
+            self.maintain()
+        self._day = day
+
+    def maintain(self):
+        try:
+            compacted = {d: n for d, n in self.archive.compact_closed().items() if n > 1}
+            removed = self.archive.apply_retention(self.retain_days)
+            if compacted or removed:
+                logging.info(f"Archive : {len(compacted)} jour(s) compacté(s), {len(removed)} supprimé(s).")
+        except OSError as e:
+            logging.warning(f"Archive : maintenance impossible : {e}")
+
+    def close(self):
+        self.flush()
+
+def backfill_from_db(archive, db_url, overwrite=False, chunk=50_000):
+    """
+    Exporte jetx_logs par jour (curseur serveur, sans tout charger) ; le jour en cours,
+    encore alimenté par le bot, et les jours déjà archivés sont laissés tels quels.
+    """
+    import psycopg2
+    from persistence import normalize_db_url
+
+    today = day_of(to_epoch(datetime.datetime.now()))
+    existing = set(archive.days())
+    written = {}
+    conn = psycopg2.connect(normalize_db_url(db_url))
+    try:
+        with conn.cursor(name="archive_export") as cur:
+            cur.itersize = chunk
+            cur.execute("SELECT timestamp, multiplier, prediction FROM jetx_logs "
+                        "WHERE type='result' AND timestamp < %s ORDER BY timestamp, id", (from_epoch(day_start(today)),))
+            day, rows = None, []
+
+            def flush_day():
+                if rows and (overwrite or day not in existing):
+                    ts = to_epochs([r[0] for r in rows])
+                    archive.write_day(day, {"multiplier": np.array([r[1] for r in rows], dtype=float),
+                                            "timestamp": ts,
+                                            "prediction": np.array([r[2] for r in rows], dtype=float)})
+                    written[day] = len(rows)
+
+            for row in cur:
+                row_day = day_of(to_epoch(row[0]))
+                if row_day != day:
+                    flush_day()
+                    day, rows = row_day, []
+                rows.append(row)
+            flush_day()
+    finally:
+        conn.close()
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive locale des tours (colonnes par jour)")
+    parser.add_argument("command", choices=["backfill", "compact", "stats"])
+    parser.add_argument("--dir", default=DEFAULT_DIR)
+    parser.add_argument("--source", default="db", help="'db' ou fichier .csv/.parquet (colonnes multiplier, timestamp)")
+    parser.add_argument("--overwrite", action="store_true", help="Réécrit aussi les jours déjà archivés")
+    parser.add_argument("--retain-days", type=int, help="Supprime les jours plus anciens (compact)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    archive = RoundArchive(args.dir)
+
+    start = time.perf_counter()
+    if args.command == "backfill":
+        if args.source == "db":
+            written = backfill_from_db(archive, os.environ["DATABASE_URL"], args.overwrite)
+        else:
+            from backtest import load_rounds
+            multipliers, timestamps = load_rounds(args.source)
+            if timestamps is None:
+                parser.error("la source doit avoir une colonne timestamp")
+            written = {}
+            existing = set(archive.days())
+            valid = ~np.isnan(timestamps)
+            order = np.argsort(timestamps[valid], kind="stable")
+            multipliers, timestamps = multipliers[valid][order], timestamps[valid][order]
+            days = np.array([day_of(t) for t in timestamps])
+            for day in np.unique(days):
+                if args.overwrite or day not in existing:
+                    mask = days == day
+                    archive.write_day(day, {"multiplier": multipliers[mask], "timestamp": timestamps[mask],
+                                            "prediction": np.full(mask.sum(), np.nan)})
+                    written[day] = int(mask.sum())
+        print(f"{len(written)} jour(s), {sum(written.values())} tours exportés en {time.perf_counter() - start:.1f} s")
+    elif args.command == "compact":
+        compacted = archive.compact_closed()
+        removed = archive.apply_retention(args.retain_days)
+        print(f"{sum(1 for n in compacted.values() if n > 1)} jour(s) compacté(s), {len(removed)} supprimé(s)")
+    print(archive.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Backtest hors ligne des stratégies sur l'historique jetx_logs.
+
+Chaque prédiction est calculée comme si le bot venait de voir le tour t (statistiques
+cumulées jusqu'à t inclus) puis comparée au tour t + 1. Tout est vectorisé : une passe
+O(n) par jeu de paramètres au lieu de n appels à predict().
+
+    python backtest.py --source db
+    python backtest.py --source archive
+    python backtest.py --source rounds.csv --sweep-margin 1.0,1.5,2.0 --sweep-alpha 0.05,0.1,0.2
+    python backtest.py --synthetic 1000000 --workers 4
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from strategies import StatisticalStrategy
+
+def synthetic_rounds(n, seed=0, house_edge=0.03, start=None, interval=10.0):
+    """
+    Tours simulés selon la distribution d'un crash game : P(X >= m) = (1 - edge) / m,
+    arrondis au centième et bornés à 1.00x. Renvoie (multiplicateurs, horodatages epoch).
+    """
+    rng = np.random.default_rng(seed)
+    u = rng.random(n)
+    multipliers = np.maximum(1.0, np.floor((1 - house_edge) / (1 - u) * 100) / 100)
+    start = time.time() - n * interval if start is None else start
+    timestamps = start + np.cumsum(rng.exponential(interval, n))
+    return multipliers, timestamps
+
+def load_rounds(source):
+    """
+    Charge (multiplicateurs, horodatages epoch ou None) depuis 'db' (DATABASE_URL),
+    un dossier d'archive (archive.py, lu en mmap), un CSV/Parquet (colonnes
+    multiplier[, timestamp]) ou un .npy de multiplicateurs.
+    """
+    if source == "db":
+        import psycopg2
+        from persistence import normalize_db_url
+        conn = psycopg2.connect(normalize_db_url(os.environ["DATABASE_URL"]))
+        try:
+            df = pd.read_sql("SELECT timestamp, multiplier FROM jetx_logs WHERE type='result' ORDER BY id", conn)
+        finally:
+            conn.close()
+    elif os.path.isdir(source):
+        from archive import RoundArchive
+        columns = RoundArchive(source).read(columns=("multiplier", "timestamp"))
+        return columns["multiplier"], columns["timestamp"]
+    elif source.endswith(".npy"):
+        return np.load(source, mmap_mode="r").astype(float), None
+    elif source.endswith(".parquet"):
+        df = pd.read_parquet(source)
+    else:
+        df = pd.read_csv(source)
+    multipliers = df["multiplier"].to_numpy(dtype=float)
+    timestamps = None
+    if "timestamp" in df:
+        from round_store import to_epochs
+        timestamps = to_epochs(df["timestamp"])
+    return multipliers, timestamps
+
+def hours_of(timestamps):
+    """Heure murale (0-23) de chaque horodatage epoch, -1 si inconnu."""
+    if timestamps is None:
+        return None
+    timestamps = np.asarray(timestamps, dtype=float)
+    hours = np.full(len(timestamps), -1, dtype=np.int64)
+    valid = ~np.isnan(timestamps)
+    hours[valid] = (timestamps[valid] // 3600 % 24).astype(np.int64)
+    return hours
+
+def statistical_features(multipliers, hours=None, ema_alpha=0.1, recent_window=10):
+    """Statistiques cumulées de StatisticalStrategy à chaque tour, en une passe O(n)."""
+    series = pd.Series(multipliers, dtype=float)
+    features = {
+        "global_mean": series.expanding().mean().to_numpy(),
+        "global_std": series.expanding().std().to_numpy(),
+        "ema": series.ewm(alpha=ema_alpha).mean().to_numpy(),
+        "recent_mean": series.rolling(recent_window, min_periods=1).mean().to_numpy(),
+    }
+    hour_factor = np.ones(len(series))
+    if hours is not None:
+        # Moyenne cumulée des tours de la même heure, active dès 10 tours (comme predict())
+        grouped = series.groupby(hours)
+        hour_count = grouped.cumcount().to_numpy() + 1
+        hour_mean = grouped.cumsum().to_numpy() / hour_count
+        active = (hour_count >= 10) & (hours >= 0)
+        hour_factor[active] = hour_mean[active] / features["global_mean"][active]
+    features["hour_factor"] = hour_factor
+    return features
+
+def statistical_predictions(multipliers, hours=None, margin_factor=1.5, ema_alpha=0.1,
+                            recent_window=10, features=None):
+    """Renvoie (lower, upper, confidence, next) pour chaque tour ; NaN avant 5 tours."""
+    if features is None:
+        features = statistical_features(multipliers, hours, ema_alpha, recent_window)
+    strategy = StatisticalStrategy(margin_factor=margin_factor, ema_alpha=ema_alpha,
+                                   recent_window=recent_window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lower, upper, confidence, next_pred = strategy._combine(
+            features["global_mean"], features["global_std"], features["ema"],
+            features["recent_mean"], features["hour_factor"])
+    warmup = np.arange(len(multipliers)) < 4
+    return tuple(np.where(warmup, np.nan, values) for values in (lower, upper, confidence, next_pred))
+
+def martingale_predictions(multipliers):
+    """Version vectorisée de MartingaleStrategy.predict sur chaque préfixe."""
+    lows = pd.Series(np.asarray(multipliers) < 1.5).rolling(5, min_periods=1).sum().to_numpy()
+    cautious = lows >= 3
+    return (np.where(cautious, 1.1, 1.5), np.where(cautious, 1.4, 3.0),
+            np.where(cautious, 75.0, 40.0), np.where(cautious, 1.25, 2.1))
+
+def evaluate(multipliers, predictions):
+    """Compare la prédiction faite après le tour t au tour t + 1."""
+    lower, upper, confidence, next_pred = (np.asarray(p)[:-1] for p in predictions)
+    actual = np.asarray(multipliers, dtype=float)[1:]
+    valid = ~np.isnan(next_pred)
+    lower, upper, next_pred, actual = lower[valid], upper[valid], next_pred[valid], actual[valid]
+    if len(actual) == 0:
+        return {"rounds": 0}
+    error = next_pred - actual
+    return {
+        "rounds": int(len(actual)),
+        # Part des tours tombant dans [lower, upper]
+        "coverage": float(np.mean((actual >= lower) & (actual <= upper))),
+        "mae": float(np.mean(np.abs(error))),
+        "median_ae": float(np.median(np.abs(error))),
+        "rmse": float(np.sqrt(np.mean(error ** 2))),
+        # Le signal CASH OUT se déclenche quand le vol atteint `upper`
+        "signal_hit_rate": float(np.mean(actual >= upper)),
+        # Un cash-out à `lower` aurait été gagnant
+        "lower_hit_rate": float(np.mean(actual >= lower)),
+        "mean_width": float(np.mean(upper - lower)),
+    }
+
+# --- Balayage de paramètres (pool de processus) ---
+
+_WORKER_DATA = {}
+
+def _init_worker(multipliers, hours):
+    _WORKER_DATA["multipliers"] = multipliers
+    _WORKER_DATA["hours"] = hours
+
+def _sweep_alpha(ema_alpha, margin_factors, recent_window):
+    # Les statistiques ne dépendent que d'alpha : calculées une fois pour toutes les marges
+    multipliers, hours = _WORKER_DATA["multipliers"], _WORKER_DATA["hours"]
+    features = statistical_features(multipliers, hours, ema_alpha, recent_window)
+    results = []
+    for margin_factor in margin_factors:
+        predictions = statistical_predictions(multipliers, hours, margin_factor, ema_alpha,
+                                              recent_window, features=features)
+        results.append({"strategy": "statistical", "margin_factor": margin_factor,
+                        "ema_alpha": ema_alpha, **evaluate(multipliers, predictions)})
+    return results
+
+def sweep(multipliers, hours=None, margin_factors=(1.5,), ema_alphas=(0.1,), recent_window=10, workers=None):
+    """Évalue la grille margin_factor x ema_alpha ; un processus par valeur d'alpha."""
+    if workers == 1 or len(ema_alphas) == 1:
+        _init_worker(multipliers, hours)
+        results = [_sweep_alpha(a, margin_factors, recent_window) for a in ema_alphas]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(multipliers, hours)) as pool:
+            results = list(pool.map(_sweep_alpha, ema_alphas, itertools.repeat(margin_factors),
+                                    itertools.repeat(recent_window)))
+    return [row for rows in results for row in rows]
+
+def _floats(text):
+    return [float(v) for v in text.split(",")] if text else None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest vectorisé des stratégies JetX")
+    parser.add_argument("--source", default="db", help="'db', dossier d'archive, fichier .csv/.parquet/.npy")
+    parser.add_argument("--synthetic", type=int, help="Utilise N tours simulés au lieu de --source")
+    parser.add_argument("--strategy", choices=["statistical", "martingale", "all"], default="all")
+    parser.add_argument("--margin-factor", type=float, default=1.5)
+    parser.add_argument("--ema-alpha", type=float, default=0.1)
+    parser.add_argument("--sweep-margin", help="Liste de margin_factor, ex. 1.0,1.5,2.0")
+    parser.add_argument("--sweep-alpha", help="Liste d'alpha EMA, ex. 0.05,0.1,0.2")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.synthetic:
+        multipliers, timestamps = synthetic_rounds(args.synthetic)
+    else:
+        multipliers, timestamps = load_rounds(args.source)
+    hours = hours_of(timestamps)
+    print(f"{len(multipliers)} tours chargés en {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    rows = []
+    if args.strategy in ("statistical", "all"):
+        rows += sweep(multipliers, hours,
+                      _floats(args.sweep_margin) or [args.margin_factor],
+                      _floats(args.sweep_alpha) or [args.ema_alpha],
+                      workers=args.workers)
+    if args.strategy in ("martingale", "all"):
+        rows.append({"strategy": "martingale", **evaluate(multipliers, martingale_predictions(multipliers))})
+    print(pd.DataFrame(rows).to_string(index=False))
+    print(f"Évaluation en {time.perf_counter() - start:.2f} s")
+
+if __name__ == "__main__":
+    main()
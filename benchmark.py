@@ -0,0 +1,244 @@
+"""
+Benchmarks des chemins chauds : prédiction, ingestion des tours et persistance.
+
+Des historiques simulés (distribution crash game, voir backtest.synthetic_rounds) de 1e3
+à 1e6 tours traversent chaque étape. Le temps est mesuré sans instrumentation, puis le pic
+mémoire dans une seconde passe sous tracemalloc. Les résultats sont comparés à une
+référence enregistrée : le script sort en erreur si une étape régresse au-delà de la
+tolérance.
+
+    python benchmark.py --update-baseline          # enregistre la référence de cette machine
+    python benchmark.py                            # compare à la référence (erreur si absente)
+    python benchmark.py --sizes 1000,10000 --pg-url postgresql://localhost/jetx_bench
+"""
+import argparse
+import atexit
+import datetime
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from archive import RoundArchive, bucket_stats, day_of
+from backtest import martingale_predictions, statistical_predictions, synthetic_rounds
+from persistence import PREDICTIONS_DDL, PostgresSink, RoundWriter, SqliteSink
+from round_store import RoundStore
+from schema import ensure_schema
+from strategies import MartingaleStrategy, StatisticalStrategy, build_strategy_set
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Bornes des boucles Python par tour : au-delà, le coût par tour est déjà stable
+STREAM_ROUNDS = 10_000
+INGEST_ROUNDS = 100_000
+PERSIST_ROUNDS = 20_000
+LEGACY_CONCAT_MAX = 10_000
+
+def bench_predict_batch(x, ts):
+    # Coût d'un tour avec l'implémentation de référence (recalcul complet)
+    StatisticalStrategy().predict(x)
+
+def bench_update_stream(x, ts):
+    strategy = StatisticalStrategy()
+    strategy.reset(x, pd.to_datetime(ts, unit="s"))
+    stamps = pd.to_datetime(ts[-STREAM_ROUNDS:], unit="s")
+    for value, stamp in zip(x[-STREAM_ROUNDS:], stamps):
+        strategy.update(value, stamp)
+
+def bench_predict_many(x, ts):
+    # 16 paramétrages (4 alphas x 4 marges) en un passage groupé : à comparer à update_stream
+    specs = {f"stat_{i}": {"type": "statistical", "ema_alpha": (0.05, 0.1, 0.2, 0.3)[i // 4],
+                           "margin_factor": 1.0 + 0.25 * (i % 4)} for i in range(16)}
+    strategies = build_strategy_set(specs)
+    strategies.reset(x, pd.to_datetime(ts, unit="s"))
+    stamps = pd.to_datetime(ts[-STREAM_ROUNDS:], unit="s")
+    for value, stamp in zip(x[-STREAM_ROUNDS:], stamps):
+        strategies.predict_many(value, stamp)
+
+def bench_martingale_stream(x, ts):
+    strategy = MartingaleStrategy()
+    strategy.reset(x)
+    for value in x[-STREAM_ROUNDS:]:
+        strategy.update(value)
+
+def bench_backtest(x, ts):
+    hours = (ts // 3600 % 24).astype(np.int64)
+    statistical_predictions(x, hours)
+    martingale_predictions(x)
+
+def bench_ingest_store(x, ts):
+    store = RoundStore(2000)
+    for value, stamp in zip(x[:INGEST_ROUNDS], ts[:INGEST_ROUNDS]):
+        store.append(value, stamp, value)
+    store.multipliers.mean()
+
+def bench_ingest_store_indexed(x, ts):
+    store = RoundStore(2000, indexed=True)
+    for value, stamp in zip(x[:INGEST_ROUNDS], ts[:INGEST_ROUNDS]):
+        store.append(value, stamp, value)
+    store.index.last(10), store.index.since(3600, now=ts[:INGEST_ROUNDS][-1]), store.index.hour_of_day(12)
+
+_ARCHIVES = {}
+
+def _archive_of(x, ts):
+    # Écrite une fois par taille (hors mesure) : seule la lecture est chronométrée
+    if len(x) not in _ARCHIVES:
+        archive = RoundArchive(tempfile.mkdtemp(prefix="jetx_bench_archive_"))
+        atexit.register(shutil.rmtree, archive.path, True)
+        days = (ts // 86400).astype(np.int64)
+        bounds = np.flatnonzero(np.r_[True, days[1:] != days[:-1], True])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            archive.write_day(day_of(ts[lo]), {"multiplier": x[lo:hi], "timestamp": ts[lo:hi],
+                                               "prediction": x[lo:hi]})
+        _ARCHIVES[len(x)] = archive
+    return _ARCHIVES[len(x)]
+
+def bench_archive_scan(x, ts):
+    # Lecture mmap de toute l'archive puis agrégats horaires (graphique long terme)
+    data = _archive_of(x, ts).read(columns=("multiplier", "timestamp"))
+    bucket_stats(data["timestamp"], data["multiplier"], "hour")
+
+def bench_ingest_legacy_concat(x, ts):
+    # Ancien chemin de run() : pd.concat par tour, quadratique
+    df = pd.DataFrame()
+    for value in x[:LEGACY_CONCAT_MAX]:
+        df = pd.concat([df, pd.DataFrame([{"multiplier": value}])], ignore_index=True)
+
+def prepare_pg(pg_url):
+    """Crée jetx_logs et jetx_predictions sur la base de benchmark ; renvoie l'URL à utiliser."""
+    if "sslmode=" not in pg_url:
+        # PostgresSink imposerait TLS (production) : défaut libpq pour un Postgres local
+        pg_url += ("&" if "?" in pg_url else "?") + "sslmode=prefer"
+    conn = psycopg2.connect(pg_url)
+    try:
+        with conn, conn.cursor() as cur:
+            ensure_schema(cur)
+            cur.execute(PREDICTIONS_DDL)
+    finally:
+        conn.close()
+    return pg_url
+
+def make_bench_persist(sink_factory):
+    def bench_persist(x, ts):
+        sink = sink_factory()
+        # Fichier de secours neuf à chaque passe : un reste d'une passe précédente fausserait la mesure
+        spill_dir = tempfile.mkdtemp(prefix="jetx_bench_spill_")
+        try:
+            writer = RoundWriter(sink, spill_path=os.path.join(spill_dir, "spill.jsonl"),
+                                 queue_size=PERSIST_ROUNDS, flush_interval=0.05)
+            now = datetime.datetime.now()
+            for value in x[:PERSIST_ROUNDS]:
+                writer.submit(value, "result", value, now)
+            if not writer.flush(timeout=300):
+                raise RuntimeError("le writer n'a pas vidé sa file")
+            writer.close()
+            if writer.spilled or writer.dropped:
+                # Sinon on mesurerait l'écriture du fichier de secours, pas la DB
+                raise RuntimeError(f"{writer.spilled} lignes déversées, {writer.dropped} perdues : "
+                                   f"la DB n'a pas tout reçu")
+        finally:
+            shutil.rmtree(spill_dir, True)
+    return bench_persist
+
+def stages(pg_url=None):
+    persist_sink = (lambda: PostgresSink(pg_url)) if pg_url else (lambda: SqliteSink(":memory:"))
+    return [
+        ("predict_batch", bench_predict_batch, None),
+        ("update_stream", bench_update_stream, None),
+        ("predict_many_16", bench_predict_many, None),
+        ("martingale_stream", bench_martingale_stream, None),
+        ("backtest_vectorized", bench_backtest, None),
+        ("ingest_store", bench_ingest_store, None),
+        ("ingest_store_indexed", bench_ingest_store_indexed, None),
+        ("ingest_legacy_concat", bench_ingest_legacy_concat, LEGACY_CONCAT_MAX),
+        ("archive_scan", bench_archive_scan, None),
+        ("persist_" + ("postgres" if pg_url else "sqlite"), make_bench_persist(persist_sink), None),
+    ]
+
+def measure(func, x, ts, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(x, ts)
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    func(x, ts)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak / 1e6
+
+def run(sizes, repeat=3, pg_url=None):
+    results = {}
+    for n in sizes:
+        x, ts = synthetic_rounds(n, seed=42)
+        for name, func, max_size in stages(pg_url):
+            if max_size is not None and n > max_size:
+                continue
+            seconds, peak_mb = measure(func, x, ts, repeat)
+            key = f"{name}@{n}"
+            results[key] = {"seconds": seconds, "peak_mb": peak_mb}
+            print(f"{key:<32} {seconds * 1000:>10.2f} ms {peak_mb:>10.2f} Mo", flush=True)
+    return results
+
+def compare(results, baseline, tolerance, memory_tolerance):
+    """Renvoie la liste des régressions (étapes plus lentes ou plus gourmandes que la référence)."""
+    regressions = []
+    for key, current in results.items():
+        ref = baseline.get(key)
+        if ref is None:
+            continue
+        # Plancher de 1 ms : en dessous, le bruit de mesure domine
+        if current["seconds"] > max(ref["seconds"], 1e-3) * (1 + tolerance):
+            regressions.append(f"{key} : {current['seconds'] * 1000:.2f} ms (référence {ref['seconds'] * 1000:.2f} ms)")
+        if current["peak_mb"] > max(ref["peak_mb"], 1.0) * (1 + memory_tolerance):
+            regressions.append(f"{key} : {current['peak_mb']:.2f} Mo (référence {ref['peak_mb']:.2f} Mo)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks des chemins chauds du bot JetX")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pg-url", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="Postgres local pour la persistance (SQLite en mémoire par défaut) ; "
+                             "sslmode=prefer sauf s'il est précisé dans l'URL")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Régression de temps tolérée (0.5 = +50 %%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    pg_url = prepare_pg(args.pg_url) if args.pg_url else None
+    results = run([int(float(n)) for n in args.sizes.split(",")], args.repeat, pg_url)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Référence enregistrée dans {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"Pas de référence ({args.baseline}) : lancez d'abord avec --update-baseline")
+        return 2
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+    if regressions:
+        print("RÉGRESSIONS :")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("Aucune régression par rapport à la référence.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
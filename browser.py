@@ -0,0 +1,120 @@
+"""
+Lancement de Chrome pour le bot : profil complet ou « lean » (petite fenêtre, sans
+images, polices ni médias, services d'arrière-plan coupés) pour les petits conteneurs.
+"""
+import logging
+import os
+import signal
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service as ChromeService
+
+from metrics import process_tree, tree_memory_mb
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+# Motifs d'URL bloqués par type de ressource (Network.setBlockedURLs)
+BLOCKED_PATTERNS = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.avif"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "media": ["*.mp3", "*.mp4", "*.ogg", "*.webm", "*.wav", "*.m4a", "*.m3u8"],
+}
+
+LEAN_ARGUMENTS = [
+    "--mute-audio",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--no-first-run",
+    "--disable-features=Translate,MediaRouter,OptimizationHints",
+    # Iframes du jeu dans le processus de la page : moins de processus de rendu
+    "--disable-site-isolation-trials",
+    "--renderer-process-limit=2",
+]
+
+def chrome_options(cfg):
+    """Options Chrome depuis la section `selenium` de config.yaml."""
+    lean = cfg.get("lean", False)
+    blocked = cfg.get("block_resources", []) if lean else []
+    options = Options()
+    if cfg.get("headless", True):
+        options.add_argument("--headless=new")
+    if cfg.get("no_sandbox", True):
+        options.add_argument("--no-sandbox")
+    if cfg.get("disable_dev_shm_usage", True):
+        options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument(f"--window-size={cfg.get('window_size', '800,600' if lean else '1920,1080')}")
+    options.add_argument(f"--user-agent={USER_AGENT}")
+    if lean:
+        for argument in LEAN_ARGUMENTS:
+            options.add_argument(argument)
+        # N'attend pas les sous-ressources : la disponibilité du jeu est testée explicitement
+        options.page_load_strategy = "eager"
+    if "images" in blocked:
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
+    chrome_bin = os.environ.get("GOOGLE_CHROME_BIN", "/usr/bin/chromium")
+    if os.path.exists(chrome_bin):
+        options.binary_location = chrome_bin
+    return options
+
+def block_resources(driver, kinds, extra_patterns=()):
+    """Bloque les requêtes des types donnés (images, fonts, media) via le protocole DevTools."""
+    patterns = [p for kind in kinds for p in BLOCKED_PATTERNS.get(kind, [])] + list(extra_patterns)
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        logging.info(f"Ressources bloquées : {', '.join(kinds)} ({len(patterns)} motifs).")
+    except Exception as e:
+        logging.warning(f"Blocage des ressources impossible : {e}")
+
+def start_chrome(cfg):
+    options = chrome_options(cfg)
+    driver_path = os.environ.get("CHROMEDRIVER_PATH", "/usr/bin/chromedriver")
+    try:
+        service = ChromeService(executable_path=driver_path)
+        driver = webdriver.Chrome(service=service, options=options)
+        logging.info("Chrome démarré avec succès.")
+    except Exception as e:
+        logging.error(f"Échec Selenium : {e}")
+        try:
+            driver = webdriver.Chrome(options=options)
+        except Exception as e2:
+            logging.error(f"Échec total Selenium : {e2}")
+            raise e2
+    if cfg.get("lean", False):
+        block_resources(driver, cfg.get("block_resources", []), cfg.get("blocked_urls", []))
+    return driver
+
+def chrome_memory_mb(driver):
+    """(mémoire en Mo, nombre de processus) de chromedriver et des processus Chrome qu'il a lancés."""
+    process = getattr(getattr(driver, "service", None), "process", None)
+    if process is None:
+        return None, 0
+    return tree_memory_mb(process.pid)
+
+def kill_chrome(driver):
+    """
+    Tue chromedriver et ses processus Chrome : un appel WebDriver bloqué échoue alors
+    aussitôt au lieu d'attendre le délai du client HTTP.
+    """
+    process = getattr(getattr(driver, "service", None), "process", None)
+    # Processus déjà terminé et récupéré : son pid a pu être réattribué
+    if process is None or process.poll() is not None:
+        return 0
+    pids = process_tree(process.pid)
+    # Descendants d'abord : Chrome ne survit pas à chromedriver comme processus orphelin
+    for pid in reversed(pids):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    return len(pids)
@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from round_store import COLUMNS
+
+STATE_FILE = "state.json"
+
+def save_checkpoint(path, rounds, strategy, last_id):
+    """
+    Écrit le contenu du RoundStore (un .npy par colonne, relisible en mmap) et l'état
+    streaming de la stratégie. Les colonnes portent un numéro de génération référencé
+    par state.json, écrit en dernier : un checkpoint interrompu laisse l'ancien intact.
+    """
+    os.makedirs(path, exist_ok=True)
+    generation = time.time_ns()
+    for col in COLUMNS:
+        np.save(os.path.join(path, f"{col}.{generation}.npy"), rounds.view(col))
+    state = {
+        "version": 1,
+        "generation": generation,
+        "saved_at": time.time(),
+        "last_id": last_id,
+        "total": rounds.total,
+        "size": len(rounds),
+        "strategy": strategy.get_state(),
+        # Compartiments heure / jour de la semaine couvrant tout l'historique
+        "index": rounds.index.get_state() if rounds.index is not None else None,
+    }
+    tmp_path = os.path.join(path, STATE_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, os.path.join(path, STATE_FILE))
+
+    # Nettoyage des générations précédentes
+    for name in os.listdir(path):
+        if name.endswith(".npy") and name.split(".")[-2] != str(generation):
+            os.remove(os.path.join(path, name))
+
+def load_checkpoint(path):
+    """
+    Renvoie (state, columns) avec les colonnes mappées en mémoire, ou None si le
+    checkpoint est absent ou incohérent.
+    """
+    try:
+        with open(os.path.join(path, STATE_FILE)) as f:
+            state = json.load(f)
+        generation = state["generation"]
+        columns = {col: np.load(os.path.join(path, f"{col}.{generation}.npy"), mmap_mode="r")
+                   for col in COLUMNS}
+    except (OSError, ValueError, KeyError) as e:
+        if not isinstance(e, FileNotFoundError):
+            logging.warning(f"Checkpoint illisible ({path}) : {e}")
+        return None
+    if any(len(values) != state.get("size") for values in columns.values()):
+        logging.warning(f"Checkpoint incohérent ({path}), ignoré.")
+        return None
+    return state, columns
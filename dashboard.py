@@ -1,11 +1,9 @@
 import streamlit as st
 import os
-import psycopg2
-import pandas as pd
 import plotly.express as px
-import time
 import warnings
 from datetime import datetime
+from dashboard_data import LiveFeed, load_long_range, load_strategy_scores
 
 # Ignorer les avertissements
 warnings.filterwarnings("ignore")
@@ -26,20 +24,25 @@ st.markdown("""
 st.markdown('<div class="live-indicator">● LIVE</div>', unsafe_allow_html=True)
 st.title("🚀 JetX Predictor Pro - Dashboard")
 
-@st.cache_resource(ttl=30)
-def get_db_connection():
-    db_url = os.environ.get('DATABASE_URL')
-    if not db_url: return None
-    try: return psycopg2.connect(db_url)
-    except: return None
-
-def load_data():
-    conn = get_db_connection()
-    if not conn: return pd.DataFrame()
-    try:
-        query = "SELECT * FROM jetx_logs ORDER BY timestamp DESC LIMIT 100"
-        return pd.read_sql(query, conn)
-    except: return pd.DataFrame()
+@st.cache_resource
+def get_live_feed():
+    # Un seul cache (une connexion DB, un abonnement au flux du bot) pour toutes les sessions du process
+    return LiveFeed(os.environ.get('DATABASE_URL'), stream_url=os.environ.get('BOT_EVENTS_URL'))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def long_range_data(days):
+    # Partagé entre sessions : au plus une requête par minute et par plage
+    return load_long_range(os.environ.get('DATABASE_URL'), days)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def strategy_scores():
+    return load_strategy_scores(os.environ.get('DATABASE_URL'))
+
+@st.cache_data(max_entries=20)
+def load_image(path, mtime):
+    # Relu uniquement quand le fichier change (mtime dans la clé de cache)
+    with open(path, "rb") as f:
+        return f.read()
 
 # --- SECTION DEBUG SÉCURISÉE ---
 debug_files = ["debug_betpawa_initial.png", "debug_betpawa_login_page.png", "debug_betpawa_after_login.png", "debug_betpawa_jetx_loaded.png", "debug_betpawa.png"]
@@ -51,9 +54,7 @@ with st.expander("🔍 Voir l'état du Bot (Debug)", expanded=False):
         for i, img_path in enumerate(available_debug):
             with cols[i]:
                 try:
-                    # On ouvre le fichier en binaire pour Streamlit pour éviter les erreurs de chemin/cache
-                    with open(img_path, "rb") as f:
-                        st.image(f.read(), caption=f"Capture: {img_path}", use_container_width=True)
+                    st.image(load_image(img_path, os.path.getmtime(img_path)), caption=f"Capture: {img_path}", use_container_width=True)
                 except Exception as e:
                     st.error(f"Erreur image: {img_path}")
     else:
@@ -63,12 +64,19 @@ with st.expander("🔍 Voir l'état du Bot (Debug)", expanded=False):
 st.sidebar.header("Statut du Système")
 db_status = "✅ Connecté" if os.environ.get('DATABASE_URL') else "❌ Non configuré"
 st.sidebar.write(f"Base de données : {db_status}")
-st.sidebar.write(f"Dernier rafraîchissement : {datetime.now().strftime('%H:%M:%S')}")
 
-# Données
-df = load_data()
+# Seul ce fragment est réexécuté chaque seconde ; il lit le cache en mémoire (la DB au plus toutes les 2 s)
+@st.fragment(run_every=1)
+def live_section():
+    feed = get_live_feed()
+    source = "flux du bot" if feed.streaming else "base de données"
+    st.caption(f"Dernier rafraîchissement : {datetime.now().strftime('%H:%M:%S')} · source : {source}")
+    df = feed.refresh().head(100)
+    if df.empty:
+        st.warning("⚠️ Aucune donnée trouvée.")
+        st.info("Le bot est en cours de navigation vers JetX...")
+        return
 
-if not df.empty:
     last_prediction = df[df['prediction'].notnull()].iloc[0] if not df[df['prediction'].notnull()].empty else None
     
     st.markdown('<div class="prediction-box">', unsafe_allow_html=True)
@@ -77,6 +85,9 @@ if not df.empty:
         st.subheader("🎯 Prochaine Prédiction")
         if last_prediction is not None:
             st.markdown(f"<h1 style='color: #ff4b4b;'>{last_prediction['prediction']:.2f}x</h1>", unsafe_allow_html=True)
+            interval = feed.prediction
+            if interval and interval.get('lower') is not None and interval.get('upper') is not None:
+                st.caption(f"Intervalle : {interval['lower']:.2f}x – {interval['upper']:.2f}x")
         else: st.write("En attente...")
     with col2:
         st.subheader("📊 Dernier Résultat")
@@ -89,6 +100,17 @@ if not df.empty:
         st.write(df.iloc[0]['timestamp'].strftime("%H:%M:%S"))
     st.markdown('</div>', unsafe_allow_html=True)
 
+    # Statistiques par fenêtre (index incrémental du cache partagé)
+    stat_cols = st.columns(3)
+    for col, (label, stats) in zip(stat_cols, feed.window_stats().items()):
+        with col:
+            if stats.count:
+                st.metric(label, f"{stats.mean:.2f}x", help=f"{stats.count} tours")
+                st.caption(f"Médiane ≈ {stats.quantile(0.5):.2f}x · P90 ≈ {stats.quantile(0.9):.2f}x"
+                           + (" · ⚠️ plage incomplète (tours plus anciens hors cache et hors archive)" if stats.truncated else ""))
+            else:
+                st.metric(label, "—")
+
     # Graphique
     results_only = df[df['type'] == 'result']
     if not results_only.empty:
@@ -98,9 +120,29 @@ if not df.empty:
 
     st.subheader("📋 Derniers Tours")
     st.dataframe(df[['timestamp', 'multiplier', 'type', 'prediction']].head(20), use_container_width=True)
-else:
-    st.warning("⚠️ Aucune donnée trouvée.")
-    st.info("Le bot est en cours de navigation vers JetX...")
 
-time.sleep(3)
-st.rerun()
+live_section()
+
+# --- COMPARAISON DES STRATÉGIES (jetx_predictions) ---
+scores = strategy_scores()
+if not scores.empty:
+    st.subheader("⚖️ Comparaison des stratégies (1000 derniers tours)")
+    st.dataframe(scores, use_container_width=True, hide_index=True)
+
+# --- HISTORIQUE LONG TERME (agrégats pré-calculés) ---
+st.subheader("📅 Historique long terme")
+ranges = {"24 h": 1, "7 jours": 7, "30 jours": 30, "90 jours": 90, "Tout": None}
+range_label = st.radio("Période", list(ranges), horizontal=True, label_visibility="collapsed")
+long_df, granularity = long_range_data(ranges[range_label])
+if long_df.empty:
+    st.info("Pas encore d'agrégats pour cette période (lancez `python rollups.py`).")
+elif granularity == "raw":
+    fig = px.line(long_df, x='timestamp', y='multiplier', template="plotly_dark")
+    st.plotly_chart(fig, use_container_width=True)
+else:
+    fig = px.line(long_df, x='bucket', y=['mean', 'p50', 'p90'], template="plotly_dark",
+                  labels={'bucket': 'Heure' if granularity == 'hour' else 'Jour', 'value': 'Multiplicateur'})
+    st.plotly_chart(fig, use_container_width=True)
+    fig_share = px.bar(long_df, x='bucket', y='share_ge2', template="plotly_dark",
+                       labels={'bucket': '', 'share_ge2': 'Part des tours ≥ 2x'})
+    st.plotly_chart(fig_share, use_container_width=True)
@@ -0,0 +1,270 @@
+import collections
+import datetime
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+
+import pandas as pd
+import psycopg2
+
+from archive import DEFAULT_DIR, RoundArchive, bucket_stats
+from persistence import normalize_db_url
+from rollups import load_rollup, lttb
+from round_index import RoundIndex
+from round_store import to_epoch, to_epochs
+
+COLUMNS = ['id', 'timestamp', 'multiplier', 'type', 'prediction']
+
+def read_events(lines):
+    """Découpe un flux Server-Sent Events en (id, type, données) ; ignore les commentaires."""
+    event_id, event, data = None, "message", []
+    for raw in lines:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event_id, event, "\n".join(data)
+            event, data = "message", []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if field == "id":
+            event_id = value
+        elif field == "event":
+            event = value
+        elif field == "data":
+            data.append(value)
+
+class LiveFeed:
+    """
+    Cache des dernières lignes de jetx_logs, partagé par toutes les sessions du dashboard
+    (instancié via st.cache_resource). Une seule requête incrémentale (id > dernier id vu)
+    est faite par intervalle `min_interval`, quel que soit le nombre de spectateurs.
+
+    Avec `stream_url` (/events du bot), un thread suit le flux SSE et les tours arrivent dès
+    leur calcul, sans passer par la DB ; elle n'est relue que si le flux reste coupé plus de
+    `fallback_after` secondes.
+    """
+
+    def __init__(self, db_url, window=500, min_interval=2.0, stream_url=None, fallback_after=10.0,
+                 archive_dir=DEFAULT_DIR):
+        self.db_url = normalize_db_url(db_url) if db_url else None
+        self.window = window
+        self.min_interval = min_interval
+        self.last_id = 0
+        self.last_fetch = 0.0
+        self.queries = 0
+        self._frame = pd.DataFrame(columns=COLUMNS)
+        # Plages plus longues que le cache : complétées par l'archive locale si elle est là
+        self.archive = RoundArchive(archive_dir) if archive_dir and os.path.isdir(archive_dir) else None
+        # Statistiques par fenêtre des tours vus, mises à jour avec chaque lot
+        self.index = self._new_index()
+        self._conn = None
+        self._lock = threading.Lock()
+
+        self.stream_url = stream_url
+        self.fallback_after = fallback_after
+        self.streaming = False  # Vrai tant que le cache est alimenté par le flux du bot
+        self.prediction = None  # Dernier événement `prediction` (intervalle, confiance)
+        self._rows = collections.deque(maxlen=window)  # Tours du flux, du plus ancien au plus récent
+        self._dirty = False
+        if stream_url:
+            threading.Thread(target=self._follow_stream, name="live-stream", daemon=True).start()
+
+    def _new_index(self):
+        return RoundIndex(capacity=self.window, older=self.archive)
+
+    def _reset_stream(self):
+        with self._lock:
+            self._rows.clear()
+            self.index = self._new_index()
+            self.prediction = None
+            self._dirty = True
+
+    def _apply(self, event_id, event, data):
+        if event == "reset":
+            self._reset_stream()
+        elif event == "round":
+            seq = int(event_id.rpartition("-")[2]) if event_id else 0
+            ts = pd.to_datetime(data["timestamp"], unit="s")
+            with self._lock:
+                self._rows.append((seq, ts, data["multiplier"], "result", data["prediction"]))
+                self.index.append(data["multiplier"], data["timestamp"])
+                self._dirty = True
+        elif event == "prediction":
+            with self._lock:
+                self.prediction = data
+
+    def _follow_stream(self):
+        """Thread : suit /events, reprend après une coupure (Last-Event-ID), bascule sur la DB si elle dure."""
+        last_event_id, down_since = None, None
+        while True:
+            url, headers = self.stream_url, {"Accept": "text/event-stream"}
+            if last_event_id:
+                headers["Last-Event-ID"] = last_event_id
+            else:
+                url += ("&" if "?" in url else "?") + f"replay={self.window}"
+            try:
+                # Le bot envoie un battement toutes les 15 s : un silence plus long est une coupure
+                with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=45) as response:
+                    if last_event_id is None:
+                        self._reset_stream()
+                    self.streaming, down_since = True, None
+                    for event_id, event, data in read_events(response):
+                        self._apply(event_id, event, json.loads(data))
+                        last_event_id = event_id or last_event_id
+            except (OSError, ValueError, http.client.HTTPException) as e:
+                logging.debug(f"Dashboard : flux du bot interrompu : {e}")
+            down_since = down_since or time.monotonic()
+            if self.streaming and time.monotonic() - down_since >= self.fallback_after:
+                logging.warning("Dashboard : flux du bot indisponible, retour à la lecture DB.")
+                with self._lock:
+                    self.streaming = False
+                    self._frame = pd.DataFrame(columns=COLUMNS)
+                    self.index = self._new_index()
+                    self.last_id, self.last_fetch = 0, 0.0
+                last_event_id = None
+            time.sleep(1.0)
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(self.db_url)
+            self._conn.autocommit = True
+        return self._conn
+
+    def _fetch_new(self):
+        with self._connection().cursor() as cur:
+            if self.last_id == 0:
+                # Premier chargement : seulement la fenêtre affichée
+                cur.execute("SELECT id, timestamp, multiplier, type, prediction FROM jetx_logs "
+                            "ORDER BY id DESC LIMIT %s", (self.window,))
+                rows = cur.fetchall()[::-1]
+            else:
+                cur.execute("SELECT id, timestamp, multiplier, type, prediction FROM jetx_logs "
+                            "WHERE id > %s ORDER BY id", (self.last_id,))
+                rows = cur.fetchall()
+        self.queries += 1
+        return rows
+
+    def refresh(self):
+        """Met à jour le cache si nécessaire ; renvoie les lignes récentes, la plus récente en tête."""
+        if self.streaming:
+            with self._lock:
+                if self._dirty:
+                    self._frame = pd.DataFrame(list(reversed(self._rows)), columns=COLUMNS)
+                    self._dirty = False
+                return self._frame
+        if not self.db_url:
+            return self._frame
+        if time.monotonic() - self.last_fetch >= self.min_interval:
+            with self._lock:
+                # Une autre session a pu rafraîchir pendant l'attente du verrou
+                if time.monotonic() - self.last_fetch >= self.min_interval:
+                    try:
+                        rows = self._fetch_new()
+                        if rows:
+                            new = pd.DataFrame(rows, columns=COLUMNS)
+                            frame = new if self._frame.empty else pd.concat([self._frame.iloc[::-1], new], ignore_index=True)
+                            self._frame = frame.tail(self.window).iloc[::-1].reset_index(drop=True)
+                            self.last_id = int(new['id'].iloc[-1])
+                            results = new[new['type'] == 'result']
+                            self.index.extend(results['multiplier'].to_numpy(dtype=float),
+                                              to_epochs(results['timestamp']))
+                    except psycopg2.Error as e:
+                        logging.warning(f"Dashboard : lecture DB impossible : {e}")
+                        if self._conn is not None:
+                            self._conn.close()
+                        self._conn = None
+                    self.last_fetch = time.monotonic()
+        return self._frame
+
+    def window_stats(self):
+        """Statistiques des tours récents par fenêtre (libellé -> RangeStats)."""
+        with self._lock:
+            return {
+                "10 derniers tours": self.index.last(10),
+                "100 derniers tours": self.index.last(100),
+                "60 dernières minutes": self.index.since(3600),
+            }
+
+MAX_CHART_POINTS = 1000
+
+def load_long_range(db_url, days, archive_dir=DEFAULT_DIR):
+    """
+    Série pour le graphique long terme, bornée à ~MAX_CHART_POINTS points :
+    tours bruts sous-échantillonnés (LTTB) jusqu'à 24 h, agrégats horaires jusqu'à
+    30 jours, agrégats journaliers au-delà. Renvoie (DataFrame, granularité).
+
+    Si l'archive locale couvre la plage (ou sans DB), elle est lue en mmap à la place.
+    """
+    if archive_dir and os.path.isdir(archive_dir):
+        archive = RoundArchive(archive_dir)
+        first = archive.first_timestamp()
+        since = None if days is None else to_epoch(datetime.datetime.now()) - days * 86400
+        if first is not None and (not db_url or (since is not None and first <= since)):
+            return long_range_from_archive(archive, days, since)
+    if not db_url:
+        return pd.DataFrame(), None
+    since = None if days is None else datetime.datetime.now() - datetime.timedelta(days=days)
+    conn = psycopg2.connect(normalize_db_url(db_url))
+    try:
+        with conn.cursor() as cur:
+            if days is not None and days <= 1:
+                cur.execute("SELECT timestamp, multiplier FROM jetx_logs "
+                            "WHERE type = 'result' AND timestamp >= %s ORDER BY timestamp", (since,))
+                df = pd.DataFrame(cur.fetchall(), columns=['timestamp', 'multiplier'])
+                if len(df) > MAX_CHART_POINTS:
+                    keep = lttb(to_epochs(df['timestamp']), df['multiplier'], MAX_CHART_POINTS)
+                    df = df.iloc[keep]
+                return df, "raw"
+            granularity = "hour" if days is not None and days <= 30 else "day"
+            return load_rollup(cur, granularity, since), granularity
+    finally:
+        conn.close()
+
+def long_range_from_archive(archive, days, since=None):
+    data = archive.read(start=since, columns=("multiplier", "timestamp"))
+    multipliers, timestamps = data["multiplier"], data["timestamp"]
+    if days is not None and days <= 1:
+        keep = slice(None)
+        if len(multipliers) > MAX_CHART_POINTS:
+            keep = lttb(timestamps, multipliers, MAX_CHART_POINTS)
+        return pd.DataFrame({"timestamp": pd.to_datetime(timestamps[keep], unit="s"),
+                             "multiplier": multipliers[keep]}), "raw"
+    granularity = "hour" if days is not None and days <= 30 else "day"
+    return bucket_stats(timestamps, multipliers, granularity), granularity
+
+SCORES_SQL = """
+    SELECT p.strategy, COUNT(*) AS rounds,
+           AVG(ABS(p.prediction - r.next_mult)) AS mae,
+           AVG(CASE WHEN r.next_mult BETWEEN p.lower_bound AND p.upper_bound THEN 1.0 ELSE 0.0 END) AS coverage,
+           AVG(CASE WHEN r.next_mult >= p.upper_bound THEN 1.0 ELSE 0.0 END) AS signal_hit_rate
+    FROM (
+        SELECT id, LEAD(multiplier) OVER (ORDER BY id) AS next_mult
+        FROM (SELECT id, multiplier FROM jetx_logs WHERE type = 'result' ORDER BY id DESC LIMIT %s) last_rounds
+    ) r
+    JOIN jetx_predictions p ON p.round_id = r.id
+    WHERE r.next_mult IS NOT NULL AND p.prediction IS NOT NULL
+    GROUP BY p.strategy
+    ORDER BY mae
+"""
+
+def load_strategy_scores(db_url, rounds=1000):
+    """Compare les stratégies sur les `rounds` derniers tours (prédiction après t contre tour t + 1)."""
+    if not db_url:
+        return pd.DataFrame()
+    conn = psycopg2.connect(normalize_db_url(db_url))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCORES_SQL, (rounds + 1,))
+            return pd.DataFrame(cur.fetchall(), columns=['strategy', 'rounds', 'mae', 'coverage', 'signal_hit_rate'])
+    except psycopg2.Error as e:
+        logging.warning(f"Dashboard : comparaison des stratégies impossible : {e}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
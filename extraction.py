@@ -0,0 +1,323 @@
+import logging
+import time
+from collections import deque
+
+import numpy as np
+from selenium.webdriver.common.by import By
+
+# Lecture du multiplicateur courant et de toute la bande d'historique du document courant.
+# Le sélecteur qui a fonctionné au tick précédent est essayé en premier.
+SNAPSHOT_JS = """
+function parse(el) {
+    var text = (el.innerText || el.textContent || '').replace(/x/gi, '').trim();
+    return /^\\d+(\\.\\d+)?$/.test(text) ? parseFloat(text) : null;
+}
+function order(list, hint) {
+    var idx = [];
+    if (hint >= 0 && hint < list.length) idx.push(hint);
+    for (var i = 0; i < list.length; i++) if (i !== hint) idx.push(i);
+    return idx;
+}
+function snapshot(selectors, hints) {
+    var out = {m: null, mi: -1, h: [], hi: -1};
+    var mOrder = order(selectors.multiplier, hints.m);
+    for (var k = 0; k < mOrder.length && out.m === null; k++) {
+        var els = document.querySelectorAll(selectors.multiplier[mOrder[k]]);
+        for (var j = 0; j < els.length; j++) {
+            var v = parse(els[j]);
+            if (v !== null) { out.m = v; out.mi = mOrder[k]; break; }
+        }
+    }
+    var hOrder = order(selectors.history, hints.h);
+    for (var k = 0; k < hOrder.length && out.hi < 0; k++) {
+        var els = document.querySelectorAll(selectors.history[hOrder[k]]);
+        var values = [];
+        for (var j = 0; j < els.length; j++) {
+            var v = parse(els[j]);
+            if (v !== null) values.push(v);
+        }
+        if (values.length) { out.h = values; out.hi = hOrder[k]; }
+    }
+    return out;
+}
+"""
+
+# Un seul appel WebDriver par tick.
+EXTRACT_SCRIPT = SNAPSHOT_JS + "return snapshot(arguments[0], arguments[1]);"
+
+# Notifier in-page : un MutationObserver bufferise les changements de la bande d'historique
+# (et le franchissement du seuil de cash-out). Le script asynchrone rend la main dès qu'un
+# événement est en attente, sinon au bout de timeoutMs : un seul aller-retour par réveil.
+WATCH_SCRIPT = SNAPSHOT_JS + """
+var selectors = arguments[0], threshold = arguments[2], timeoutMs = arguments[3];
+var done = arguments[arguments.length - 1];
+var st = window.__jetxWatch, installed = false;
+if (!st) {
+    st = window.__jetxWatch = {events: [], lastSig: null, m: null, signaled: false,
+                               waiter: null, threshold: null, hints: arguments[1]};
+    st.check = function () {
+        var snap = snapshot(selectors, st.hints);
+        if (snap.mi >= 0) st.hints.m = snap.mi;
+        if (snap.hi >= 0) st.hints.h = snap.hi;
+        st.m = snap.m;
+        var sig = snap.h.join(',');
+        if (snap.h.length && sig !== st.lastSig) {
+            st.lastSig = sig;
+            st.events.push({t: Date.now(), h: snap.h});
+            if (st.events.length > 50) st.events.shift();
+        }
+        // Réarmé seulement quand le multiplicateur repasse sous le seuil (nouveau vol)
+        if (st.threshold !== null && snap.m !== null && snap.m < st.threshold) st.signaled = false;
+        if (st.threshold !== null && snap.m !== null && snap.m >= st.threshold && !st.signaled) {
+            st.signaled = true;
+            st.events.push({t: Date.now(), signal: snap.m});
+        }
+        if (st.events.length && st.waiter) { var w = st.waiter; st.waiter = null; w(); }
+    };
+    var pending = false;
+    new MutationObserver(function () {
+        // Regroupe les rafales de mutations en une seule lecture
+        if (pending) return;
+        pending = true;
+        setTimeout(function () { pending = false; st.check(); }, 0);
+    }).observe(document.body, {subtree: true, childList: true, characterData: true});
+    installed = true;
+}
+st.threshold = threshold;
+function drain() {
+    var events = st.events;
+    st.events = [];
+    done({installed: installed, m: st.m, events: events, hints: st.hints});
+}
+if (installed) st.check();
+if (st.events.length) {
+    drain();
+} else {
+    var timer = setTimeout(function () { st.waiter = null; drain(); }, timeoutMs);
+    st.waiter = function () { clearTimeout(timer); drain(); };
+}
+"""
+
+def _cents(values):
+    # Les valeurs de la page ont deux décimales ; l'historique chargé de la DB est en REAL
+    return [int(round(float(v) * 100)) for v in values]
+
+def new_round_count(stored_tail, visible):
+    """
+    Nombre de tours à la fin de la bande `visible` (du plus ancien au plus récent) qui ne
+    sont pas encore dans l'historique. KMP sur la fin de l'historique : le plus long
+    préfixe de la bande qui en est aussi un suffixe est déjà connu, le reste est nouveau.
+    Une bande retrouvée en entier dans l'historique (lecture en retard) ne donne rien.
+    Les valeurs sont comparées au centième ; O(len(stored_tail) + len(visible)).
+    """
+    pattern = _cents(visible)
+    if not pattern:
+        return 0
+    failure = [0] * len(pattern)
+    k = 0
+    for i in range(1, len(pattern)):
+        while k and pattern[i] != pattern[k]:
+            k = failure[k - 1]
+        if pattern[i] == pattern[k]:
+            k += 1
+        failure[i] = k
+    k = 0
+    for value in _cents(stored_tail):
+        if k == len(pattern):
+            return 0
+        while k and value != pattern[k]:
+            k = failure[k - 1]
+        if value == pattern[k]:
+            k += 1
+    return len(pattern) - k
+
+class DomExtractor:
+    """
+    Extraction du multiplicateur et de l'historique en un seul execute_script par tick.
+
+    Le contexte (document principal ou index d'iframe) et les sélecteurs qui ont fonctionné
+    sont mémorisés : le driver reste dans l'iframe du jeu entre deux ticks au lieu de
+    rebasculer à chaque lecture. Le balayage complet des frames n'a lieu que si le contexte
+    mémorisé ne donne plus rien.
+    """
+
+    def __init__(self, driver, selectors, report_every=100):
+        self.driver = driver
+        self.selectors = {
+            'multiplier': list(selectors.get('multiplier', [])),
+            'history': list(selectors.get('history', [])),
+        }
+        self.report_every = report_every
+        self.frame = None      # None : document principal, sinon index de l'iframe
+        self._in_frame = False  # Le driver est-il actuellement basculé dans self.frame ?
+        self._hints = {'m': -1, 'h': -1}
+        self.latencies = deque(maxlen=report_every)
+        self.last_latency = None
+        self.ticks = 0
+        self.full_scans = 0
+
+    def reset(self):
+        """Revient au document principal (après une navigation ou avant une autre action)."""
+        try:
+            self.driver.switch_to.default_content()
+        except Exception:
+            pass
+        self._in_frame = False
+
+    def _run_script(self):
+        result = self.driver.execute_script(EXTRACT_SCRIPT, self.selectors, self._hints) or {}
+        if result.get('mi', -1) >= 0:
+            self._hints['m'] = result['mi']
+        if result.get('hi', -1) >= 0:
+            self._hints['h'] = result['hi']
+        found = result.get('m') is not None or bool(result.get('h'))
+        return found, result.get('m'), [float(v) for v in result.get('h') or []]
+
+    def _enter(self, frame):
+        self.driver.switch_to.default_content()
+        if frame is not None:
+            self.driver.switch_to.frame(frame)
+        self.frame = frame
+        self._in_frame = True
+
+    def _full_scan(self):
+        """Essaie le document principal puis chaque iframe ; mémorise le premier qui répond."""
+        self.full_scans += 1
+        self._hints = {'m': -1, 'h': -1}
+        self.driver.switch_to.default_content()
+        frames = len(self.driver.find_elements(By.TAG_NAME, "iframe"))
+        for frame in [None] + list(range(frames)):
+            try:
+                self._enter(frame)
+                found, multiplier, history = self._run_script()
+                if found:
+                    logging.info(f"Extraction : contexte {'principal' if frame is None else f'iframe {frame}'} retenu.")
+                    return multiplier, history
+            except Exception:
+                continue
+        self.reset()
+        return None, []
+
+    def extract(self):
+        """Renvoie (multiplicateur courant ou None, historique visible)."""
+        start = time.perf_counter()
+        try:
+            found = False
+            if self._in_frame:
+                try:
+                    found, multiplier, history = self._run_script()
+                except Exception:
+                    found = False
+            if not found:
+                multiplier, history = self._full_scan()
+        except Exception as e:
+            logging.debug(f"Extraction échouée : {e}")
+            self.reset()
+            multiplier, history = None, []
+        self._record(time.perf_counter() - start)
+        return multiplier, history
+
+    def _record(self, latency):
+        self.last_latency = latency
+        self.latencies.append(latency)
+        self.ticks += 1
+        logging.debug(f"Extraction : {latency * 1000:.1f} ms")
+        if self.ticks % self.report_every == 0:
+            values = np.array(self.latencies) * 1000
+            logging.info(f"Latence extraction (ms) : p50={np.percentile(values, 50):.1f} "
+                         f"p95={np.percentile(values, 95):.1f} max={values.max():.1f} "
+                         f"| balayages complets : {self.full_scans}")
+
+class RoundWatcher:
+    """
+    Planificateur des lectures de la page. Utilise le notifier in-page (long-poll via
+    execute_async_script) : un tour terminé ou le franchissement du seuil de cash-out
+    réveille la boucle en moins d'une seconde, et une page calme ne coûte qu'un appel
+    par `timeout`. Si le notifier ne peut pas être installé, repli sur un polling
+    adaptatif dont l'intervalle se resserre après un changement et s'allonge au calme.
+    """
+
+    def __init__(self, extractor, notifier=True, timeout=2.0, min_interval=0.5,
+                 max_interval=3.0, retry_after=60.0):
+        self.extractor = extractor
+        self.driver = extractor.driver
+        self.use_notifier = notifier
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.retry_after = retry_after
+        self.interval = min_interval
+        self._last_history = []
+        self._failures = 0
+        self._disabled_until = 0.0
+        self._script_timeout_set = False
+        self.last_detection_latency = None
+
+    def reset(self):
+        """À appeler après une navigation : le contexte et l'observer sont à refaire."""
+        self.extractor.reset()
+        self._last_history = []
+
+    def poll(self, threshold=None):
+        """Bloque jusqu'au prochain événement utile ; renvoie (multiplicateur, historique visible)."""
+        if self.use_notifier and time.monotonic() >= self._disabled_until:
+            try:
+                return self._wait_notifier(threshold)
+            except Exception as e:
+                self._failures += 1
+                self.extractor.reset()
+                if self._failures >= 3:
+                    self._disabled_until = time.monotonic() + self.retry_after
+                    self._failures = 0
+                    logging.warning(f"Notifier in-page indisponible, polling adaptatif pendant "
+                                    f"{self.retry_after:.0f} s : {e}")
+        return self._poll_adaptive(threshold)
+
+    def _wait_notifier(self, threshold):
+        if not self.extractor._in_frame:
+            # Localise l'iframe du jeu (balayage complet) avant d'y installer l'observer
+            multiplier, history = self.extractor.extract()
+            if not history and multiplier is None:
+                raise RuntimeError("aucun élément du jeu trouvé")
+        if not self._script_timeout_set:
+            self.driver.set_script_timeout(self.timeout + 10)
+            self._script_timeout_set = True
+
+        result = self.driver.execute_async_script(
+            WATCH_SCRIPT, self.extractor.selectors, self.extractor._hints,
+            threshold, int(self.timeout * 1000))
+        if not result:
+            raise RuntimeError("réponse vide du notifier")
+        if result.get('installed'):
+            logging.info("Notifier in-page installé.")
+        self.extractor._hints.update(result.get('hints') or {})
+        self._failures = 0
+
+        multiplier = result.get('m')
+        history = self._last_history
+        for event in result.get('events') or []:
+            if 'h' in event:
+                history = [float(v) for v in event['h']]
+                # Horloge de la page et du bot sur la même machine : latence de détection
+                self.last_detection_latency = max(0.0, time.time() - event['t'] / 1000)
+                logging.debug(f"Tour détecté en {self.last_detection_latency * 1000:.0f} ms")
+            elif 'signal' in event:
+                multiplier = max(multiplier or 0.0, event['signal'])
+        if result.get('installed') and not history and multiplier is None:
+            raise RuntimeError("observer installé dans un contexte sans éléments du jeu")
+        self._last_history = history
+        return multiplier, history
+
+    def _poll_adaptive(self, threshold):
+        time.sleep(self.interval)
+        multiplier, history = self.extractor.extract()
+        changed = bool(history) and history != self._last_history
+        # Vol en cours proche du seuil de cash-out : on échantillonne au plus vite
+        near_signal = threshold and multiplier is not None and multiplier >= threshold * 0.8
+        if changed or near_signal:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        if history:
+            self._last_history = history
+        return multiplier, history
@@ -0,0 +1,192 @@
+"""
+Jeu JetX simulé en local, pour exercer l'extraction et la boucle run sans le site réel.
+
+Le serveur sert une page de login déjà « connectée », un lobby qui enveloppe le jeu dans
+une iframe (comme Betpawa) et la page du jeu, dont les éléments portent les classes des
+premiers sélecteurs `multiplier` et `history` de config.yaml. Les tours (simulés ou
+enregistrés) sont rejoués selon un calendrier fixé au démarrage, accéléré d'un facteur
+`speed` : la page le lit une fois puis s'anime seule sur l'horloge locale, et le
+calendrier sert de vérité terrain au harnais (replay_harness.py).
+
+    python game_simulator.py --speed 20 --port 8765
+"""
+import argparse
+import http.server
+import json
+import logging
+import math
+import os
+import socketserver
+import threading
+import time
+
+import numpy as np
+import yaml
+
+from backtest import load_rounds, synthetic_rounds
+
+# Croissance du multiplicateur en vol (par seconde de jeu) : ~10 s pour atteindre 2x
+GROWTH = 0.07
+
+LOGIN_PAGE = """<!doctype html><html><head><title>Betpawa (simulé)</title></head>
+<body><div class="account">Balance : 0.00 | Deposit</div>
+<a href="/casino?gameId=jetx">JetX</a></body></html>"""
+
+LOBBY_PAGE = """<!doctype html><html><head><title>Casino (simulé)</title></head>
+<body><div class="account">Balance : 0.00</div>
+<iframe id="game" src="/game" width="800" height="500"></iframe></body></html>"""
+
+GAME_PAGE = """<!doctype html><html><head><title>JetX (simulé)</title>
+<style>body { font-family: sans-serif; } .strip span { margin-right: 6px; }</style></head>
+<body>
+<div class="__MULT__">1.00x</div>
+<div class="strip" id="strip"></div>
+<script>
+var GROWTH = __GROWTH__, SPEED = __SPEED__, KEEP = __KEEP__;
+fetch('/schedule').then(function (r) { return r.json(); }).then(function (schedule) {
+    var rounds = schedule.rounds, next = 0;
+    var strip = document.getElementById('strip');
+    var mult = document.querySelector('.__MULT__');
+    function push(value) {
+        var el = document.createElement('span');
+        el.className = '__HIST__';
+        el.textContent = value.toFixed(2) + 'x';
+        strip.appendChild(el);
+        while (strip.children.length > KEEP) strip.removeChild(strip.firstChild);
+    }
+    function tick() {
+        var now = Date.now() / 1000;
+        // Tours terminés depuis le dernier tick, du plus ancien au plus récent (le plus récent à la fin)
+        while (next < rounds.length && rounds[next].crash <= now) { push(rounds[next].m); next++; }
+        if (next < rounds.length && rounds[next].takeoff <= now) {
+            var value = Math.exp(GROWTH * SPEED * (now - rounds[next].takeoff));
+            mult.textContent = Math.min(value, rounds[next].m).toFixed(2) + 'x';
+        } else if (next > 0) {
+            mult.textContent = rounds[next - 1].m.toFixed(2) + 'x';
+        }
+    }
+    tick();
+    setInterval(tick, 16);
+});
+</script>
+</body></html>"""
+
+def _class_name(selector, default):
+    """Nom de classe d'un sélecteur CSS simple (« .nom »), sinon `default`."""
+    selector = (selector or "").strip()
+    if selector.startswith(".") and selector[1:].replace("-", "").replace("_", "").isalnum():
+        return selector[1:]
+    return default
+
+def build_schedule(multipliers, speed=10.0, pause=5.0, start=None):
+    """
+    Calendrier des tours : décollage, crash (heure murale epoch, accélérée de `speed`)
+    et multiplicateur final arrondi au centième, tel qu'affiché par la page.
+    """
+    t = time.time() + 3.0 if start is None else start
+    rounds = []
+    for m in np.round(np.maximum(np.asarray(multipliers, dtype=float), 1.0), 2):
+        crash = t + math.log(m) / GROWTH / speed
+        rounds.append({"takeoff": t, "crash": crash, "m": float(m)})
+        t = crash + pause / speed
+    return rounds
+
+class GameSimulator:
+    """Serveur HTTP du jeu simulé, dans un thread ; `schedule` est la vérité terrain."""
+
+    def __init__(self, multipliers, speed=10.0, port=8765, selectors=None, pause=5.0,
+                 history_length=20, start=None):
+        selectors = selectors or {}
+        self.speed = speed
+        self.port = port
+        self.history_length = history_length
+        self.schedule = build_schedule(multipliers, speed, pause, start)
+        self.multiplier_class = _class_name((selectors.get("multiplier") or [None])[0], "multiplier-value")
+        self.history_class = _class_name((selectors.get("history") or [None])[0], "history-item")
+        self._httpd = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def end_time(self):
+        return self.schedule[-1]["crash"] if self.schedule else time.time()
+
+    def game_page(self):
+        return (GAME_PAGE.replace("__MULT__", self.multiplier_class)
+                .replace("__HIST__", self.history_class)
+                .replace("__GROWTH__", repr(GROWTH))
+                .replace("__SPEED__", repr(float(self.speed)))
+                .replace("__KEEP__", str(self.history_length)))
+
+    def _handler(self):
+        simulator = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def _reply(self, body, content_type="text/html; charset=utf-8"):
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/schedule":
+                    self._reply(json.dumps({"rounds": simulator.schedule}), "application/json")
+                elif path == "/casino":
+                    self._reply(LOBBY_PAGE)
+                elif path == "/game":
+                    self._reply(simulator.game_page())
+                else:
+                    self._reply(LOGIN_PAGE)
+
+            def log_message(self, format, *args):
+                logging.debug("simulateur: " + format % args)
+
+        return Handler
+
+    def start(self):
+        server = type("Server", (socketserver.ThreadingMixIn, http.server.HTTPServer),
+                      {"daemon_threads": True, "allow_reuse_address": True})
+        self._httpd = server(("127.0.0.1", self.port), self._handler())
+        threading.Thread(target=self._httpd.serve_forever, name="game-simulator", daemon=True).start()
+        logging.info(f"Jeu simulé sur {self.base_url} : {len(self.schedule)} tours à x{self.speed:g}, "
+                     f"fin vers {time.strftime('%H:%M:%S', time.localtime(self.end_time))}")
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+def load_selectors(config_path):
+    with open(config_path) as f:
+        return (yaml.safe_load(f) or {}).get("selectors", {})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jeu JetX simulé en local")
+    parser.add_argument("--source", help="Tours enregistrés : 'db', .csv/.parquet/.npy (simulés sinon)")
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--speed", type=float, default=10.0, help="Accélération (10 = 10x le temps réel)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    multipliers = (load_rounds(args.source)[0] if args.source else synthetic_rounds(args.rounds, args.seed)[0])
+    simulator = GameSimulator(multipliers[:args.rounds], args.speed, args.port, load_selectors(args.config)).start()
+    try:
+        while time.time() < simulator.end_time + 5:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    simulator.stop()
+
+if __name__ == "__main__":
+    main()
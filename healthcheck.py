@@ -1,19 +1,176 @@
+import collections
 import http.server
-import socketserver
+import json
+import logging
 import os
+import socketserver
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from metrics import PROFILER, REGISTRY
 
 PORT = int(os.environ.get("PORT", 8000))
+# Au-delà de cet âge du dernier tour ingéré, /ready répond 503
+READY_MAX_ROUND_AGE = float(os.environ.get("READY_MAX_ROUND_AGE", 300))
+
+LAST_ROUND_TIMESTAMP = REGISTRY.gauge(
+    "jetx_last_round_timestamp_seconds", "Horodatage epoch du dernier tour ingéré")
+REGISTRY.gauge("jetx_last_round_age_seconds", "Âge du dernier tour ingéré",
+               fn=lambda: time.time() - LAST_ROUND_TIMESTAMP.value())
+
+# Flux SSE (/events) : taille du tampon rejoué aux clients qui se reconnectent, battement (s)
+STREAM_BUFFER_SIZE = int(os.environ.get("STREAM_BUFFER_SIZE", 500))
+STREAM_HEARTBEAT = float(os.environ.get("STREAM_HEARTBEAT", 15))
+
+STREAM_EVENTS = REGISTRY.counter("jetx_stream_events_total", "Événements publiés sur /events")
+
+class EventStream:
+    """
+    Diffusion en mémoire des tours et prédictions du bot. Les `size` derniers événements
+    sont gardés pour les clients qui se reconnectent (en-tête Last-Event-ID). Les ids
+    « <démarrage>-<numéro> » changent à chaque lancement du bot : un client qui reprend
+    un id inconnu (bot relancé, trou dans le tampon) reçoit un événement `reset` puis tout
+    le tampon.
+    """
+
+    def __init__(self, size=STREAM_BUFFER_SIZE):
+        self.size = size
+        self.boot = int(time.time())
+        self.clients = 0
+        self._events = collections.deque(maxlen=size)  # (numéro, type, données JSON)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def publish(self, event, data):
+        payload = json.dumps(data, default=float)
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event, payload))
+            self._cond.notify_all()
+        STREAM_EVENTS.inc(event=event)
+
+    def reset(self):
+        """Vide le tampon (nouvelle instance du bot) ; les clients connectés reçoivent `reset`."""
+        with self._cond:
+            self.boot = max(int(time.time()), self.boot + 1)
+            self._events.clear()
+        self.publish("reset", {})
+
+    def subscribe(self, last_id=None, replay=0):
+        """
+        (reset, événements à renvoyer, numéro atteint) pour un client qui a vu `last_id`,
+        ou qui demande les `replay` derniers événements. À clore par unsubscribe().
+        """
+        with self._cond:
+            self.clients += 1
+            events, current = list(self._events), self._seq
+        if last_id is None:
+            return False, events[-replay:] if replay > 0 else [], current
+        boot, _, seq = last_id.partition("-")
+        oldest = events[0][0] if events else current + 1
+        if boot == str(self.boot) and seq.isdigit() and oldest - 1 <= int(seq) <= current:
+            return False, [e for e in events if e[0] > int(seq)], current
+        return True, events, current
+
+    def unsubscribe(self):
+        with self._cond:
+            self.clients -= 1
+
+    def wait(self, after, timeout):
+        """Événements de numéro > `after`, en attendant au plus `timeout` s qu'il y en ait."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after, timeout)
+            return [e for e in self._events if e[0] > after]
+
+    def format(self, event):
+        seq, name, payload = event
+        return f"id: {self.boot}-{seq}\nevent: {name}\ndata: {payload}\n\n".encode()
+
+EVENTS = EventStream()
+REGISTRY.gauge("jetx_stream_clients", "Clients connectés à /events", fn=lambda: EVENTS.clients)
+
+def readiness():
+    """(prêt, détail) : prêt si un tour a été ingéré il y a moins de READY_MAX_ROUND_AGE."""
+    last = LAST_ROUND_TIMESTAMP.value()
+    if last != last:  # NaN : aucun tour depuis le démarrage
+        return False, {"reason": "aucun tour ingéré"}
+    age = time.time() - last
+    return age <= READY_MAX_ROUND_AGE, {"last_round_age": round(age, 1), "max_age": READY_MAX_ROUND_AGE}
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def _reply(self, status, body, content_type="text/plain; charset=utf-8"):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
 
-class Handler(http.server.SimpleHTTPRequestHandler):
     def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/metrics":
+            self._reply(200, REGISTRY.render(), "text/plain; version=0.0.4; charset=utf-8")
+        elif url.path == "/ready":
+            ready, detail = readiness()
+            self._reply(200 if ready else 503, json.dumps({"ready": ready, **detail}), "application/json")
+        elif url.path == "/events":
+            last_id = self.headers.get("Last-Event-ID") or params.get("last_id", [None])[0]
+            self._stream(last_id, int(params.get("replay", [0])[0]))
+        elif url.path == "/profile/start":
+            interval = float(params.get("interval", [PROFILER.interval])[0])
+            started = PROFILER.start(interval)
+            self._reply(200 if started else 409, "profiling démarré\n" if started else "déjà en cours\n")
+        elif url.path == "/profile/stop":
+            path = PROFILER.stop()
+            self._reply(200, f"{path}\n" if path else "aucun profil\n")
+        else:
+            # Liveness : le process répond
+            self._reply(200, "OK")
+
+    def _stream(self, last_id, replay):
+        """Server-Sent Events : rejoue le tampon demandé puis pousse chaque nouvel événement."""
         self.send_response(200)
-        self.send_header("Content-type", "text/plain")
+        self.send_header("Content-type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        # Pas de mise en tampon par un proxy (nginx) devant le bot
+        self.send_header("X-Accel-Buffering", "no")
         self.end_headers()
-        self.wfile.write(b"OK")
+        reset, events, seq = EVENTS.subscribe(last_id, replay)
+        try:
+            self.wfile.write(b"retry: 3000\n\n")
+            if reset:
+                self.wfile.write(b"event: reset\ndata: {}\n\n")
+            while True:
+                for event in events:
+                    self.wfile.write(EVENTS.format(event))
+                if not events:
+                    # Commentaire SSE : garde la connexion ouverte et détecte les clients partis
+                    self.wfile.write(b": ping\n\n")
+                self.wfile.flush()
+                events = EVENTS.wait(seq, STREAM_HEARTBEAT)
+                seq = events[-1][0] if events else seq
+        except ConnectionError:
+            pass
+        finally:
+            EVENTS.unsubscribe()
 
     def log_message(self, format, *args):
-        return # Désactiver les logs pour ne pas polluer la console
+        logging.debug("healthcheck: " + format % args)
+
+class ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_server(port=PORT):
+    """Démarre le serveur dans un thread du process du bot et le renvoie."""
+    httpd = ThreadingServer(("", port), Handler)
+    threading.Thread(target=httpd.serve_forever, name="healthcheck", daemon=True).start()
+    logging.info(f"Métriques et health check sur le port {port} (/metrics, /ready, /events, /profile/start)")
+    return httpd
 
-print(f"Health check server started on port {PORT}")
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
-    httpd.serve_forever()
+if __name__ == "__main__":
+    print(f"Health check server started on port {PORT}")
+    with ThreadingServer(("", PORT), Handler) as httpd:
+        httpd.serve_forever()
@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import numpy as np
 import pandas as pd
@@ -8,20 +9,31 @@ import yaml
 import psycopg2
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from psycopg2.extras import RealDictCursor
 
 # Ajouter le répertoire courant au chemin de recherche Python
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
-from strategies import StatisticalStrategy, MartingaleStrategy
+from strategies import build_strategy_set
+from round_store import RoundStore, to_epoch, to_epochs
+from persistence import PREDICTIONS_DDL, PostgresSink, RoundWriter, normalize_db_url
+from checkpoint import load_checkpoint, save_checkpoint
+from extraction import DomExtractor, RoundWatcher, new_round_count
+from browser import chrome_memory_mb, kill_chrome, start_chrome
+from rollups import RollupMaintainer, hour_of_day_profile
+from schema import PartitionMaintainer, ensure_schema
+from archive import ArchiveWriter, RoundArchive, day_of, day_start, from_epoch
+from metrics import REGISTRY
+from pipeline import StageQueue
+from supervisor import Backoff, Component, Supervisor, Watchdog
+import healthcheck
 
 # Configuration du logging
 logging.basicConfig(
@@ -30,105 +42,348 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
+STAGE_SECONDS = REGISTRY.histogram(
+    "jetx_stage_seconds", "Durée des étapes de la boucle run (extract inclut l'attente du notifier)")
+DETECTION_LATENCY = REGISTRY.histogram(
+    "jetx_detection_latency_seconds", "Délai entre la fin d'un tour dans la page et sa détection")
+ROUNDS_INGESTED = REGISTRY.counter("jetx_rounds_ingested_total", "Tours ingérés")
+ROUNDS_RECOVERED = REGISTRY.counter("jetx_rounds_recovered_total",
+                                    "Tours rattrapés dans la bande d'historique (plusieurs tours par détection)")
+CHROME_RESTARTS = REGISTRY.counter("jetx_chrome_restarts_total", "Relances de Chrome (session navigateur)")
+BOT_RESTARTS = REGISTRY.counter("jetx_bot_restarts_total", "Relances complètes du bot après un crash")
+STARTUP_SECONDS = REGISTRY.gauge("jetx_startup_seconds", "Durée du dernier chargement de l'historique")
+BROWSER_READY_SECONDS = REGISTRY.gauge("jetx_browser_ready_seconds",
+                                       "Lancement du bot -> jeu lisible (Chrome, login, navigation)")
+CHROME_MEMORY_MB = REGISTRY.gauge("jetx_chrome_memory_mb", "Mémoire (PSS) de chromedriver et Chrome au démarrage")
+
+# Marqueurs d'une session connectée (comme l'ancien test sur page_source)
+LOGGED_IN_MARKERS = ["Deposit", "Balance", "Account"]
+LOGIN_STATE_JS = """
+var html = document.documentElement ? document.documentElement.outerHTML : '';
+var markers = arguments[0];
+for (var i = 0; i < markers.length; i++) if (html.indexOf(markers[i]) >= 0) return 'connected';
+if (document.querySelector("input[type='tel'], input[name='phoneNumber'], input[type='password'], iframe")) return 'form';
+return null;
+"""
+PHONE_SELECTORS = [(By.ID, "phoneNumber"), (By.NAME, "phoneNumber"), (By.CSS_SELECTOR, "input[type='tel']"),
+                   (By.XPATH, "//input[contains(@placeholder, 'number')]")]
+
 class JetXBetpawaBot:
     def __init__(self, config_path=None):
         if config_path is None:
             base_dir = os.path.dirname(os.path.abspath(__file__))
             config_path = os.path.join(base_dir, "config.yaml")
         
-        self.full_history = []
-        self.df_full = pd.DataFrame()
         self.current_prediction = {"lower": None, "upper": None, "confidence": 0, "next": None}
+        self.writer = None
+        self.driver = None
+        self.boot_started = time.perf_counter()
+        self.boot_metrics = {}
+        self.browser_starts = 0
+        self.loop_errors = 0
+        self.pending_rows = 0
+        self.checkpoint_due = False
+        self.last_read = time.monotonic()
         
         self.load_config(config_path)
         self.setup_storage()
-        self.setup_selenium()
+        self.publish_history()
+        self.setup_supervisor()
 
     def load_config(self, path):
         with open(path, 'r') as f:
             self.config = yaml.safe_load(f)
-        self.url = "https://www.betpawa.bj/login"
+        self.url = self.config.get('login_url', "https://www.betpawa.bj/login")
+        self.game_url = self.config.get('game_url', "https://www.betpawa.bj/casino?gameId=jetx")
         self.margin_factor = self.config.get('margin_factor', 1.5)
         self.selectors = self.config.get('selectors', {})
         self.auth = self.config.get('auth', {})
+        self.selenium_cfg = self.config.get('selenium', {})
+        # Captures de debug : "always", "on_failure" ou "never"
+        self.screenshots = self.selenium_cfg.get('screenshots', 'on_failure')
+        self.rounds = RoundStore(self.config.get('history_size', 2000), indexed=True)
         
+        # Stratégie principale (signal) + stratégies comparées, toutes évaluées à chaque tour
         strat_name = self.config.get('strategy', 'statistical')
-        if strat_name == 'martingale':
-            self.strategy = MartingaleStrategy()
-        else:
-            self.strategy = StatisticalStrategy(margin_factor=self.margin_factor)
+        specs = {}
+        for name, spec in (self.config.get('strategies') or {}).items():
+            specs[name] = dict(spec or {})
+        if strat_name not in specs:
+            specs = {strat_name: {}, **specs}
+        for name, spec in specs.items():
+            if spec.get('type', name) == 'statistical':
+                spec.setdefault('margin_factor', self.margin_factor)
+        self.strategy = build_strategy_set(specs, primary=strat_name)
 
     def get_db_connection(self):
         db_url = os.environ.get('DATABASE_URL')
         if not db_url:
             return None
         try:
-            if "sslmode=" not in db_url:
-                separator = "&" if "?" in db_url else "?"
-                db_url += f"{separator}sslmode=require"
-            return psycopg2.connect(db_url)
+            return psycopg2.connect(normalize_db_url(db_url))
         except Exception as e:
             logging.warning(f"Impossible de se connecter à la DB : {e}")
             return None
 
     def setup_storage(self):
         logging.info("Initialisation du stockage...")
+        start = time.perf_counter()
+        ckpt_cfg = self.config.get('checkpoint', {})
+        self.checkpoint_dir = ckpt_cfg.get('dir', 'checkpoint')
+        self.checkpoint_every = ckpt_cfg.get('every', 50)
+        self.last_id = None
+        archive_cfg = self.config.get('archive', {})
+        self.archive = RoundArchive(archive_cfg['dir']) if archive_cfg.get('dir') else None
+        # Plages de l'index qui débordent de la fenêtre en mémoire : complétées par l'archive
+        self.rounds.index.older = self.archive
+        self.archive_writer = None
+        if self.archive is not None:
+            self.archive_writer = ArchiveWriter(self.archive, flush_every=archive_cfg.get('flush_every', 100),
+                                                flush_interval=archive_cfg.get('flush_interval', 60.0),
+                                                retain_days=archive_cfg.get('retain_days'))
+        # Faux tant que l'état ne couvre pas tout jetx_logs : aucun checkpoint n'est alors écrit
+        self.history_complete = not os.environ.get('DATABASE_URL')
+        ckpt = load_checkpoint(self.checkpoint_dir) if self.checkpoint_dir else None
+        mode, fetched = "froid", 0
+
         conn = self.get_db_connection()
         if conn:
             try:
                 cur = conn.cursor()
-                cur.execute('''
-                    CREATE TABLE IF NOT EXISTS jetx_logs (
-                        id SERIAL PRIMARY KEY,
-                        timestamp TIMESTAMP,
-                        multiplier REAL,
-                        type TEXT,
-                        prediction REAL
-                    )
-                ''')
+                ensure_schema(cur, ahead=self.config.get('database', {}).get('partitions_ahead', 2))
+                cur.execute(PREDICTIONS_DDL)
                 conn.commit()
-                cur.execute("SELECT multiplier FROM jetx_logs WHERE type='result' ORDER BY timestamp ASC")
-                rows = cur.fetchall()
+                # Un checkpoint sans last_id vient d'une session sans DB : rechargement complet
+                if ckpt and ckpt[0].get('last_id') is not None and self.apply_checkpoint(ckpt):
+                    mode = "chaud"
+                    cur.execute("SELECT id, timestamp, multiplier, prediction FROM jetx_logs "
+                                "WHERE type='result' AND id > %s ORDER BY id", (self.last_id,))
+                    rows = cur.fetchall()
+                    for row_id, ts, multiplier, prediction in rows:
+                        self.strategy.update(multiplier, ts)
+                        self.rounds.append(multiplier, ts, prediction)
+                else:
+                    archived, cutoff = self.archived_history(cur)
+                    if archived is not None:
+                        # Jours clos depuis l'archive (mmap), seul le jour en cours vient de la DB
+                        mode = "archive"
+                        cur.execute("SELECT id, timestamp, multiplier, prediction FROM jetx_logs "
+                                    "WHERE type='result' AND timestamp >= %s ORDER BY id", (from_epoch(cutoff),))
+                    else:
+                        cur.execute("SELECT id, timestamp, multiplier, prediction FROM jetx_logs "
+                                    "WHERE type='result' ORDER BY id")
+                    rows = cur.fetchall()
+                    timestamps = to_epochs([row[1] for row in rows])
+                    multipliers = np.array([row[2] for row in rows], dtype=float)
+                    predictions = np.array([row[3] for row in rows], dtype=float)
+                    if archived is not None:
+                        timestamps = np.concatenate([archived['timestamp'], timestamps])
+                        multipliers = np.concatenate([archived['multiplier'], multipliers])
+                        predictions = np.concatenate([archived['prediction'], predictions])
+                        if not rows:
+                            cur.execute("SELECT MAX(id) FROM jetx_logs WHERE type='result'")
+                            self.last_id = cur.fetchone()[0]
+                    if len(multipliers):
+                        # Amorçage de l'état streaming sur tout l'historique en une passe,
+                        # le store ne garde que les `history_size` derniers tours
+                        self.strategy.reset(multipliers, pd.to_datetime(timestamps, unit='s'))
+                        self.rounds.extend(multipliers, timestamps, predictions)
+                fetched = len(rows)
                 if rows:
-                    self.full_history = [row[0] for row in rows]
-                    self.df_full = pd.DataFrame(rows, columns=['multiplier'])
+                    self.last_id = rows[-1][0]
+                # Facteur horaire sur tout l'historique agrégé (partitions supprimées comprises)
+                profile = hour_of_day_profile(cur)
+                if profile is not None:
+                    self.strategy.set_hour_stats(*profile)
+                self.history_complete = True
                 cur.close()
                 conn.close()
-                logging.info(f"PostgreSQL prêt. Historique : {len(self.full_history)} tours.")
+                logging.info(f"PostgreSQL prêt. Historique : {self.rounds.total} tours ({len(self.rounds)} en mémoire).")
             except Exception as e:
                 logging.error(f"Erreur lors de la configuration DB : {e}")
-        else:
+        elif ckpt and self.apply_checkpoint(ckpt):
+            mode = "chaud"
+        elif self.archive is not None:
+            # Sans DB : tout l'historique disponible vient de l'archive locale
+            archived = self.archive.read()
+            if len(archived['multiplier']):
+                mode = "archive"
+                self.strategy.reset(archived['multiplier'], pd.to_datetime(archived['timestamp'], unit='s'))
+                self.rounds.extend(archived['multiplier'], archived['timestamp'], archived['prediction'])
+
+        self.startup_metrics = {"seconds": time.perf_counter() - start, "mode": mode, "rows_fetched": fetched}
+        STARTUP_SECONDS.set(self.startup_metrics['seconds'])
+        logging.info(f"Démarrage {mode} en {self.startup_metrics['seconds']:.2f} s "
+                     f"({fetched} lignes lues en DB, {self.rounds.total} tours au total).")
+
+        if not os.environ.get('DATABASE_URL'):
             logging.warning("Mode sans base de données activé.")
 
-    def setup_selenium(self):
-        chrome_options = Options()
-        chrome_options.add_argument("--headless=new")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-        
-        chrome_bin = os.environ.get("GOOGLE_CHROME_BIN", "/usr/bin/chromium")
-        driver_path = os.environ.get("CHROMEDRIVER_PATH", "/usr/bin/chromedriver")
-        
-        if os.path.exists(chrome_bin):
-            chrome_options.binary_location = chrome_bin
-        
+    def start_writer(self):
+        # Le writer démarre même si la DB est injoignable : les lignes partent sur disque
+        persist_cfg = self.config.get('persistence', {})
+        sink = PostgresSink(os.environ['DATABASE_URL'])
+        # Les agrégats du dashboard sont rattrapés depuis le thread d'écriture
+        self.rollups = RollupMaintainer(sink.connection, min_interval=persist_cfg.get('rollup_interval', 60.0))
+        db_cfg = self.config.get('database', {})
+        self.partitions = PartitionMaintainer(sink.connection, ahead=db_cfg.get('partitions_ahead', 2),
+                                              retain_months=db_cfg.get('retain_months'),
+                                              min_interval=db_cfg.get('maintenance_interval', 3600.0))
+        self.writer = RoundWriter(
+            sink,
+            post_flush=self.db_maintenance,
+            spill_path=persist_cfg.get('spill_file', 'jetx_spill.jsonl'),
+            queue_size=persist_cfg.get('queue_size', 10000),
+            batch_size=persist_cfg.get('batch_size', 200),
+            flush_interval=persist_cfg.get('flush_interval', 1.0),
+        )
+
+    def db_maintenance(self):
+        # Agrégats d'abord : une partition n'est supprimée qu'une fois ses tours agrégés
+        self.rollups.maybe_update()
+        self.partitions.maybe_update()
+
+    def stop_writer(self):
+        # L'objet reste en place : save_checkpoint lit encore synced() et last_id après l'arrêt
+        if self.writer:
+            self.writer.close()
+
+    def setup_supervisor(self):
+        """
+        Composants relancés séparément (writer DB, session navigateur). Le RoundStore et
+        les stratégies restent dans le bot : une relance de Chrome ne recharge rien depuis la DB.
+        """
+        sup_cfg = self.config.get('supervisor', {})
+        self.stall_timeout = sup_cfg.get('stall_timeout', 180)
+        self.max_loop_errors = sup_cfg.get('max_loop_errors', 5)
+
+        def backoff():
+            return Backoff(sup_cfg.get('backoff_initial', 2.0), sup_cfg.get('backoff_max', 120.0))
+
+        self.supervisor = Supervisor()
+        if os.environ.get('DATABASE_URL'):
+            self.supervisor.add(Component("writer", self.start_writer, self.stop_writer,
+                                          healthy=lambda: self.writer.alive(), backoff=backoff()))
+        self.supervisor.add(Component("browser", self.start_browser, self.stop_browser,
+                                      healthy=self.check_browser, backoff=backoff()))
+        self.watchdog = Watchdog(sup_cfg.get('watchdog_timeout', 60), self.on_stall).start()
+
+    def archived_history(self, cur):
+        """
+        (colonnes, début du jour en cours) des jours clos de l'archive, si elle contient
+        autant de tours que jetx_logs avant aujourd'hui ; (None, None) sinon.
+        """
+        if self.archive is None:
+            return None, None
+        cutoff = day_start(day_of(to_epoch(datetime.datetime.now())))
+        archived = self.archive.read(end=cutoff)
+        if not len(archived['multiplier']):
+            return None, None
+        cur.execute("SELECT MIN(timestamp), COUNT(*) FROM jetx_logs WHERE type='result' AND timestamp < %s",
+                    (from_epoch(cutoff),))
+        first, count = cur.fetchone()
+        # Les partitions supprimées par la rétention DB peuvent rester dans l'archive
+        overlap = len(archived['multiplier']) if first is None else \
+            int(np.count_nonzero(archived['timestamp'] >= to_epoch(first)))
+        if count != overlap:
+            logging.info(f"Archive incomplète ({overlap} tours contre {count} en DB "
+                         f"avant aujourd'hui), chargement complet depuis la DB.")
+            return None, None
+        return archived, cutoff
+
+    def apply_checkpoint(self, ckpt):
+        state, columns = ckpt
+        if state.get('index') is None:
+            logging.info("Checkpoint sans index de statistiques, ignoré.")
+            return False
+        if not self.strategy.set_state(state['strategy']):
+            logging.info("Checkpoint calculé avec d'autres paramètres de stratégie, ignoré.")
+            return False
+        self.rounds.extend(columns['multiplier'], columns['timestamp'], columns['prediction'])
+        # Les compartiments sauvegardés couvrent tout l'historique, pas seulement la fenêtre
+        self.rounds.index.set_state(state['index'])
+        self.rounds.total = state['total']
+        self.last_id = state['last_id']
+        return True
+
+    def save_checkpoint(self):
+        """Écrit un checkpoint si l'état en mémoire correspond exactement au contenu de la DB."""
+        if not self.checkpoint_dir or not self.history_complete:
+            return False
+        if self.pending_rows:
+            # Tours déjà intégrés mais pas encore remis au writer
+            return False
+        if self.writer:
+            if not self.writer.synced():
+                return False
+            if self.writer.last_id is not None:
+                self.last_id = max(self.last_id or 0, self.writer.last_id)
         try:
-            service = ChromeService(executable_path=driver_path)
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            logging.info("Chrome démarré avec succès.")
-        except Exception as e:
-            logging.error(f"Échec Selenium : {e}")
-            try:
-                self.driver = webdriver.Chrome(options=chrome_options)
-            except Exception as e2:
-                logging.error(f"Échec total Selenium : {e2}")
-                raise e2
-            
+            save_checkpoint(self.checkpoint_dir, self.rounds, self.strategy, self.last_id)
+            return True
+        except OSError as e:
+            logging.warning(f"Écriture du checkpoint impossible : {e}")
+            return False
+
+    def setup_selenium(self):
+        start = time.perf_counter()
+        self.driver = start_chrome(self.selenium_cfg)
+        self.boot_metrics['chrome_seconds'] = time.perf_counter() - start
         self.driver.set_page_load_timeout(60)
-        self.wait = WebDriverWait(self.driver, 30)
+        self.wait = WebDriverWait(self.driver, self.selenium_cfg.get('wait_timeout', 30))
+        self.extractor = DomExtractor(self.driver, self.selectors)
+        watch_cfg = self.config.get('watcher', {})
+        self.watcher = RoundWatcher(
+            self.extractor,
+            notifier=watch_cfg.get('notifier', True),
+            timeout=watch_cfg.get('timeout', 2.0),
+            min_interval=watch_cfg.get('min_interval', 0.5),
+            max_interval=watch_cfg.get('max_interval', 3.0),
+        )
+
+    def start_browser(self):
+        """Chrome, login et navigation jusqu'au jeu ; lève une exception si le jeu reste inaccessible."""
+        started = self.boot_started if self.browser_starts == 0 else time.perf_counter()
+        if self.browser_starts:
+            CHROME_RESTARTS.inc()
+        self.browser_starts += 1
+        self.setup_selenium()
+        if not self.login():
+            raise RuntimeError("jeu inaccessible après le login")
+        self.report_startup(started)
+        self.last_read = time.monotonic()
+        self.loop_errors = 0
+
+    def stop_browser(self):
+        driver, self.driver = self.driver, None
+        if driver is None:
+            return
+        if self.watchdog.stalled:
+            kill_chrome(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        # Processus restés en place après un quit() en échec
+        kill_chrome(driver)
+
+    def check_browser(self):
+        """Test de santé de la session : lève une exception qui donne la raison de la relance."""
+        if self.watchdog.stalled:
+            raise RuntimeError("appel WebDriver bloqué")
+        if self.loop_errors >= self.max_loop_errors:
+            raise RuntimeError(f"{self.loop_errors} erreurs consécutives de la boucle")
+        idle = time.monotonic() - self.last_read
+        if idle > self.stall_timeout:
+            # Ni multiplicateur ni historique lus : page figée, session expirée ou Chrome mort
+            raise RuntimeError(f"aucune lecture du jeu depuis {idle:.0f} s")
+        return True
+
+    def on_stall(self, age):
+        """Appelé par le chien de garde : tuer Chrome débloque l'appel WebDriver en cours."""
+        if self.driver is not None:
+            killed = kill_chrome(self.driver)
+            logging.error(f"Chrome tué ({killed} processus) après {age:.0f} s sans itération de la boucle.")
 
     def inspect_page(self):
         """Analyse la page via JS pour trouver les éléments clés"""
@@ -181,13 +436,14 @@ class JetXBetpawaBot:
         logging.info(f"Navigation directe vers la page de login : {self.url}")
         try:
             self.driver.get(self.url)
-            time.sleep(12)
-            self.driver.save_screenshot("debug_betpawa_login_page.png")
+            # Attend que la page soit exploitable : session ouverte ou formulaire de login
+            state = self.wait_for(lambda d: d.execute_script(LOGIN_STATE_JS, LOGGED_IN_MARKERS), "page de login")
+            self.capture("login_page", failure=state is None)
             
             # Auto-inspection
             self.inspect_page()
             
-            if any(word in self.driver.page_source for word in ["Deposit", "Balance", "Account"]):
+            if state == 'connected':
                 logging.info("Déjà connecté.")
                 return self.navigate_to_jetx()
             
@@ -197,13 +453,9 @@ class JetXBetpawaBot:
                 self.driver.switch_to.frame(0)
                 self.inspect_page()
 
-            # Recherche dynamique du champ téléphone
-            phone_field = None
-            for by, sel in [(By.ID, "phoneNumber"), (By.NAME, "phoneNumber"), (By.CSS_SELECTOR, "input[type='tel']"), (By.XPATH, "//input[contains(@placeholder, 'number')]")]:
-                try:
-                    phone_field = self.wait.until(EC.presence_of_element_located((by, sel)))
-                    if phone_field: break
-                except: continue
+            # Recherche dynamique du champ téléphone : une seule attente pour l'ensemble des sélecteurs (et non wait_timeout par sélecteur)
+            phone_field = self.wait_for(EC.any_of(*[EC.presence_of_element_located(loc) for loc in PHONE_SELECTORS]),
+                                        "champ téléphone")
             
             if phone_field:
                 self.human_type(phone_field, self.auth['phone'])
@@ -233,110 +485,293 @@ class JetXBetpawaBot:
                 if pin_field: pin_field.send_keys(Keys.ENTER)
 
             self.driver.switch_to.default_content()
-            time.sleep(12)
-            self.driver.save_screenshot("debug_betpawa_after_login.png")
+            connected = self.wait_for(
+                lambda d: d.execute_script(LOGIN_STATE_JS, LOGGED_IN_MARKERS) == 'connected', "connexion")
+            self.capture("after_login", failure=not connected)
 
             return self.navigate_to_jetx()
         except Exception as e:
             logging.error(f"Erreur critique login : {e}")
             self.driver.switch_to.default_content()
+            self.capture("login_error", failure=True)
             return False
 
     def navigate_to_jetx(self):
         logging.info("Accès JetX...")
         try:
-            self.driver.get("https://www.betpawa.bj/casino?gameId=jetx")
-            time.sleep(15)
+            self.watcher.reset()
+            self.driver.get(self.game_url)
             self.inspect_page()
-            self.driver.save_screenshot("debug_betpawa_jetx_loaded.png")
-            return True
-        except:
+            # Prêt quand l'extracteur lit le multiplicateur ou l'historique (il localise l'iframe du jeu)
+            ready = self.wait_for(lambda d: any(v for v in self.extractor.extract()),
+                                  "iframe du jeu", timeout=self.selenium_cfg.get('game_ready_timeout', 60))
+            self.capture("jetx_loaded", failure=not ready)
+            return bool(ready)
+        except Exception as e:
+            logging.warning(f"Accès JetX impossible : {e}")
+            self.capture("jetx_loaded", failure=True)
             return False
 
-    def log_data(self, multiplier, data_type="live", prediction=None):
-        conn = self.get_db_connection()
-        if not conn: return datetime.datetime.now()
+    def wait_for(self, condition, what, timeout=None, poll=0.25):
+        """Attend que `condition(driver)` soit vraie ; renvoie sa valeur, ou None au bout du délai."""
+        timeout = self.selenium_cfg.get('wait_timeout', 30) if timeout is None else timeout
+        start = time.perf_counter()
         try:
-            cur = conn.cursor()
-            now = datetime.datetime.now()
-            cur.execute('INSERT INTO jetx_logs (timestamp, multiplier, type, prediction) VALUES (%s, %s, %s, %s)', 
-                               (now, multiplier, data_type, prediction))
-            conn.commit()
-            cur.close()
-            conn.close()
-            return now
-        except: return datetime.datetime.now()
+            result = WebDriverWait(self.driver, timeout, poll_frequency=poll).until(condition)
+            logging.info(f"{what} prêt(e) en {time.perf_counter() - start:.1f} s.")
+            return result
+        except TimeoutException:
+            logging.warning(f"{what} : rien après {timeout} s.")
+            return None
 
-    def extract_multiplier(self):
+    def capture(self, name, failure=False):
+        """Capture d'écran de debug : systématique, ou seulement en cas d'échec (défaut)."""
+        if self.screenshots == 'never' or (self.screenshots == 'on_failure' and not failure):
+            return
         try:
-            if len(self.driver.find_elements(By.TAG_NAME, "iframe")) > 0:
-                self.driver.switch_to.frame(0)
-            
-            val = None
-            for selector in self.selectors.get('multiplier', []):
-                elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                for el in elements:
-                    text = el.text.replace('x', '').strip()
-                    if text and text.replace('.', '').isdigit():
-                        val = float(text)
-                        break
-                if val: break
-            
-            self.driver.switch_to.default_content()
-            return val
-        except: 
-            self.driver.switch_to.default_content()
-            return None
+            self.driver.save_screenshot(f"debug_betpawa_{name}.png")
+        except Exception as e:
+            logging.debug(f"Capture {name} impossible : {e}")
+
+    def report_startup(self, started):
+        """Durées de démarrage et mémoire de Chrome une fois le jeu atteint (logs et /metrics)."""
+        self.boot_metrics['ready_seconds'] = time.perf_counter() - started
+        memory, processes = chrome_memory_mb(self.driver)
+        BROWSER_READY_SECONDS.set(self.boot_metrics['ready_seconds'])
+        if memory is not None:
+            self.boot_metrics['chrome_memory_mb'] = memory
+            CHROME_MEMORY_MB.set(memory)
+        logging.info(f"Démarrage : historique {self.startup_metrics['seconds']:.1f} s, "
+                     f"Chrome {self.boot_metrics.get('chrome_seconds', 0):.1f} s, "
+                     f"jeu lisible après {self.boot_metrics['ready_seconds']:.1f} s | "
+                     f"mémoire Chrome : {f'{memory:.0f} Mo' if memory is not None else 'inconnue'} "
+                     f"({processes} processus)")
+
+    def close(self):
+        self.watchdog.stop()
+        # Navigateur puis writer (ordre inverse du démarrage) ; le writer vide sa file en s'arrêtant
+        self.supervisor.stop_all()
+        if self.archive_writer:
+            self.archive_writer.close()
+        self.save_checkpoint()
+
+    def extract_multiplier(self):
+        return self.extractor.extract()[0]
 
     def extract_history(self):
-        try:
-            if len(self.driver.find_elements(By.TAG_NAME, "iframe")) > 0:
-                self.driver.switch_to.frame(0)
-            history = []
-            for selector in self.selectors.get('history', []):
-                elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                if elements:
-                    for el in elements:
-                        try:
-                            val = float(el.text.replace('x', '').strip())
-                            history.append(val)
-                        except: continue
-                    if history: break
-            self.driver.switch_to.default_content()
-            return history
-        except: 
-            self.driver.switch_to.default_content()
-            return []
+        return self.extractor.extract()[1]
+
+    def publish_history(self):
+        """Amorce le tampon de /events avec l'historique chargé : un client voit d'emblée la fenêtre récente."""
+        events = healthcheck.EVENTS
+        events.reset()
+        n = min(len(self.rounds), events.size - 1)
+        for value, ts, prediction in zip(self.rounds.tail(n), self.rounds.tail(n, 'timestamp'),
+                                         self.rounds.tail(n, 'prediction')):
+            events.publish("round", {"timestamp": ts, "multiplier": value,
+                                     "prediction": None if np.isnan(prediction) else prediction})
+
+    def publish_rounds(self, new_rounds, round_ts, next_p):
+        """Pousse les tours et la prédiction aux clients de /events, avant toute écriture DB."""
+        events = healthcheck.EVENTS
+        ts = to_epoch(round_ts)
+        for i, value in enumerate(new_rounds):
+            events.publish("round", {"timestamp": ts, "multiplier": value,
+                                     "prediction": next_p if i == len(new_rounds) - 1 else None})
+        events.publish("prediction", {"timestamp": ts, **self.current_prediction})
+
+    def ingest(self, new_rounds, aligned=True, latency=None):
+        """
+        Intègre d'un bloc les tours détectés dans la bande d'historique (du plus ancien au
+        plus récent) : une mise à jour des stratégies. Renvoie les lignes à persister.
+        """
+        n = len(new_rounds)
+        round_ts = datetime.datetime.now()
+        if latency is not None:
+            DETECTION_LATENCY.observe(latency)
+        if n > 1:
+            ROUNDS_RECOVERED.inc(n - 1)
+            logging.info(f"{n} tours détectés d'un coup (tick lent ou reconnexion).")
+        if not aligned and len(self.rounds):
+            logging.warning("Bande d'historique sans recouvrement avec l'historique : "
+                            "des tours plus anciens que la bande ont pu être manqués.")
+        with STAGE_SECONDS.time(stage="predict"):
+            # Seul le dernier tour porte une prédiction : les intermédiaires n'ont pas été vus en direct
+            self.rounds.extend(new_rounds, [round_ts] * n)
+            lower, upper, conf, next_p = self.strategy.update_many(new_rounds, round_ts)
+            self.rounds.set_last_prediction(next_p)
+        self.current_prediction = {"lower": lower, "upper": upper, "confidence": conf, "next": next_p}
+        self.publish_rounds(new_rounds, round_ts, next_p)
+        rows = [(value, "result", None, round_ts, None) for value in new_rounds[:-1]]
+        rows.append((new_rounds[-1], "result", next_p, round_ts, self.strategy.last_predictions))
+        ROUNDS_INGESTED.inc(n)
+        healthcheck.LAST_ROUND_TIMESTAMP.set(time.time())
+        for value in new_rounds[:-1]:
+            logging.info(f"[{round_ts}] TOUR : {value}x (rattrapé)")
+        # next_p est None tant que la stratégie manque d'historique
+        logging.info(f"[{round_ts}] TOUR : {new_rounds[-1]}x | PROCHAIN : "
+                     f"{f'{next_p:.2f}x' if next_p is not None else '—'}")
+
+        def crossed(every):
+            # Le lot a-t-il franchi un multiple de `every` tours ?
+            return every and self.rounds.total // every != (self.rounds.total - n) // every
+
+        if crossed(50):
+            if self.writer:
+                logging.info(f"Writer DB : {self.writer.stats()}")
+            index = self.rounds.index
+            logging.info(f"10 derniers tours : {index.last(10)} | dernière heure : {index.since(3600)} | "
+                         f"même heure : {index.hour_of_day(round_ts.hour)}")
+        if crossed(self.checkpoint_every):
+            # Écrit par l'étape de persistance, une fois ces lignes remises au writer
+            self.checkpoint_due = True
+        return rows
+
+    def persist(self, rows):
+        """Remet les lignes au writer DB (non bloquant) et à l'archive locale (écriture disque)."""
+        if self.writer:
+            self.writer.submit_many(rows)
+        if self.archive_writer:
+            for value, _, prediction, round_ts, _ in rows:
+                self.archive_writer.add(value, round_ts, prediction)
 
     def run(self):
-        self.login()
+        if not self.supervisor.start_all():
+            return
         logging.info("Surveillance active...")
+        asyncio.run(self.run_pipeline())
+
+    async def run_pipeline(self):
+        """
+        Étapes concurrentes reliées par des files bornées : la lecture de la page ne dépend
+        ni de la DB ni du calcul des prédictions.
+
+        - lecture (thread « browser », seul à parler à Selenium) -> bandes d'historique
+          (drop_oldest : la plus récente contient les précédentes) et multiplicateurs en vol
+          (drop_oldest) ;
+        - prédiction (boucle asyncio) -> lots de lignes (block : contre-pression sur la
+          prédiction, jamais sur la lecture) ;
+        - persistance (thread « io » pour l'archive ; le writer DB a son propre thread) ;
+        - signal de cash-out ;
+        - supervision du writer DB (thread « supervisor ») : son backoff ne bloque pas la lecture.
+        """
+        pipe_cfg = self.config.get('pipeline', {})
+        self.strips = StageQueue("strips", pipe_cfg.get('strips_queue', 8), "drop_oldest")
+        self.persist_queue = StageQueue("persist", pipe_cfg.get('persist_queue', 256), "block")
+        self.signals = StageQueue("signals", pipe_cfg.get('signal_queue', 32), "drop_oldest")
+        browser = ThreadPoolExecutor(1, thread_name_prefix="browser")
+        io = ThreadPoolExecutor(1, thread_name_prefix="io")
+        supervision = ThreadPoolExecutor(1, thread_name_prefix="supervisor")
+        tasks = [asyncio.create_task(self.scrape_stage(browser), name="scrape"),
+                 asyncio.create_task(self.predict_stage(), name="predict"),
+                 asyncio.create_task(self.persist_stage(io), name="persist"),
+                 asyncio.create_task(self.signal_stage(), name="signal"),
+                 asyncio.create_task(self.supervise_stage(supervision), name="supervise")]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Un appel Selenium en cours n'est pas attendu : close() arrête Chrome
+            browser.shutdown(wait=False, cancel_futures=True)
+            supervision.shutdown(wait=False, cancel_futures=True)
+            io.shutdown(wait=True)
+            # Les lots déjà prédits sont remis au writer avant l'arrêt
+            for rows in self.persist_queue.drain():
+                self.persist(rows)
+                self.pending_rows -= len(rows)
+
+    async def scrape_stage(self, executor):
+        loop = asyncio.get_running_loop()
+        last_strip = None
         while True:
+            # Relance ciblée du navigateur ; le chien de garde ne surveille pas le login
+            self.watchdog.disarm()
+            await loop.run_in_executor(executor, self.supervisor.check, ["browser"])
+            self.watchdog.arm()
             try:
-                visual_history = self.extract_history()
-                if visual_history and (not self.full_history or visual_history[-1] != self.full_history[-1]):
-                    new_result = visual_history[-1]
-                    self.full_history.append(new_result)
-                    new_row = pd.DataFrame([{'multiplier': new_result}])
-                    self.df_full = pd.concat([self.df_full, new_row], ignore_index=True)
-                    lower, upper, conf, next_p = self.strategy.predict(self.full_history, self.df_full)
-                    self.current_prediction = {"lower": lower, "upper": upper, "confidence": conf, "next": next_p}
-                    ts = self.log_data(new_result, "result", next_p)
-                    logging.info(f"[{ts}] TOUR : {new_result}x | PROCHAIN : {next_p:.2f}x")
-                
-                current_val = self.extract_multiplier()
+                # Attend le prochain événement de la page (notifier) ou le prochain tick adaptatif
+                with STAGE_SECONDS.time(stage="extract"):
+                    current_val, visual_history = await loop.run_in_executor(
+                        executor, self.watcher.poll, self.current_prediction['upper'])
+                if current_val is not None or visual_history:
+                    self.last_read = time.monotonic()
                 if current_val is not None:
-                    if self.current_prediction['upper'] and current_val >= self.current_prediction['upper']:
-                        logging.info(f"SIGNAL: CASH OUT! {current_val}x")
+                    await self.signals.put(current_val)
+                if visual_history and visual_history != last_strip:
+                    last_strip = list(visual_history)
+                    await self.strips.put((last_strip, self.watcher.last_detection_latency))
+                self.loop_errors = 0
             except Exception as e:
+                self.loop_errors += 1
                 logging.warning(f"Boucle : {e}")
-            time.sleep(3)
+                await asyncio.sleep(1)
+
+    async def supervise_stage(self, executor, interval=5.0):
+        """Test de santé et relance du writer DB, hors du thread « browser »."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            await loop.run_in_executor(executor, self.supervisor.check, ["writer"])
+
+    async def predict_stage(self):
+        while True:
+            strip, latency = await self.strips.get()
+            try:
+                # Bande entière alignée sur la fin de l'historique : tours manqués et doublons (1.00x, 1.00x) compris
+                count = new_round_count(self.rounds.tail(2 * len(strip)), strip)
+                if count:
+                    rows = self.ingest(strip[-count:], aligned=count < len(strip), latency=latency)
+                    self.pending_rows += len(rows)
+                    await self.persist_queue.put(rows)
+            except Exception as e:
+                logging.warning(f"Prédiction : {e}")
+            finally:
+                self.strips.task_done()
+
+    async def persist_stage(self, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            rows = await self.persist_queue.get()
+            try:
+                with STAGE_SECONDS.time(stage="persist"):
+                    await loop.run_in_executor(executor, self.persist, rows)
+                self.pending_rows -= len(rows)
+                if self.checkpoint_due:
+                    if self.writer:
+                        # Le writer regroupe les lignes (flush_interval) : synced() n'est vrai qu'après leur écriture
+                        await loop.run_in_executor(executor, self.writer.flush)
+                    if self.save_checkpoint():
+                        self.checkpoint_due = False
+            except Exception as e:
+                logging.warning(f"Persistance : {e}")
+            finally:
+                self.persist_queue.task_done()
+
+    async def signal_stage(self):
+        while True:
+            value = await self.signals.get()
+            upper = self.current_prediction['upper']
+            if upper and value >= upper:
+                logging.info(f"SIGNAL: CASH OUT! {value}x")
+            self.signals.task_done()
 
 if __name__ == "__main__":
+    # Métriques, readiness et profilage à la demande (le port PORT est pris par Streamlit)
+    healthcheck.start_server(int(os.environ.get("METRICS_PORT", 9100)))
+    # Dernier recours : les pannes du navigateur et du writer sont gérées par le superviseur du bot
+    backoff = Backoff(initial=20.0, maximum=300.0)
     while True:
+        bot = None
         try:
             bot = JetXBetpawaBot()
+            backoff.started()
             bot.run()
         except Exception as e:
             logging.error(f"Crash : {e}")
-            time.sleep(20)
+        finally:
+            # Vide la file d'écriture (DB ou fichier de secours) avant de relancer
+            if bot:
+                bot.close()
+        BOT_RESTARTS.inc()
+        time.sleep(backoff.next_delay())
@@ -0,0 +1,275 @@
+"""
+Métriques au format texte Prometheus et profileur par échantillonnage, sans dépendance.
+
+Les métriques sont déclarées au niveau module par le code qui les alimente
+(p. ex. persistence.DB_FLUSH_SECONDS) et exposées par healthcheck.py sur /metrics.
+"""
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation):
+        super().__init__(name, documentation)
+        self._values = collections.defaultdict(float)
+
+    def inc(self, amount=1.0, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items()) or [((), 0.0)]
+        return [f"{self.name}{_format_labels(labels)} {value}" for labels, value in items]
+
+class Gauge(_Metric):
+    """Jauge fixée par set() (une série par jeu de labels), ou calculée à la lecture si `fn` est fourni."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, fn=None):
+        super().__init__(name, documentation)
+        self.fn = fn
+        self._values = {}
+
+    def set(self, value, **labels):
+        self._values[tuple(sorted(labels.items()))] = float(value)
+
+    def value(self, **labels):
+        if self.fn is not None:
+            try:
+                return float(self.fn())
+            except Exception:
+                return float("nan")
+        return self._values.get(tuple(sorted(labels.items())), float("nan"))
+
+    def samples(self):
+        if self.fn is not None or not self._values:
+            return [f"{self.name} {self.value()}"]
+        return [f"{self.name}{_format_labels(labels)} {value}" for labels, value in list(self._values.items())]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            items = [(k, (list(c), s, n)) for k, (c, s, n) in self._series.items()]
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            # Idempotent : un module rechargé (ou un bot recréé) retrouve la même métrique
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation):
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name, documentation, fn=None):
+        gauge = self._register(Gauge(name, documentation))
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines += metric.header()
+            lines += metric.samples()
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+class SamplingProfiler:
+    """
+    Profileur par échantillonnage : toutes les `interval` secondes, relève la pile de chaque
+    thread (sys._current_frames) et compte les piles identiques. Le résultat est écrit au
+    format « collapsed stacks » (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, output_dir="profiles", interval=0.01, max_seconds=300.0):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._thread = None
+        self._stop = threading.Event()
+        self._stacks = collections.Counter()
+        self._lock = threading.Lock()
+        self.last_path = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        with self._lock:
+            if self.running:
+                return False
+            self.interval = interval or self.interval
+            self._stacks = collections.Counter()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """Arrête l'échantillonnage et renvoie le chemin du fichier de trace."""
+        with self._lock:
+            if self._thread is None:
+                return self.last_path
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            return self.last_path
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            names.update((t.ident, t.name) for t in threading.enumerate())
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+        self._write()
+
+    def _write(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.txt")
+        with open(path, "w") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.last_path = path
+
+PROFILER = SamplingProfiler()
+
+# --- Processus (Linux, /proc) : mémoire de Chrome et de ses descendants ---
+
+def process_tree(root_pid):
+    """Le processus `root_pid` et tous ses descendants."""
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # Le nom de commande peut contenir des espaces : on découpe après ')'
+                fields = f.read().rsplit(")", 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(name))
+        except (OSError, IndexError):
+            continue
+    pids, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+def process_memory_mb(pid):
+    """PSS du processus (la mémoire partagée entre processus Chrome n'est comptée qu'une fois), RSS à défaut."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def tree_memory_mb(root_pid):
+    """(mémoire totale en Mo, nombre de processus) de l'arbre de `root_pid`."""
+    total, count = 0.0, 0
+    for pid in process_tree(root_pid):
+        try:
+            total += process_memory_mb(pid)
+            count += 1
+        except (OSError, ValueError, IndexError):
+            continue
+    return total, count
@@ -0,0 +1,443 @@
+import datetime
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions, pool
+from psycopg2.extras import execute_values
+
+from metrics import REGISTRY
+
+INSERT_SQL = "INSERT INTO jetx_logs (timestamp, multiplier, type, prediction) VALUES %s RETURNING id"
+INSERT_PREDICTIONS_SQL = ("INSERT INTO jetx_predictions (round_id, strategy, lower_bound, upper_bound, "
+                          "confidence, prediction) VALUES %s")
+
+# Prédictions par stratégie, émises après le tour round_id (pour le tour suivant)
+PREDICTIONS_DDL = '''
+    CREATE TABLE IF NOT EXISTS jetx_predictions (
+        round_id INTEGER NOT NULL,
+        strategy TEXT NOT NULL,
+        lower_bound REAL,
+        upper_bound REAL,
+        confidence REAL,
+        prediction REAL,
+        PRIMARY KEY (round_id, strategy)
+    )
+'''
+
+DB_FLUSH_SECONDS = REGISTRY.histogram("jetx_db_flush_seconds", "Durée d'un flush par lot vers la DB")
+DB_ROWS_WRITTEN = REGISTRY.counter("jetx_db_rows_written_total", "Lignes écrites en DB")
+DB_ROWS_SPILLED = REGISTRY.counter("jetx_db_rows_spilled_total", "Lignes déversées dans le fichier de secours")
+DB_WRITES_DROPPED = REGISTRY.counter("jetx_db_writes_dropped_total",
+                                     "Lignes perdues (file pleine, secours illisible, rejetées par la DB)")
+
+# Multiplicateurs stockés en NUMERIC exact, relus en float : le bot, NumPy et pandas calculent en float
+DECIMAL_AS_FLOAT = extensions.new_type(extensions.DECIMAL.values, "DECIMAL_AS_FLOAT",
+                                       lambda value, cur: float(value) if value is not None else None)
+extensions.register_type(DECIMAL_AS_FLOAT)
+
+# Seules ces erreurs signifient « DB injoignable » ; les autres (contrainte, donnée invalide,
+# partition absente) visent des lignes précises, mises de côté sans bloquer les suivantes
+DB_DOWN_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, pool.PoolError,
+                  sqlite3.OperationalError)
+
+# Fichier de secours partagé par le writer fermé (soumissions tardives) et son successeur (rejeu)
+_SPILL_LOCK = threading.Lock()
+
+def normalize_db_url(db_url):
+    """Force TLS comme le faisait get_db_connection."""
+    if "sslmode=" not in db_url:
+        separator = "&" if "?" in db_url else "?"
+        db_url += f"{separator}sslmode=require"
+    return db_url
+
+class PostgresSink:
+    """Écriture par lots dans jetx_logs via un pool de connexions réutilisées."""
+
+    def __init__(self, db_url, maxconn=2):
+        self.db_url = normalize_db_url(db_url)
+        self.maxconn = maxconn
+        self._pool = None
+
+    def _get_pool(self):
+        # Création paresseuse : le pool ne doit pas échouer si la DB est absente au démarrage
+        if self._pool is None:
+            self._pool = pool.ThreadedConnectionPool(0, self.maxconn, self.db_url)
+        return self._pool
+
+    @contextmanager
+    def connection(self):
+        """Emprunte une connexion du pool (tâches annexes : agrégats, maintenance)."""
+        db_pool = self._get_pool()
+        conn = db_pool.getconn()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            db_pool.putconn(conn, close=conn.closed != 0)
+
+    def write(self, rows):
+        """
+        Insère les lignes (timestamp, multiplier, type, prediction, predictions) en un seul
+        INSERT multi-lignes, puis les prédictions par stratégie rattachées à leur id, dans
+        la même transaction. Renvoie le plus grand id attribué.
+        """
+        db_pool = self._get_pool()
+        conn = db_pool.getconn()
+        broken = False
+        try:
+            with conn.cursor() as cur:
+                ids = execute_values(cur, INSERT_SQL, [row[:4] for row in rows],
+                                     page_size=max(len(rows), 1), fetch=True)
+                # RETURNING suit l'ordre de la liste VALUES
+                predictions = [(round_id, *prediction) for (round_id,), row in zip(ids, rows)
+                               for prediction in row[4] or ()]
+                if predictions:
+                    execute_values(cur, INSERT_PREDICTIONS_SQL, predictions, page_size=len(predictions))
+            conn.commit()
+            return max(row[0] for row in ids) if ids else None
+        except psycopg2.Error:
+            broken = True
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+            raise
+        finally:
+            db_pool.putconn(conn, close=broken or conn.closed != 0)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+class SqliteSink:
+    """Équivalent local de PostgresSink (benchmarks, tests hors ligne)."""
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS jetx_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TIMESTAMP,
+                multiplier REAL,
+                type TEXT,
+                prediction REAL
+            )
+        ''')
+        self._conn.execute(PREDICTIONS_DDL)
+        self._conn.commit()
+
+    def write(self, rows):
+        with self._conn:
+            for ts, multiplier, data_type, prediction, predictions in rows:
+                cur = self._conn.execute(
+                    "INSERT INTO jetx_logs (timestamp, multiplier, type, prediction) VALUES (?, ?, ?, ?)",
+                    (ts.isoformat(), multiplier, data_type, prediction))
+                if predictions:
+                    self._conn.executemany(
+                        "INSERT INTO jetx_predictions (round_id, strategy, lower_bound, upper_bound, "
+                        "confidence, prediction) VALUES (?, ?, ?, ?, ?, ?)",
+                        [(cur.lastrowid, *p) for p in predictions])
+        return self._conn.execute("SELECT max(id) FROM jetx_logs").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+class RoundWriter:
+    """
+    Persistance asynchrone : les lignes sont mises en file (bornée) par la boucle de scraping
+    et un thread dédié les écrit par lots. Si la DB est indisponible, les lots partent dans
+    un fichier local en ajout seul, rejoué dans l'ordre dès que la DB répond à nouveau.
+    """
+
+    def __init__(self, sink, spill_path="jetx_spill.jsonl", queue_size=10000,
+                 batch_size=200, flush_interval=1.0, retry_interval=10.0, post_flush=None):
+        self.sink = sink
+        self.post_flush = post_flush  # Tâche périodique du thread d'écriture quand la DB répond
+        self.spill_path = spill_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        # Après close() (relance du writer), les lignes soumises partent directement sur disque
+        self._closed = False
+        self._submit_lock = threading.Lock()
+        self._db_down_since = None
+        self._last_retry = 0.0
+
+        self.flushed = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_latency = None
+        self.last_id = None  # Plus grand id jetx_logs confirmé par la DB
+
+        REGISTRY.gauge("jetx_db_queue_depth", "Lignes en attente d'écriture", fn=self._queue.qsize)
+        REGISTRY.gauge("jetx_db_up", "1 si la dernière écriture DB a réussi",
+                       fn=lambda: self._db_down_since is None)
+
+        self._thread = threading.Thread(target=self._run, name="round-writer", daemon=True)
+        self._thread.start()
+
+    # --- API côté boucle de scraping (non bloquante) ---
+
+    def submit(self, multiplier, data_type="live", prediction=None, timestamp=None, predictions=None):
+        """
+        `predictions` : prédictions par stratégie {nom: (lower, upper, confidence, next)},
+        écrites dans jetx_predictions avec l'id de la ligne.
+        """
+        timestamp = timestamp or datetime.datetime.now()
+        try:
+            prediction = None if prediction is None else float(prediction)
+            if predictions:
+                predictions = [(name, *values) for name, values in predictions.items()]
+            row = (timestamp, float(multiplier), data_type, prediction, predictions or None)
+            with self._submit_lock:
+                if self._closed:
+                    # Plus aucun thread ne lit la file : rejoué par le writer suivant
+                    self._spill([row])
+                else:
+                    self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            DB_WRITES_DROPPED.inc()
+            logging.warning(f"File d'écriture pleine, ligne perdue ({self.dropped} au total).")
+        return timestamp
+
+    def submit_many(self, rows):
+        """
+        Met en file un lot de lignes (multiplier, type, prediction, timestamp, predictions)
+        d'un seul coup : le thread d'écriture les collecte ensemble et les écrit en une
+        transaction (tant que le lot ne dépasse pas batch_size).
+        """
+        return [self.submit(*row) for row in rows]
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "last_flush_latency": self.last_flush_latency,
+            "flushed": self.flushed,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "spill_pending": self._spill_pending(),
+            "db_up": self._db_down_since is None,
+        }
+
+    def synced(self):
+        """Vrai si toutes les lignes soumises sont en DB (file vide, rien sur disque)."""
+        return self._queue.unfinished_tasks == 0 and not self._spill_pending()
+
+    def flush(self, timeout=10.0):
+        """Attend que la file soit vidée (écrite en DB ou déversée sur disque)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self._queue.unfinished_tasks == 0
+
+    def alive(self):
+        return self._thread.is_alive()
+
+    def close(self, timeout=10.0):
+        if self.alive():
+            self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout)
+        if not self.alive():
+            # Thread arrêté (ou mort) : ce qui reste en file part sur disque, rejoué par le writer suivant
+            with self._submit_lock:
+                self._closed = True
+                leftover = []
+                while True:
+                    try:
+                        leftover.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                    self._queue.task_done()
+                if leftover:
+                    self._spill(leftover)
+        self.sink.close()
+
+    # --- Thread d'écriture ---
+
+    def _collect_batch(self):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect_batch()
+            try:
+                if self._db_down_since is None or self._retry_due():
+                    self._replay_spill()
+                if batch:
+                    if self._db_down_since is None and not self._spill_pending():
+                        self._write_or_spill(batch)
+                    else:
+                        # Les lignes déjà déversées sont plus anciennes : on préserve l'ordre
+                        self._spill(batch)
+                if self.post_flush and self._db_down_since is None:
+                    self.post_flush()
+            except Exception as e:
+                logging.error(f"Writer DB : {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _retry_due(self):
+        return time.monotonic() - self._last_retry >= self.retry_interval
+
+    def _write(self, rows):
+        start = time.perf_counter()
+        last_id = self.sink.write(rows)
+        if last_id is not None:
+            self.last_id = max(self.last_id or 0, last_id)
+        self.last_flush_latency = time.perf_counter() - start
+        self.flushes += 1
+        self.flushed += len(rows)
+        DB_FLUSH_SECONDS.observe(self.last_flush_latency)
+        DB_ROWS_WRITTEN.inc(len(rows))
+        logging.debug(f"Flush DB : {len(rows)} lignes en {self.last_flush_latency * 1000:.1f} ms, "
+                      f"file : {self._queue.qsize()}")
+
+    def _write_or_spill(self, batch):
+        try:
+            self._write(batch)
+        except DB_DOWN_ERRORS as e:
+            self._mark_down(e)
+            self._spill(batch)
+        except Exception as e:
+            done = self._write_one_by_one(batch, e)
+            if done < len(batch):
+                self._spill(batch[done:])
+
+    def _write_chunk(self, rows):
+        """
+        Écrit un lot ; renvoie le nombre de lignes traitées (écrites ou rejetées) avant
+        une éventuelle perte de la DB, qui est alors marquée indisponible.
+        """
+        try:
+            self._write(rows)
+            return len(rows)
+        except DB_DOWN_ERRORS as e:
+            self._mark_down(e)
+            return 0
+        except Exception as e:
+            return self._write_one_by_one(rows, e)
+
+    def _write_one_by_one(self, rows, error):
+        """Le lot est refusé pour une ligne fautive : on le réécrit ligne à ligne pour l'isoler."""
+        logging.warning(f"Lot de {len(rows)} lignes refusé par la DB, écriture ligne à ligne : {error}")
+        for i, row in enumerate(rows):
+            try:
+                self._write([row])
+            except DB_DOWN_ERRORS as e:
+                self._mark_down(e)
+                return i
+            except Exception as e:
+                self._reject(row, e)
+        return len(rows)
+
+    def _reject(self, row, error):
+        """Ligne refusée par la DB : conservée à part dans <spill>.rejected, comptée perdue."""
+        self.dropped += 1
+        DB_WRITES_DROPPED.inc()
+        logging.error(f"Ligne rejetée par la DB ({row[0]}, {row[1]}) : {error}")
+        try:
+            self._append_rows(self.spill_path + ".rejected", [row])
+        except OSError as e:
+            logging.error(f"Écriture de {self.spill_path}.rejected impossible : {e}")
+
+    def _mark_down(self, error):
+        self._last_retry = time.monotonic()
+        if self._db_down_since is None:
+            self._db_down_since = time.monotonic()
+            logging.warning(f"DB indisponible, bascule sur {self.spill_path} : {error}")
+
+    @staticmethod
+    def _append_rows(path, batch):
+        with _SPILL_LOCK, open(path, "a") as f:
+            for ts, multiplier, data_type, prediction, predictions in batch:
+                f.write(json.dumps({"timestamp": ts.isoformat(), "multiplier": multiplier,
+                                    "type": data_type, "prediction": prediction,
+                                    "predictions": predictions}) + "\n")
+
+    def _spill(self, batch):
+        try:
+            self._append_rows(self.spill_path, batch)
+            self.spilled += len(batch)
+            DB_ROWS_SPILLED.inc(len(batch))
+        except OSError as e:
+            self.dropped += len(batch)
+            DB_WRITES_DROPPED.inc(len(batch))
+            logging.error(f"Écriture du fichier de secours impossible, {len(batch)} lignes perdues : {e}")
+
+    def _spill_pending(self):
+        try:
+            return os.path.getsize(self.spill_path) > 0
+        except OSError:
+            return False
+
+    def _replay_spill(self):
+        """Rejoue le fichier de secours dans l'ordre ; la partie non écrite est conservée."""
+        if not self._spill_pending():
+            return
+        lines, rows = [], []
+        with _SPILL_LOCK, open(self.spill_path) as f:
+            read_upto = f.seek(0, os.SEEK_END)
+            f.seek(0)
+            for line in f.readlines():
+                try:
+                    row = json.loads(line)
+                    rows.append((datetime.datetime.fromisoformat(row["timestamp"]), row["multiplier"],
+                                 row["type"], row["prediction"], row.get("predictions")))
+                    lines.append(line)
+                except (ValueError, KeyError):
+                    # Ligne tronquée (arrêt brutal pendant l'écriture)
+                    if line.strip():
+                        self.dropped += 1
+                        DB_WRITES_DROPPED.inc()
+        done = 0
+        for i in range(0, len(rows), self.batch_size):
+            chunk = rows[i:i + self.batch_size]
+            written = self._write_chunk(chunk)
+            done += written
+            if written < len(chunk):
+                break
+        remaining = lines[done:]
+        tmp_path = self.spill_path + ".tmp"
+        with _SPILL_LOCK:
+            # Lignes ajoutées pendant le rejeu (writer précédent fermé) : conservées après le reste
+            with open(self.spill_path) as f:
+                f.seek(read_upto)
+                remaining += f.readlines()
+            with open(tmp_path, "w") as f:
+                f.writelines(remaining)
+            os.replace(tmp_path, self.spill_path)
+        if not remaining:
+            if self._db_down_since is not None:
+                logging.info(f"DB de retour, {done} lignes rejouées depuis {self.spill_path}.")
+            self._db_down_since = None
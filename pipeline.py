@@ -0,0 +1,68 @@
+"""
+Files bornées entre les étapes asyncio du bot (lecture, prédiction, persistance, signal).
+
+Chaque file a une politique de débordement explicite :
+
+- "block" : put() attend une place (contre-pression sur l'étape amont) ;
+- "drop_oldest" : la plus ancienne entrée est jetée (seule la plus récente compte) ;
+- "drop_newest" : la nouvelle entrée est jetée.
+
+Le temps passé en file par chaque entrée, la profondeur et les pertes sont exposés
+par file sur /metrics (label `queue`).
+"""
+import asyncio
+import time
+
+from metrics import REGISTRY
+
+POLICIES = ("block", "drop_oldest", "drop_newest")
+
+QUEUE_LAG = REGISTRY.histogram("jetx_queue_lag_seconds", "Temps passé en file entre deux étapes du pipeline")
+QUEUE_DEPTH = REGISTRY.gauge("jetx_queue_depth", "Entrées en attente dans une file du pipeline")
+QUEUE_DROPPED = REGISTRY.counter("jetx_queue_dropped_total", "Entrées jetées par la politique de débordement")
+
+class StageQueue:
+    def __init__(self, name, maxsize, policy="block"):
+        if policy not in POLICIES:
+            raise ValueError(f"Politique inconnue : {policy} (disponibles : {', '.join(POLICIES)})")
+        self.name = name
+        self.policy = policy
+        self._queue = asyncio.Queue(maxsize)
+        QUEUE_DEPTH.set(0, queue=name)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    async def put(self, item):
+        """Ajoute `item` selon la politique ; renvoie False s'il a été jeté."""
+        entry = (time.monotonic(), item)
+        if self.policy == "block":
+            await self._queue.put(entry)
+        else:
+            if self._queue.full():
+                QUEUE_DROPPED.inc(queue=self.name)
+                if self.policy == "drop_newest":
+                    return False
+                self._queue.get_nowait()
+                self._queue.task_done()
+            self._queue.put_nowait(entry)
+        QUEUE_DEPTH.set(self._queue.qsize(), queue=self.name)
+        return True
+
+    async def get(self):
+        enqueued, item = await self._queue.get()
+        QUEUE_LAG.observe(time.monotonic() - enqueued, queue=self.name)
+        QUEUE_DEPTH.set(self._queue.qsize(), queue=self.name)
+        return item
+
+    def drain(self):
+        """Retire et renvoie les entrées en attente, sans attendre (arrêt du pipeline)."""
+        items = []
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait()[1])
+            self._queue.task_done()
+        QUEUE_DEPTH.set(0, queue=self.name)
+        return items
+
+    def task_done(self):
+        self._queue.task_done()
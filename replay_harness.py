@@ -0,0 +1,233 @@
+"""
+Harnais de rejeu : lance le jeu simulé (game_simulator.py) et le bot contre lui, puis
+compare les tours détectés au calendrier du simulateur.
+
+Le bot tourne dans un processus fils (config temporaire pointant vers le simulateur,
+sans DATABASE_URL) ; ses lignes « TOUR » donnent l'heure de détection. CPU et mémoire
+(PSS) du bot et de ses descendants (chromedriver, Chrome) sont échantillonnés dans /proc.
+
+    python replay_harness.py --rounds 300 --speed 20
+    python replay_harness.py --source rounds.csv --speed 50 --output replay.json
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import yaml
+
+from backtest import load_rounds, synthetic_rounds
+from game_simulator import GameSimulator
+from metrics import process_memory_mb, process_tree
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROUND_LINE = re.compile(r"\[([^\]]+)\] TOUR : ([\d.]+)x")
+READY_LINE = "Surveillance active"
+
+# Le bot est lancé sans la boucle de relance de __main__ ; Ctrl-C (SIGINT) ferme Chrome
+BOT_RUNNER = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from jetx_betpawa_bot import JetXBetpawaBot
+bot = JetXBetpawaBot(sys.argv[2])
+try:
+    bot.run()
+finally:
+    bot.close()
+"""
+
+class ProcessTreeSampler:
+    """Échantillonne CPU (utime + stime) et PSS d'un processus et de ses descendants."""
+
+    def __init__(self, root_pid, interval=1.0):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+        self._cpu = {}  # pid -> dernier temps CPU vu (s)
+        self.samples = []  # (horodatage, cpu cumulé (s), mémoire (Mo), processus)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tree-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _cpu_seconds(self, pid):
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.clock_ticks
+
+    def sample(self):
+        memory, alive = 0.0, 0
+        for pid in process_tree(self.root_pid):
+            try:
+                self._cpu[pid] = self._cpu_seconds(pid)
+                memory += process_memory_mb(pid)
+                alive += 1
+            except (OSError, IndexError, ValueError):
+                continue
+        # Les processus terminés gardent leur dernier temps CPU connu
+        self.samples.append((time.time(), sum(self._cpu.values()), memory, alive))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def summary(self, start=None, end=None):
+        rows = [s for s in self.samples if (start is None or s[0] >= start) and (end is None or s[0] <= end)]
+        if len(rows) < 2:
+            return {}
+        wall = rows[-1][0] - rows[0][0]
+        memory = np.array([r[2] for r in rows])
+        return {
+            "cpu_percent": 100 * (rows[-1][1] - rows[0][1]) / wall if wall > 0 else None,
+            "memory_mb_mean": float(memory.mean()),
+            "memory_mb_peak": float(memory.max()),
+            "processes_peak": int(max(r[3] for r in rows)),
+        }
+
+def match_detections(schedule, detections, visible=20):
+    """
+    Associe chaque détection (heure epoch, valeur) au tour le plus récent déjà terminé
+    qui porte cette valeur parmi les `visible` derniers. Renvoie (latences par tour,
+    nombre de doublons, détections sans tour correspondant).
+    """
+    crashes = np.array([r["crash"] for r in schedule])
+    values = [r["m"] for r in schedule]
+    latencies, duplicates, unmatched = {}, 0, 0
+    for detected_at, value in detections:
+        last = int(np.searchsorted(crashes, detected_at, side="right")) - 1
+        candidates = [i for i in range(last, max(-1, last - visible), -1) if abs(values[i] - value) < 0.005]
+        if not candidates:
+            unmatched += 1
+            continue
+        fresh = [i for i in candidates if i not in latencies]
+        if not fresh:
+            duplicates += 1
+            continue
+        i = fresh[0]
+        latencies[i] = detected_at - crashes[i]
+    return latencies, duplicates, unmatched
+
+def report(schedule, detections, sampler, started_at, ready_at, ended_at, speed):
+    latencies, duplicates, unmatched = match_detections(schedule, detections)
+    if latencies:
+        first = min(latencies)
+        # Tours joués entre la première détection et la fin du rejeu
+        played = [i for i, r in enumerate(schedule) if i >= first and r["crash"] <= ended_at]
+    else:
+        played = []
+    missed = [i for i in played if i not in latencies]
+    values = np.array(list(latencies.values())) * 1000
+    result = {
+        "speed": speed,
+        "rounds_scheduled": len(schedule),
+        "rounds_played": len(played),
+        "rounds_detected": len(latencies),
+        "missed": len(missed),
+        "missed_rate": len(missed) / len(played) if played else None,
+        "duplicates": duplicates,
+        "unmatched": unmatched,
+        # Lancement du processus -> boucle de surveillance active (Chrome, login, navigation)
+        "bot_ready_seconds": (ready_at - started_at) if ready_at else None,
+    }
+    if len(values):
+        result["latency_ms"] = {f"p{q}": float(np.percentile(values, q)) for q in (50, 90, 95, 99)}
+        result["latency_ms"]["max"] = float(values.max())
+    result["resources"] = sampler.summary(start=detections[0][0] if detections else None)
+    return result
+
+def write_config(base_config, simulator, workdir):
+    with open(base_config) as f:
+        config = yaml.safe_load(f)
+    config["login_url"] = simulator.base_url + "/login"
+    config["game_url"] = simulator.base_url + "/casino?gameId=jetx"
+    config["checkpoint"] = {"dir": None}
+    path = os.path.join(workdir, "config.yaml")
+    with open(path, "w") as f:
+        yaml.safe_dump(config, f)
+    return path
+
+def run(multipliers, speed=20.0, port=8765, base_config=None, lead=60.0, grace=5.0, echo=False):
+    base_config = base_config or os.path.join(BASE_DIR, "config.yaml")
+    with open(base_config) as f:
+        selectors = (yaml.safe_load(f) or {}).get("selectors", {})
+    # Le calendrier démarre après `lead` secondes : le temps au bot de lancer Chrome et d'atteindre le jeu
+    simulator = GameSimulator(multipliers, speed, port, selectors, start=time.time() + lead).start()
+    workdir = tempfile.mkdtemp(prefix="jetx_replay_")
+    config_path = write_config(base_config, simulator, workdir)
+    env = {k: v for k, v in os.environ.items() if k != "DATABASE_URL"}
+    started_at = time.time()
+    bot = subprocess.Popen([sys.executable, "-c", BOT_RUNNER, BASE_DIR, config_path], cwd=workdir, env=env,
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, start_new_session=True)
+    sampler = ProcessTreeSampler(bot.pid).start()
+
+    detections = []
+    ready = []
+
+    def read_output():
+        for line in bot.stdout:
+            if not ready and READY_LINE in line:
+                ready.append(time.time())
+            match = ROUND_LINE.search(line)
+            if match:
+                detected_at = datetime.datetime.fromisoformat(match.group(1)).timestamp()
+                detections.append((detected_at, float(match.group(2))))
+            if echo:
+                sys.stdout.write(line)
+
+    reader = threading.Thread(target=read_output, name="bot-output", daemon=True)
+    reader.start()
+    try:
+        while time.time() < simulator.end_time + grace and bot.poll() is None:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    ended_at = time.time()
+    sampler.stop()
+    if bot.poll() is None:
+        bot.send_signal(signal.SIGINT)
+        try:
+            bot.wait(30)
+        except subprocess.TimeoutExpired:
+            os.killpg(bot.pid, signal.SIGKILL)
+            bot.wait()
+    reader.join(5)
+    simulator.stop()
+    return report(simulator.schedule, detections, sampler, started_at, ready[0] if ready else None, ended_at, speed)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rejeu accéléré du bot contre le jeu simulé")
+    parser.add_argument("--source", help="Tours enregistrés : 'db', .csv/.parquet/.npy (simulés sinon)")
+    parser.add_argument("--rounds", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--speed", type=float, default=20.0, help="Accélération (10 à 100 = 10x à 100x)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", default=os.path.join(BASE_DIR, "config.yaml"))
+    parser.add_argument("--lead", type=float, default=60.0, help="Délai avant le premier tour (démarrage du bot)")
+    parser.add_argument("--output", help="Écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--echo", action="store_true", help="Affiche les logs du bot")
+    args = parser.parse_args(argv)
+
+    multipliers = load_rounds(args.source)[0] if args.source else synthetic_rounds(args.rounds, args.seed)[0]
+    result = run(multipliers[:args.rounds], args.speed, args.port, args.config, args.lead, echo=args.echo)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0 if result["rounds_detected"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
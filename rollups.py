@@ -0,0 +1,227 @@
+"""
+Agrégats pré-calculés des tours (par minute, heure et jour) et sous-échantillonnage LTTB.
+
+Chaque table jetx_rollup_<granularité> garde, par intervalle : nombre de tours, somme,
+somme des carrés, min/max, nombre de tours >= 2x et un histogramme à pas logarithmique
+(fusionnable, d'où des quantiles approchés). Les tables sont maintenues incrémentalement
+à partir des lignes jetx_logs d'id supérieur au dernier id agrégé.
+
+    python rollups.py          # rattrapage complet (par blocs)
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from round_index import HIST_EDGES, hist_bins, hist_quantile
+
+GRANULARITIES = {"minute": "min", "hour": "h", "day": "D"}
+GRANULARITY_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Colonnes d'un agrégat chargé, ici depuis la DB ou par archive.bucket_stats depuis l'archive
+ROLLUP_COLUMNS = ["bucket", "n", "total", "total_sq", "n_ge2", "min", "max"]
+SUMMARY_COLUMNS = ["mean", "share_ge2", "p50", "p90"]
+
+def _table(granularity):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularité inconnue : {granularity}")
+    return f"jetx_rollup_{granularity}"
+
+def ensure_schema(cur):
+    for granularity in GRANULARITIES:
+        cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS {_table(granularity)} (
+                bucket TIMESTAMP PRIMARY KEY,
+                n INTEGER NOT NULL,
+                total DOUBLE PRECISION NOT NULL,
+                total_sq DOUBLE PRECISION NOT NULL,
+                n_ge2 INTEGER NOT NULL,
+                min_mult REAL,
+                max_mult REAL,
+                hist INTEGER[] NOT NULL
+            )
+        ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS jetx_rollup_state (
+            name TEXT PRIMARY KEY,
+            last_id BIGINT NOT NULL
+        )
+    ''')
+    cur.execute("INSERT INTO jetx_rollup_state (name, last_id) VALUES ('rounds', 0) ON CONFLICT DO NOTHING")
+
+def aggregate(timestamps, multipliers, freq):
+    """Agrège des tours bruts par intervalle ; renvoie les lignes prêtes pour l'upsert."""
+    stamps = pd.DatetimeIndex(pd.to_datetime(timestamps))
+    values = np.asarray(multipliers, dtype=float)
+    codes, buckets = pd.factorize(stamps.floor(freq), sort=True)
+    k = len(buckets)
+    n = np.bincount(codes, minlength=k)
+    total = np.bincount(codes, weights=values, minlength=k)
+    total_sq = np.bincount(codes, weights=values ** 2, minlength=k)
+    n_ge2 = np.bincount(codes, weights=values >= 2.0, minlength=k)
+    mins = pd.Series(values).groupby(codes).min().to_numpy()
+    maxs = pd.Series(values).groupby(codes).max().to_numpy()
+    hist = np.zeros((k, len(HIST_EDGES) - 1), dtype=np.int64)
+    np.add.at(hist, (codes, hist_bins(values)), 1)
+    return [
+        (buckets[i].to_pydatetime(), int(n[i]), float(total[i]), float(total_sq[i]), int(n_ge2[i]),
+         float(mins[i]), float(maxs[i]), hist[i].tolist())
+        for i in range(k)
+    ]
+
+def upsert(cur, granularity, rows):
+    table = _table(granularity)
+    execute_values(cur, f'''
+        INSERT INTO {table} AS r (bucket, n, total, total_sq, n_ge2, min_mult, max_mult, hist) VALUES %s
+        ON CONFLICT (bucket) DO UPDATE SET
+            n = r.n + EXCLUDED.n,
+            total = r.total + EXCLUDED.total,
+            total_sq = r.total_sq + EXCLUDED.total_sq,
+            n_ge2 = r.n_ge2 + EXCLUDED.n_ge2,
+            min_mult = LEAST(r.min_mult, EXCLUDED.min_mult),
+            max_mult = GREATEST(r.max_mult, EXCLUDED.max_mult),
+            hist = ARRAY(SELECT a + b FROM unnest(r.hist, EXCLUDED.hist) WITH ORDINALITY AS u(a, b, i) ORDER BY i)
+    ''', rows)
+
+class RollupMaintainer:
+    """
+    Rattrapage incrémental des agrégats. `connect` est un context manager fournissant une
+    connexion psycopg2 ; le verrou sur jetx_rollup_state sérialise plusieurs mainteneurs.
+    """
+
+    def __init__(self, connect, min_interval=60.0, chunk=50_000):
+        self.connect = connect
+        self.min_interval = min_interval
+        self.chunk = chunk
+        self._last_run = 0.0
+        self._schema_ready = False
+
+    def update(self):
+        """Agrège toutes les lignes 'result' pas encore vues ; renvoie le nombre de tours traités."""
+        processed = 0
+        with self.connect() as conn:
+            while True:
+                with conn.cursor() as cur:
+                    if not self._schema_ready:
+                        ensure_schema(cur)
+                        self._schema_ready = True
+                    cur.execute("SELECT last_id FROM jetx_rollup_state WHERE name = 'rounds' FOR UPDATE")
+                    last_id = cur.fetchone()[0]
+                    cur.execute("SELECT id, timestamp, multiplier FROM jetx_logs "
+                                "WHERE type = 'result' AND id > %s ORDER BY id LIMIT %s", (last_id, self.chunk))
+                    rows = cur.fetchall()
+                    if rows:
+                        timestamps = [row[1] for row in rows]
+                        multipliers = [row[2] for row in rows]
+                        for granularity, freq in GRANULARITIES.items():
+                            upsert(cur, granularity, aggregate(timestamps, multipliers, freq))
+                        cur.execute("UPDATE jetx_rollup_state SET last_id = %s WHERE name = 'rounds'", (rows[-1][0],))
+                conn.commit()
+                processed += len(rows)
+                if len(rows) < self.chunk:
+                    return processed
+
+    def maybe_update(self):
+        """Appelé après chaque flush du writer ; limité à une passe par `min_interval`."""
+        if time.monotonic() - self._last_run < self.min_interval:
+            return
+        self._last_run = time.monotonic()
+        try:
+            processed = self.update()
+            if processed:
+                logging.debug(f"Agrégats : {processed} tours ajoutés.")
+        except Exception as e:
+            logging.warning(f"Mise à jour des agrégats impossible : {e}")
+
+def load_rollup(cur, granularity, since=None):
+    """Agrégats d'une granularité sous forme de DataFrame (moyenne, quantiles, part >= 2x)."""
+    query = f"SELECT bucket, n, total, total_sq, n_ge2, min_mult, max_mult, hist FROM {_table(granularity)}"
+    params = ()
+    if since is not None:
+        query += " WHERE bucket >= %s"
+        params = (since,)
+    cur.execute(query + " ORDER BY bucket", params)
+    df = pd.DataFrame(cur.fetchall(), columns=ROLLUP_COLUMNS + ["hist"])
+    if df.empty:
+        return df
+    return summarize(df, df["hist"]).drop(columns=["hist"])
+
+def summarize(df, hists):
+    """Ajoute à un agrégat (ROLLUP_COLUMNS) moyenne, part >= 2x et quantiles approchés par histogramme."""
+    df["mean"] = df["total"] / df["n"]
+    df["share_ge2"] = df["n_ge2"] / df["n"]
+    for q in (0.5, 0.9):
+        df[f"p{int(q * 100)}"] = [hist_quantile(h, q) for h in hists]
+    return df
+
+def hour_of_day_profile(cur):
+    """
+    (nombre, somme) des tours par heure de la journée sur tout l'historique : jetx_rollup_hour,
+    complété par les lignes pas encore agrégées (id > dernier id agrégé). Les tours supprimés
+    de jetx_logs par la rétention y restent comptés. None si les agrégats n'existent pas.
+    """
+    cur.execute("SELECT to_regclass('jetx_rollup_hour') IS NOT NULL AND to_regclass('jetx_rollup_state') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return None
+    counts = np.zeros(24, dtype=np.int64)
+    sums = np.zeros(24, dtype=float)
+    cur.execute("SELECT EXTRACT(HOUR FROM bucket)::int, SUM(n), SUM(total) FROM jetx_rollup_hour GROUP BY 1")
+    for hour, n, total in cur.fetchall():
+        counts[hour] += n
+        sums[hour] += total
+    cur.execute("SELECT last_id FROM jetx_rollup_state WHERE name = 'rounds'")
+    row = cur.fetchone()
+    cur.execute("SELECT EXTRACT(HOUR FROM timestamp)::int, COUNT(*), SUM(multiplier) FROM jetx_logs "
+                "WHERE type = 'result' AND id > %s AND timestamp IS NOT NULL GROUP BY 1", (row[0] if row else 0,))
+    for hour, n, total in cur.fetchall():
+        counts[hour] += n
+        sums[hour] += total
+    return counts, sums
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets : garde n_out points visuellement représentatifs
+    (pics compris) d'une série (x croissant). Renvoie les indices retenus.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for b in range(n_out - 2):
+        start, end = edges[b], edges[b + 1]
+        # Point moyen du groupe suivant (ou dernier point)
+        nxt_end = edges[b + 2] if b + 2 < len(edges) else n
+        avg_x = x[end:nxt_end].mean()
+        avg_y = y[end:nxt_end].mean()
+        area = np.abs((x[prev] - avg_x) * (y[start:end] - y[prev])
+                      - (x[prev] - x[start:end]) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[b + 1] = prev
+    return selected
+
+if __name__ == "__main__":
+    import psycopg2
+    from persistence import normalize_db_url
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    @contextmanager
+    def connect():
+        conn = psycopg2.connect(normalize_db_url(os.environ["DATABASE_URL"]))
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    start = time.perf_counter()
+    processed = RollupMaintainer(connect).update()
+    logging.info(f"{processed} tours agrégés en {time.perf_counter() - start:.1f} s.")
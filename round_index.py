@@ -0,0 +1,386 @@
+"""
+Index de statistiques sur les tours, tenu à jour à chaque ajout.
+
+Les plages récentes (N derniers tours, N dernières minutes, intervalle de temps) sont
+servies par des sommes préfixes (somme, somme des carrés) et des histogrammes cumulés
+par blocs ; tout l'historique, l'heure de la journée et le jour de la semaine par des
+compartiments. Chaque requête renvoie un RangeStats (nombre, moyenne, variance,
+quantiles approchés) :
+
+    index.last(10)           # O(1)
+    index.since(3600)        # O(log n) : recherche dichotomique sur les horodatages
+    index.hour_of_day(14)    # O(1), tout l'historique
+
+Les plages récentes ne couvrent que les `capacity` derniers tours : une plage qui commence
+avant le plus ancien tour conservé est complétée par la source `older` (l'archive locale,
+archive.RoundArchive) ; sans elle, ou si elle ne remonte pas assez loin, la plage est
+marquée `truncated`.
+"""
+import bisect
+
+import numpy as np
+import pandas as pd
+
+# Histogramme à pas logarithmique (fusionnable) : 64 classes de 1x à 10 000x,
+# la dernière absorbe le reste. Partagé avec les agrégats (rollups.py).
+HIST_EDGES = np.geomspace(1.0, 10_000.0, 65)
+N_BINS = len(HIST_EDGES) - 1
+_EDGES = HIST_EDGES.tolist()
+
+def hist_bins(multipliers):
+    return np.clip(np.searchsorted(HIST_EDGES, multipliers, side="right") - 1, 0, N_BINS - 1)
+
+def _hist_bin(multiplier):
+    # Version scalaire de hist_bins, sans la surcharge NumPy (chemin par tour)
+    return min(max(bisect.bisect_right(_EDGES, multiplier) - 1, 0), N_BINS - 1)
+
+def hist_quantile(hist, q):
+    """Quantile approché depuis un histogramme (interpolation géométrique dans la classe)."""
+    hist = np.asarray(hist, dtype=float)
+    total = hist.sum()
+    if total == 0:
+        return np.nan
+    cumulative = np.cumsum(hist)
+    target = q * total
+    i = int(np.searchsorted(cumulative, target))
+    i = min(i, len(hist) - 1)
+    before = cumulative[i - 1] if i > 0 else 0.0
+    frac = (target - before) / hist[i] if hist[i] else 0.0
+    lo, hi = HIST_EDGES[i], HIST_EDGES[i + 1]
+    return float(lo * (hi / lo) ** frac)
+
+class RangeStats:
+    """
+    Statistiques fusionnables d'un ensemble de tours (addition avec +). `truncated` : la
+    plage demandée déborde de la fenêtre indexée, les tours plus anciens n'y sont pas.
+    """
+
+    def __init__(self, count=0, total=0.0, total_sq=0.0, hist=None, truncated=False):
+        self.count = int(count)
+        self.truncated = bool(truncated)
+        self.total = float(total)
+        self.total_sq = float(total_sq)
+        self.hist = np.zeros(N_BINS, dtype=np.int64) if hist is None else np.asarray(hist, dtype=np.int64)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+    @property
+    def var(self):
+        """Variance d'échantillon (ddof=1, comme pandas)."""
+        if self.count < 2:
+            return np.nan
+        return max(0.0, (self.total_sq - self.total * self.total / self.count) / (self.count - 1))
+
+    @property
+    def std(self):
+        return self.var ** 0.5
+
+    def quantile(self, q):
+        return hist_quantile(self.hist, q)
+
+    @classmethod
+    def of(cls, multipliers):
+        """Statistiques d'un tableau de multiplicateurs."""
+        x = np.asarray(multipliers, dtype=float)
+        return cls(len(x), x.sum(), (x * x).sum(), np.bincount(hist_bins(x), minlength=N_BINS))
+
+    def __add__(self, other):
+        return RangeStats(self.count + other.count, self.total + other.total,
+                          self.total_sq + other.total_sq, self.hist + other.hist,
+                          self.truncated or other.truncated)
+
+    def __repr__(self):
+        return (f"RangeStats(n={self.count}, mean={self.mean:.2f}, std={self.std:.2f}, "
+                f"p50={self.quantile(0.5):.2f}, p90={self.quantile(0.9):.2f}"
+                f"{', tronqué' if self.truncated else ''})")
+
+class _Buckets:
+    """Compteurs par clé (heure, jour de la semaine) : nombre, sommes et histogramme."""
+
+    def __init__(self, n):
+        self.count = np.zeros(n, dtype=np.int64)
+        self.total = np.zeros(n)
+        self.total_sq = np.zeros(n)
+        self.hist = np.zeros((n, N_BINS), dtype=np.int64)
+
+    def add(self, key, value, bin_):
+        self.count[key] += 1
+        self.total[key] += value
+        self.total_sq[key] += value * value
+        self.hist[key, bin_] += 1
+
+    def add_many(self, keys, values, bins):
+        np.add.at(self.count, keys, 1)
+        np.add.at(self.total, keys, values)
+        np.add.at(self.total_sq, keys, values ** 2)
+        np.add.at(self.hist, (keys, bins), 1)
+
+    def stats(self, key):
+        return RangeStats(self.count[key], self.total[key], self.total_sq[key], self.hist[key].copy())
+
+    def get_state(self):
+        return {"count": self.count.tolist(), "total": self.total.tolist(),
+                "total_sq": self.total_sq.tolist(), "hist": self.hist.tolist()}
+
+    def set_state(self, state):
+        self.count = np.array(state["count"], dtype=np.int64)
+        self.total = np.array(state["total"], dtype=float)
+        self.total_sq = np.array(state["total_sq"], dtype=float)
+        self.hist = np.array(state["hist"], dtype=np.int64)
+
+def _hour_dow(epochs):
+    """Heure (0-23) et jour de la semaine (0 = lundi) d'horodatages epoch en heure murale."""
+    epochs = np.asarray(epochs, dtype=float)
+    # Le 1er janvier 1970 était un jeudi
+    return (epochs // 3600 % 24).astype(np.int64), ((epochs // 86400 + 3) % 7).astype(np.int64)
+
+class RoundIndex:
+    """
+    Sommes préfixes sur les `capacity` derniers tours (anneau miroir, comme RoundStore)
+    et compartiments sur tout l'historique. Les horodatages (epoch, voir
+    round_store.to_epoch) doivent être croissants pour les requêtes par temps.
+
+    L'histogramme cumulé n'est conservé que tous les `block` tours : une plage le
+    reconstitue depuis l'instantané le plus proche plus au plus `block` tours, d'où
+    un coût constant indépendant de la taille de l'historique.
+
+    `older` (facultatif) fournit les tours sortis de la fenêtre : last_stats(n, end) pour
+    les `n` derniers tours antérieurs à `end`, range_stats(start, end) pour [start, end)
+    et last_timestamp().
+    """
+
+    def __init__(self, capacity=2000, block=64, older=None):
+        self.capacity = int(capacity)
+        self.block = int(block)
+        self.older = older
+        size = 2 * self.capacity
+        self._values = np.full(size, np.nan)
+        self._times = np.full(size, np.nan)
+        self._bins = np.zeros(size, dtype=np.int16)
+        # Sommes des tours précédant chaque tour (relatives, voir _rebase)
+        self._psum = np.zeros(size)
+        self._psq = np.zeros(size)
+        self._start = 0
+        self._size = 0
+        self._n = 0  # Numéro absolu du prochain tour
+        self._acc_sum = 0.0
+        self._acc_sq = 0.0
+        self._acc_hist = np.zeros(N_BINS, dtype=np.int64)
+        # Horodatage du plus récent tour sorti de la fenêtre
+        self._evicted_time = -np.inf
+        # Histogramme cumulé avant chaque tour de numéro multiple de `block`
+        self._n_snapshots = self.capacity // self.block + 2
+        self._snapshots = np.zeros((self._n_snapshots, N_BINS), dtype=np.int64)
+
+        self._overall = _Buckets(1)
+        self._hour = _Buckets(24)
+        self._dow = _Buckets(7)
+
+    def __len__(self):
+        return self._size
+
+    # --- Mise à jour ---
+
+    def append(self, multiplier, timestamp=np.nan):
+        """Indexe un tour (`timestamp` en secondes epoch, NaN si inconnu) en O(1)."""
+        x = float(multiplier)
+        b = _hist_bin(x)
+        if self._n % self.block == 0:
+            self._snapshots[(self._n // self.block) % self._n_snapshots] = self._acc_hist
+        if self._size < self.capacity:
+            slot = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self.capacity
+            self._evicted_time = np.fmax(self._evicted_time, self._times[slot])
+        for buf, value in ((self._values, x), (self._times, timestamp), (self._bins, b),
+                           (self._psum, self._acc_sum), (self._psq, self._acc_sq)):
+            buf[slot] = value
+            buf[slot + self.capacity] = value
+        self._acc_sum += x
+        self._acc_sq += x * x
+        self._acc_hist[b] += 1
+        self._n += 1
+
+        self._overall.add(0, x, b)
+        if timestamp == timestamp:
+            self._hour.add(int(timestamp // 3600 % 24), x, b)
+            self._dow.add(int((timestamp // 86400 + 3) % 7), x, b)
+        if self._n % self.capacity == 0:
+            self._rebase()
+
+    def extend(self, multipliers, timestamps=None):
+        """Indexe un bloc de tours (chargement initial) sans boucle Python par tour."""
+        values = np.asarray(multipliers, dtype=float)
+        n = len(values)
+        if n == 0:
+            return
+        times = np.full(n, np.nan) if timestamps is None else np.asarray(timestamps, dtype=float)
+        bins = hist_bins(values)
+
+        self._overall.add_many(np.zeros(n, dtype=np.int64), values, bins)
+        valid = ~np.isnan(times)
+        hours, dows = _hour_dow(times[valid])
+        self._hour.add_many(hours, values[valid], bins[valid])
+        self._dow.add_many(dows, values[valid], bins[valid])
+
+        # Tours non conservés dans l'anneau : seuls les cumuls avancent
+        keep = min(n, self.capacity)
+        lead = n - keep
+        overflow = max(0, self._size + keep - self.capacity)
+        if lead:
+            self._evicted_time = np.fmax(self._evicted_time, times[lead - 1])
+        elif overflow:
+            self._evicted_time = np.fmax(self._evicted_time, self._times[self._start + overflow - 1])
+        self._acc_sum += values[:lead].sum()
+        self._acc_sq += (values[:lead] ** 2).sum()
+        self._acc_hist += np.bincount(bins[:lead], minlength=N_BINS)
+        self._n += lead
+        values, times, bins = values[lead:], times[lead:], bins[lead:]
+
+        # Instantanés d'histogramme aux frontières de bloc couvertes par le bloc conservé
+        first_boundary = -(-self._n // self.block) * self.block
+        boundaries = np.arange(first_boundary, self._n + keep, self.block)
+        if len(boundaries):
+            rounds = self._n + np.arange(keep)
+            counts = np.zeros((len(boundaries) + 1, N_BINS), dtype=np.int64)
+            np.add.at(counts, (np.searchsorted(boundaries, rounds, side="right"), bins), 1)
+            snapshots = self._acc_hist + np.cumsum(counts, axis=0)[:len(boundaries)]
+            self._snapshots[(boundaries // self.block) % self._n_snapshots] = snapshots
+
+        psum = self._acc_sum + np.concatenate(([0.0], np.cumsum(values)[:-1]))
+        psq = self._acc_sq + np.concatenate(([0.0], np.cumsum(values ** 2)[:-1]))
+        first = (self._start + self._size) % self.capacity if self._size < self.capacity else self._start
+        slots = (first + np.arange(keep)) % self.capacity
+        for buf, column in ((self._values, values), (self._times, times), (self._bins, bins),
+                            (self._psum, psum), (self._psq, psq)):
+            buf[slots] = column
+            buf[slots + self.capacity] = column
+        self._size = min(self.capacity, self._size + keep)
+        self._start = (self._start + overflow) % self.capacity
+        self._acc_sum += values.sum()
+        self._acc_sq += (values ** 2).sum()
+        self._acc_hist += np.bincount(bins, minlength=N_BINS)
+        self._n += keep
+        self._rebase()
+
+    def _rebase(self):
+        # Les sommes préfixes ne servent qu'en différences : les ramener au plus ancien
+        # tour conservé borne leur amplitude (et l'erreur d'arrondi) à celle de la fenêtre
+        if self._size == 0:
+            return
+        base_sum = self._psum[self._start]
+        base_sq = self._psq[self._start]
+        self._psum -= base_sum
+        self._psq -= base_sq
+        self._acc_sum -= base_sum
+        self._acc_sq -= base_sq
+
+    # --- Requêtes ---
+
+    def _prefix(self, r):
+        """(somme, somme des carrés) des tours de numéro < r, pour r dans la fenêtre conservée."""
+        pos = r - (self._n - self._size)
+        if pos >= self._size:
+            return self._acc_sum, self._acc_sq
+        return self._psum[self._start + pos], self._psq[self._start + pos]
+
+    def _cum_hist(self, r):
+        """Histogramme cumulé des tours de numéro < r, depuis l'instantané de bloc suivant r."""
+        oldest = self._n - self._size
+        k = -(-r // self.block)
+        if k * self.block >= self._n:
+            hist, end = self._acc_hist, self._n
+        else:
+            hist, end = self._snapshots[k % self._n_snapshots], k * self.block
+        between = self._bins[self._start + r - oldest:self._start + end - oldest]
+        return hist - np.bincount(between, minlength=N_BINS)
+
+    def _range(self, a, b):
+        """Statistiques des tours de numéro absolu a <= r < b."""
+        if b <= a:
+            return RangeStats()
+        sum_a, sq_a = self._prefix(a)
+        sum_b, sq_b = self._prefix(b)
+        return RangeStats(b - a, sum_b - sum_a, sq_b - sq_a, self._cum_hist(b) - self._cum_hist(a))
+
+    def _older_history(self):
+        # Tours plus anciens que la fenêtre : évincés, ou connus seulement des compartiments (checkpoint)
+        return self._overall.count[0] > self._size
+
+    def _older_gap(self):
+        # `older` en retard (archive pas encore écrite) : des tours évincés n'y sont pas encore
+        newest = self.older.last_timestamp()
+        return newest is not None and newest < self._evicted_time
+
+    def last(self, n):
+        """
+        Les `n` derniers tours ; au-delà de la fenêtre, les plus anciens viennent de `older`
+        (`truncated` si elle n'en a pas assez, ou sans elle).
+        """
+        stats = self._range(self._n - min(int(n), self._size), self._n)
+        missing = int(n) - self._size
+        if missing > 0 and self._older_history():
+            if self.older is not None and self._size:
+                older = self.older.last_stats(missing, self._times[self._start])
+                stats = older + stats
+                stats.truncated = older.count < missing or self._older_gap()
+            else:
+                stats.truncated = True
+        return stats
+
+    def between(self, start, end):
+        """
+        Tours d'horodatage start <= t <= end (secondes epoch). La partie antérieure à la
+        fenêtre vient de `older` ; `truncated` si des tours plus anciens que la fenêtre
+        peuvent tomber dans la plage sans y être comptés.
+        """
+        times = self._times[self._start:self._start + self._size]
+        oldest = self._n - self._size
+        stats = self._range(oldest + int(np.searchsorted(times, start, side="left")),
+                            oldest + int(np.searchsorted(times, end, side="right")))
+        if self._older_history():
+            # Sans éviction vue (état restauré), la limite connue est le plus ancien tour conservé
+            boundary = self._evicted_time if np.isfinite(self._evicted_time) else (times[0] if len(times) else np.inf)
+            stats.truncated = bool(start <= boundary)
+            if stats.truncated and self.older is not None:
+                # Tours strictement antérieurs au plus ancien conservé : pas de double compte
+                upper = min(times[0], np.nextafter(end, np.inf)) if len(times) else np.nextafter(end, np.inf)
+                older = self.older.range_stats(start, upper)
+                stats = older + stats
+                stats.truncated = older.truncated or self._older_gap()
+        return stats
+
+    def since(self, seconds, now=None):
+        """Tours des `seconds` dernières secondes (heure murale courante par défaut)."""
+        now = pd.Timestamp.now().value / 1e9 if now is None else now
+        return self.between(now - seconds, now)
+
+    def overall(self):
+        """Tout l'historique indexé."""
+        return self._overall.stats(0)
+
+    def hour_of_day(self, hour):
+        return self._hour.stats(hour)
+
+    def day_of_week(self, day):
+        """Jour de la semaine, 0 = lundi."""
+        return self._dow.stats(day)
+
+    def hour_of_day_stats(self):
+        """(nombre, somme) par heure, au format de StatisticalStrategy.set_hour_stats / predict(hour_stats=...)."""
+        return self._hour.count.copy(), self._hour.total.copy()
+
+    # --- Checkpoint : seuls les compartiments couvrent plus que la fenêtre ---
+
+    def get_state(self):
+        return {"overall": self._overall.get_state(), "hour": self._hour.get_state(),
+                "dow": self._dow.get_state()}
+
+    def set_state(self, state):
+        self._overall.set_state(state["overall"])
+        self._hour.set_state(state["hour"])
+        self._dow.set_state(state["dow"])
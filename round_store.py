@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+from round_index import RoundIndex
+
+COLUMNS = ('multiplier', 'timestamp', 'prediction')
+
+def to_epoch(timestamp):
+    """Convertit un horodatage (datetime, str, Timestamp) en secondes, heure murale conservée.
+    Les valeurs numériques sont supposées déjà en secondes."""
+    if timestamp is None:
+        return np.nan
+    if isinstance(timestamp, (int, float, np.number)):
+        return float(timestamp)
+    return pd.Timestamp(timestamp).value / 1e9
+
+def to_epochs(timestamps):
+    """Version vectorisée de to_epoch ; les valeurs numériques sont supposées déjà en secondes."""
+    values = np.asarray(timestamps)
+    if np.issubdtype(values.dtype, np.number):
+        return values.astype(float)
+    stamps = pd.DatetimeIndex(pd.to_datetime(values))
+    epochs = stamps.as_unit('ns').asi8 / 1e9
+    epochs[stamps.isna()] = np.nan
+    return epochs
+
+class RoundStore:
+    """
+    Stockage en colonnes des derniers tours (multiplicateur, horodatage, prédiction).
+
+    Chaque colonne est un tampon circulaire NumPy préalloué de taille 2 * capacity :
+    chaque écriture est dupliquée dans la moitié miroir, ce qui garantit que les
+    `capacity` derniers tours sont toujours contigus. Un ajout ne copie donc jamais
+    les données existantes et les vues renvoyées aux stratégies sont sans copie.
+
+    Avec `indexed=True`, un RoundIndex de même capacité (statistiques par plage de
+    tours ou de temps, heure de la journée, jour de la semaine) suit chaque ajout.
+    """
+
+    def __init__(self, capacity=2000, indexed=False):
+        if capacity <= 0:
+            raise ValueError("capacity doit être strictement positive")
+        self.capacity = int(capacity)
+        self.index = RoundIndex(self.capacity) if indexed else None
+        self._buffers = {col: np.full(2 * self.capacity, np.nan) for col in COLUMNS}
+        self._start = 0
+        self._size = 0
+        self.total = 0  # Nombre de tours ajoutés depuis la création
+
+    def __len__(self):
+        return self._size
+
+    def _write(self, slot, multiplier, timestamp, prediction):
+        for col, value in zip(COLUMNS, (multiplier, timestamp, prediction)):
+            buf = self._buffers[col]
+            buf[slot] = value
+            buf[slot + self.capacity] = value
+
+    def append(self, multiplier, timestamp=None, prediction=None):
+        """Ajoute un tour en O(1) ; le plus ancien est écrasé quand le tampon est plein."""
+        if self._size < self.capacity:
+            slot = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self.capacity
+        epoch = to_epoch(timestamp)
+        self._write(slot, float(multiplier), epoch, np.nan if prediction is None else float(prediction))
+        if self.index is not None:
+            self.index.append(multiplier, epoch)
+        self.total += 1
+
+    def extend(self, multipliers, timestamps=None, predictions=None):
+        """Ajout en bloc (chargement initial) ; seuls les `capacity` derniers tours sont gardés."""
+        multipliers = np.asarray(multipliers, dtype=float)
+        n = len(multipliers)
+        if n == 0:
+            return
+        columns = {
+            'multiplier': multipliers,
+            'timestamp': np.full(n, np.nan) if timestamps is None else to_epochs(timestamps),
+            'prediction': (np.full(n, np.nan) if predictions is None
+                           else np.asarray(predictions, dtype=float)),
+        }
+        keep = min(n, self.capacity)
+        # Les positions cibles sont calculées d'un bloc, sans boucle Python par tour
+        first = (self._start + self._size) % self.capacity if self._size < self.capacity else self._start
+        slots = (first + np.arange(keep)) % self.capacity
+        for col, values in columns.items():
+            buf = self._buffers[col]
+            buf[slots] = values[n - keep:]
+            buf[slots + self.capacity] = values[n - keep:]
+        overflow = max(0, self._size + keep - self.capacity)
+        self._size = min(self.capacity, self._size + keep)
+        self._start = (self._start + overflow) % self.capacity
+        if self.index is not None:
+            self.index.extend(multipliers, columns['timestamp'])
+        self.total += n
+
+    def view(self, column='multiplier'):
+        """Vue contiguë en lecture seule (sans copie) des tours stockés, du plus ancien au plus récent."""
+        v = self._buffers[column][self._start:self._start + self._size]
+        v.flags.writeable = False
+        return v
+
+    @property
+    def multipliers(self):
+        return self.view('multiplier')
+
+    @property
+    def timestamps(self):
+        return self.view('timestamp')
+
+    @property
+    def predictions(self):
+        return self.view('prediction')
+
+    def tail(self, n, column='multiplier'):
+        return self.view(column)[-n:] if n > 0 else self.view(column)[:0]
+
+    def last(self, column='multiplier'):
+        """Dernière valeur de la colonne, ou None si le store est vide."""
+        if self._size == 0:
+            return None
+        return float(self._buffers[column][self._start + self._size - 1])
+
+    def set_last_prediction(self, prediction):
+        """Renseigne la prédiction calculée après le dernier tour ajouté."""
+        if self._size == 0:
+            return
+        slot = (self._start + self._size - 1) % self.capacity
+        value = np.nan if prediction is None else float(prediction)
+        buf = self._buffers['prediction']
+        buf[slot] = value
+        buf[slot + self.capacity] = value
+
+    def to_frame(self):
+        """Copie en DataFrame (usage ponctuel : debug, implémentation de référence)."""
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(self.timestamps, unit='s'),
+            'multiplier': self.multipliers,
+            'prediction': self.predictions,
+        })
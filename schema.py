@@ -0,0 +1,321 @@
+"""
+Schéma de jetx_logs : table partitionnée par mois sur `timestamp`, type de tour en enum
+(4 octets au lieu d'un texte), multiplicateur exact en NUMERIC(10, 2).
+
+Les partitions des mois à venir sont créées d'avance par le writer du bot ; la rétention
+détache puis supprime des partitions entières (ni DELETE massif, ni VACUUM derrière).
+Une table jetx_logs existante, non partitionnée, se convertit en ligne avec `migrate` :
+copie par blocs d'id pendant que le bot continue d'écrire, puis bascule sous un verrou court.
+
+    python schema.py status
+    python schema.py migrate --chunk 50000     # relançable : reprend après le dernier bloc copié
+    python schema.py retention --months 12
+"""
+import argparse
+import datetime
+import logging
+import os
+import sys
+import time
+
+TABLE = "jetx_logs"
+STAGING = "jetx_logs_new"
+RETIRED = "jetx_logs_old"
+ROUND_TYPES = ("live", "result")
+
+def _table_ddl(name):
+    # Clé primaire nommée : jetx_logs_pkey est déjà pris par la table d'origine pendant la migration
+    return f'''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id BIGSERIAL,
+            timestamp TIMESTAMP NOT NULL,
+            multiplier NUMERIC(10, 2),
+            type jetx_round_type,
+            prediction REAL,
+            CONSTRAINT jetx_logs_pk PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    '''
+
+# Répliqués sur chaque partition ; (type, id) pour les reprises par id, (type, timestamp) pour les plages
+INDEXES = {
+    "jetx_logs_type_id_idx": "(type, id)",
+    "jetx_logs_type_ts_idx": "(type, timestamp)",
+}
+
+def month_start(value):
+    return datetime.datetime(value.year, value.month, 1)
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f"{TABLE}_p{month:%Y%m}"
+
+def table_kind(cur, name):
+    """'p' (partitionnée), 'r' (table simple) ou None si la table n'existe pas."""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (name,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def partitions(cur, parent=TABLE):
+    """Partitions mensuelles de `parent`, triées : [(début du mois, nom)]."""
+    cur.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(%s)", (parent,))
+    months = []
+    for (name,) in cur.fetchall():
+        try:
+            months.append((datetime.datetime.strptime(name[-6:], "%Y%m"), name))
+        except ValueError:
+            continue
+    return sorted(months)
+
+def ensure_round_type(cur, labels=ROUND_TYPES):
+    cur.execute("SELECT 1 FROM pg_type WHERE typname = 'jetx_round_type'")
+    if cur.fetchone() is None:
+        cur.execute("CREATE TYPE jetx_round_type AS ENUM (" + ", ".join(["%s"] * len(labels)) + ")", tuple(labels))
+        return
+    cur.execute("SELECT enumlabel FROM pg_enum WHERE enumtypid = 'jetx_round_type'::regtype")
+    existing = {row[0] for row in cur.fetchall()}
+    # ADD VALUE seulement si nécessaire : avant PostgreSQL 12, il est refusé dans une transaction
+    for label in labels:
+        if label not in existing:
+            cur.execute("ALTER TYPE jetx_round_type ADD VALUE %s", (label,))
+
+def create_table(cur, name=TABLE):
+    cur.execute(_table_ddl(name))
+    for index, columns in INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {name} {columns}")
+
+def ensure_partitions(cur, first, last, parent=TABLE):
+    """Crée les partitions manquantes des mois de `first` à `last` inclus ; renvoie leurs noms."""
+    existing = {name for _, name in partitions(cur, parent)}
+    created = []
+    month = month_start(first)
+    while month <= last:
+        name = partition_name(month)
+        if name not in existing:
+            # Bornes en littéraux simples : PostgreSQL 11 refuse un cast (datetime -> '...'::timestamp)
+            cur.execute(f"CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM (%s) TO (%s)",
+                        (f"{month:%Y-%m-%d}", f"{add_months(month, 1):%Y-%m-%d}"))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+def ensure_schema(cur, ahead=2):
+    """
+    Crée jetx_logs partitionnée si elle n'existe pas et les partitions jusqu'à `ahead` mois
+    après le mois courant. Une table d'avant le partitionnement est laissée en place (avec
+    son index historique) jusqu'à `python schema.py migrate`. Renvoie True si partitionnée.
+    """
+    kind = table_kind(cur, TABLE)
+    if kind == "r":
+        logging.warning(f"{TABLE} n'est pas partitionnée : lancez `python schema.py migrate`.")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_jetx_logs_type_id ON {TABLE} (type, id)")
+        return False
+    if kind is None:
+        ensure_round_type(cur)
+        create_table(cur)
+    now = month_start(datetime.datetime.now())
+    ensure_partitions(cur, now, add_months(now, ahead))
+    return True
+
+def drop_partitions(cur, retain_months, now=None):
+    """
+    Détache et supprime les partitions entièrement antérieures aux `retain_months` derniers
+    mois (mois courant compris), ainsi que les prédictions des tours supprimés.
+    """
+    cutoff = add_months(month_start(now or datetime.datetime.now()), 1 - max(1, retain_months))
+    dropped = []
+    for month, name in partitions(cur):
+        if add_months(month, 1) > cutoff:
+            break
+        cur.execute(f"SELECT max(id) FROM {name}")
+        last_id = cur.fetchone()[0]
+        cur.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        cur.execute(f"DROP TABLE {name}")
+        if last_id is not None and table_kind(cur, "jetx_predictions"):
+            cur.execute("DELETE FROM jetx_predictions WHERE round_id <= %s", (last_id,))
+        dropped.append(name)
+    return dropped
+
+class PartitionMaintainer:
+    """
+    Partitions à venir et rétention, depuis le thread d'écriture du bot. `connect` est un
+    context manager fournissant une connexion psycopg2 (PostgresSink.connection).
+    """
+
+    def __init__(self, connect, ahead=2, retain_months=None, min_interval=3600.0):
+        self.connect = connect
+        self.ahead = ahead
+        self.retain_months = retain_months
+        self.min_interval = min_interval
+        self._last_run = 0.0
+
+    def update(self):
+        with self.connect() as conn:
+            with conn.cursor() as cur:
+                if table_kind(cur, TABLE) != "p":
+                    return [], []
+                now = month_start(datetime.datetime.now())
+                created = ensure_partitions(cur, now, add_months(now, self.ahead))
+                dropped = drop_partitions(cur, self.retain_months) if self.retain_months else []
+            conn.commit()
+        return created, dropped
+
+    def maybe_update(self):
+        if time.monotonic() - self._last_run < self.min_interval:
+            return
+        self._last_run = time.monotonic()
+        try:
+            created, dropped = self.update()
+            if created or dropped:
+                logging.info(f"Partitions : {len(created)} créée(s), {len(dropped)} supprimée(s) "
+                             f"({', '.join(dropped) or 'aucune'}).")
+        except Exception as e:
+            logging.warning(f"Maintenance des partitions impossible : {e}")
+
+def _copy_range(cur, after, upto=None):
+    query = (f"INSERT INTO {STAGING} (id, timestamp, multiplier, type, prediction) "
+             f"SELECT id, timestamp, round(multiplier::numeric, 2), type::jetx_round_type, prediction "
+             f"FROM {TABLE} WHERE id > %s AND timestamp IS NOT NULL")
+    params = [after]
+    if upto is not None:
+        query += " AND id <= %s"
+        params.append(upto)
+    cur.execute(query, params)
+    return cur.rowcount
+
+def migrate(conn, chunk=50_000, ahead=2, pause=0.0, drop_old=False, lock_timeout="10s"):
+    """
+    Convertit une jetx_logs non partitionnée sans arrêter le bot :
+
+    1. copie par tranches de `chunk` ids dans jetx_logs_new (une transaction par tranche,
+       `pause` secondes entre deux pour laisser respirer la DB) ;
+    2. sous verrou exclusif (quelques ms à quelques s), copie les lignes arrivées entre-temps,
+       recale la séquence des ids et échange les noms ; l'ancienne table devient jetx_logs_old.
+
+    Les ids sont conservés (jetx_predictions, agrégats et checkpoints restent valides). Les
+    lignes sans horodatage ne peuvent aller dans aucune partition : elles restent dans
+    jetx_logs_old. Renvoie le nombre de lignes copiées.
+    """
+    with conn.cursor() as cur:
+        kind = table_kind(cur, TABLE)
+        if kind != "r":
+            if kind is None:
+                ensure_schema(cur, ahead)
+            conn.commit()
+            logging.info(f"{TABLE} est déjà partitionnée, rien à migrer.")
+            return 0
+        cur.execute(f"SELECT DISTINCT type FROM {TABLE} WHERE type IS NOT NULL")
+        labels = [row[0] for row in cur.fetchall()]
+        extra = sorted(set(labels) - set(ROUND_TYPES))
+        if extra:
+            logging.info(f"Types de tour supplémentaires ajoutés à l'enum : {', '.join(extra)}")
+        ensure_round_type(cur, ROUND_TYPES + tuple(extra))
+        conn.commit()
+
+        cur.execute(f"SELECT min(timestamp), max(timestamp), max(id), count(*) - count(timestamp) FROM {TABLE}")
+        first, last, target, undated = cur.fetchone()
+        now = month_start(datetime.datetime.now())
+        create_table(cur, STAGING)
+        ensure_partitions(cur, first or now, max(last or now, add_months(now, ahead)), parent=STAGING)
+        # Reprise d'une migration interrompue : on repart du dernier id copié
+        cur.execute(f"SELECT coalesce(max(id), 0) FROM {STAGING}")
+        done = cur.fetchone()[0]
+        conn.commit()
+        if undated:
+            logging.warning(f"{undated} ligne(s) sans horodatage, laissées dans {RETIRED}.")
+
+        copied, start = 0, time.perf_counter()
+        while target is not None and done < target:
+            upto = min(done + chunk, target)
+            copied += _copy_range(cur, done, upto)
+            conn.commit()
+            done = upto
+            logging.info(f"Migration : ids <= {done} / {target} ({copied} lignes, "
+                         f"{time.perf_counter() - start:.0f} s).")
+            if pause:
+                time.sleep(pause)
+
+        # Bascule : le writer du bot attend la fin du verrou, puis insère dans la nouvelle table
+        cur.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+        cur.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        copied += _copy_range(cur, done)
+        cur.execute("SELECT pg_get_serial_sequence(%s, 'id'), pg_get_serial_sequence(%s, 'id')", (TABLE, STAGING))
+        old_seq, new_seq = cur.fetchone()
+        cur.execute(f"SELECT max(id) FROM {TABLE}")
+        last_id = cur.fetchone()[0] or 0
+        if old_seq:
+            cur.execute(f"SELECT last_value FROM {old_seq}")
+            last_id = max(last_id, cur.fetchone()[0])
+        cur.execute("SELECT setval(%s, %s)", (new_seq, max(last_id, 1)))
+        cur.execute(f"ALTER TABLE {TABLE} RENAME TO {RETIRED}")
+        if old_seq:
+            cur.execute(f"ALTER SEQUENCE {old_seq} RENAME TO {RETIRED}_id_seq")
+        cur.execute(f"ALTER TABLE {STAGING} RENAME TO {TABLE}")
+        cur.execute(f"ALTER SEQUENCE {new_seq} RENAME TO {TABLE}_id_seq")
+        conn.commit()
+        logging.info(f"Bascule effectuée : {copied} lignes copiées, ancienne table conservée sous {RETIRED}.")
+
+        cur.execute(f"SELECT count(*) FROM {RETIRED} WHERE timestamp IS NOT NULL")
+        expected = cur.fetchone()[0]
+        cur.execute(f"SELECT count(*) FROM {TABLE} WHERE id <= %s", (last_id,))
+        actual = cur.fetchone()[0]
+        conn.commit()
+        if actual != expected:
+            logging.error(f"Contrôle : {actual} lignes dans {TABLE} contre {expected} attendues ; "
+                          f"{RETIRED} est conservée.")
+        elif drop_old and not undated:
+            cur.execute(f"DROP TABLE {RETIRED}")
+            conn.commit()
+            logging.info(f"Contrôle OK, {RETIRED} supprimée.")
+        else:
+            logging.info(f"Contrôle OK ({actual} lignes).")
+    return copied
+
+def status(cur):
+    kind = table_kind(cur, TABLE)
+    lines = [f"{TABLE} : " + {"p": "partitionnée", "r": "non partitionnée", None: "absente"}[kind]]
+    for month, name in partitions(cur):
+        cur.execute("SELECT reltuples::bigint, pg_total_relation_size(oid) FROM pg_class WHERE relname = %s", (name,))
+        rows, size = cur.fetchone()
+        lines.append(f"  {name}  {month:%Y-%m}  ~{max(rows, 0)} lignes  {size / 1e6:.1f} Mo")
+    return "\n".join(lines)
+
+def main(argv=None):
+    import psycopg2
+    from persistence import normalize_db_url
+
+    parser = argparse.ArgumentParser(description="Schéma partitionné de jetx_logs")
+    parser.add_argument("command", choices=["status", "migrate", "retention"])
+    parser.add_argument("--chunk", type=int, default=50_000, help="Ids copiés par transaction (migrate)")
+    parser.add_argument("--pause", type=float, default=0.0, help="Pause entre deux blocs (s)")
+    parser.add_argument("--ahead", type=int, default=2, help="Mois créés d'avance")
+    parser.add_argument("--drop-old", action="store_true", help="Supprime jetx_logs_old si le contrôle passe")
+    parser.add_argument("--months", type=int, help="Mois conservés (retention)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        parser.error("DATABASE_URL n'est pas défini.")
+    conn = psycopg2.connect(normalize_db_url(db_url))
+    try:
+        if args.command == "migrate":
+            migrate(conn, args.chunk, args.ahead, args.pause, args.drop_old)
+        elif args.command == "retention":
+            if not args.months:
+                parser.error("--months est requis.")
+            with conn.cursor() as cur:
+                dropped = drop_partitions(cur, args.months)
+            conn.commit()
+            print(f"{len(dropped)} partition(s) supprimée(s) : {', '.join(dropped) or 'aucune'}")
+        with conn.cursor() as cur:
+            print(status(cur))
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,8 @@
 
 # Export des chemins pour Render
 export PORT=${PORT:-10000}
+# Le dashboard suit les tours en direct sur le serveur HTTP du bot (même conteneur)
+export BOT_EVENTS_URL=${BOT_EVENTS_URL:-http://127.0.0.1:${METRICS_PORT:-9100}/events}
 
 echo "--- Démarrage du Bot JetX sur Render ---"
 
@@ -1,18 +1,96 @@
 import numpy as np
 import pandas as pd
+from collections import deque
 from datetime import datetime
 
+def _ratio(num, den, default):
+    """num / den, ou `default` quand den <= 0 ; accepte scalaires et tableaux."""
+    if np.ndim(den) == 0:
+        return num / den if den > 0 else default
+    safe = np.where(den > 0, den, 1.0)
+    return np.where(den > 0, num / safe, default)
+
+# Stratégies sélectionnables par leur nom dans config.yaml
+STRATEGIES = {}
+
+def register_strategy(name):
+    """Décorateur : enregistre une classe de stratégie sous `name`."""
+    def decorator(cls):
+        cls.name = name
+        STRATEGIES[name] = cls
+        return cls
+    return decorator
+
+def create_strategy(name, **params):
+    cls = STRATEGIES.get(name)
+    if cls is None:
+        raise ValueError(f"Stratégie inconnue : {name} (disponibles : {', '.join(sorted(STRATEGIES))})")
+    return cls(**params)
+
 class BaseStrategy:
+    name = None
+
     def predict(self, history, df_full=None):
         raise NotImplementedError
 
+    def params(self):
+        """Paramètres identifiant la variante (comparés à la restauration d'un checkpoint)."""
+        return {}
+
+    @classmethod
+    def batch(cls, strategies):
+        """Évaluateur groupé de plusieurs instances de la classe ; par défaut une boucle."""
+        return SequentialBatch(strategies)
+
+    def reset(self, history=(), timestamps=None):
+        """Réinitialise l'état streaming à partir d'un historique existant."""
+        raise NotImplementedError
+
+    def update(self, multiplier, timestamp=None):
+        """Mode streaming : intègre un nouveau tour et renvoie la prochaine prédiction."""
+        raise NotImplementedError
+
+    def update_many(self, multipliers, timestamp=None):
+        """Intègre plusieurs tours (du plus ancien au plus récent) ; renvoie la prédiction après le dernier."""
+        prediction = None
+        for multiplier in multipliers:
+            prediction = self.update(multiplier, timestamp)
+        return prediction
+
+    def set_hour_stats(self, counts, sums):
+        """(nombre, somme) par heure de la journée sur tout l'historique ; ignoré par défaut."""
+
+    def get_state(self):
+        """État streaming sérialisable (JSON) pour les checkpoints."""
+        raise NotImplementedError
+
+    def set_state(self, state):
+        """Restaure un état de get_state() ; renvoie False s'il est incompatible."""
+        raise NotImplementedError
+
+@register_strategy("statistical")
 class StatisticalStrategy(BaseStrategy):
-    def __init__(self, margin_factor=1.5):
+    def __init__(self, margin_factor=1.5, ema_alpha=0.1, recent_window=10):
         self.margin_factor = margin_factor
+        self.ema_alpha = ema_alpha
+        self.recent_window = recent_window
+        self.reset()
 
-    def predict(self, history, df_full=None):
+    def params(self):
+        return {"margin_factor": self.margin_factor, "ema_alpha": self.ema_alpha,
+                "recent_window": self.recent_window}
+
+    @classmethod
+    def batch(cls, strategies):
+        # Seule, une instance est plus rapide sans la surcharge des tableaux NumPy
+        return StatisticalBatch(strategies) if len(strategies) > 1 else SequentialBatch(strategies)
+
+    def predict(self, history, df_full=None, hour_stats=None):
         """
         Analyse l'historique complet, la tendance récente et les statistiques horaires.
+        Implémentation de référence (O(n) par appel) ; voir update() pour le mode streaming.
+        `hour_stats` (nombre, somme) par heure de la journée, p. ex. RoundIndex.hour_of_day_stats()
+        ou les agrégats jetx_rollup_hour, remplace le parcours de df_full par une lecture O(1).
         """
         if len(history) < 5:
             return None, None, 0, None
@@ -23,47 +101,401 @@ class StatisticalStrategy(BaseStrategy):
         # 1. Analyse globale & EMA
         global_mean = series.mean()
         global_std = series.std()
-        ema = series.ewm(alpha=0.1).mean().iloc[-1]
+        ema = series.ewm(alpha=self.ema_alpha).mean().iloc[-1]
         
         # 2. Analyse Horaires (si les données complètes sont fournies)
         hour_factor = 1.0
-        if df_full is not None and not df_full.empty:
-            try:
-                df_full['timestamp'] = pd.to_datetime(df_full['timestamp'])
-                df_full['hour'] = df_full['timestamp'].dt.hour
-                
-                # Moyenne spécifique à cette heure de la journée
-                hour_data = df_full[df_full['hour'] == current_hour]
-                if len(hour_data) >= 10:
-                    hour_mean = hour_data['multiplier'].mean()
-                    hour_factor = hour_mean / global_mean if global_mean > 0 else 1.0
-            except:
-                pass
+        if hour_stats is not None:
+            hour_counts, hour_sums = hour_stats
+            if hour_counts[current_hour] >= 10:
+                hour_factor = _ratio(hour_sums[current_hour] / hour_counts[current_hour], global_mean, 1.0)
+        elif df_full is not None and not df_full.empty and 'timestamp' in df_full:
+            # Sans colonne timestamp, le facteur horaire reste neutre (plus d'échec silencieux)
+            hours = pd.DatetimeIndex(pd.to_datetime(df_full['timestamp'])).hour
+            # Moyenne spécifique à cette heure de la journée
+            hour_data = df_full['multiplier'][hours == current_hour]
+            if len(hour_data) >= 10:
+                hour_factor = _ratio(hour_data.mean(), global_mean, 1.0)
 
         # 3. Analyse de tendance court terme
-        recent_window = min(10, len(history))
+        recent_window = min(self.recent_window, len(history))
         recent_mean = series.tail(recent_window).mean()
-        trend_factor = recent_mean / global_mean if global_mean > 0 else 1
+
+        return self._combine(global_mean, global_std, ema, recent_mean, hour_factor)
+
+    def _combine(self, global_mean, global_std, ema, recent_mean, hour_factor, margin_factor=None):
+        """Étapes communes aux modes batch, streaming et backtest (scalaires ou tableaux NumPy)."""
+        margin_factor = self.margin_factor if margin_factor is None else margin_factor
+        trend_factor = _ratio(recent_mean, global_mean, 1)
         
         # 4. Calcul de la prédiction finale
         # On combine EMA (70%), Tendance (20%) et Facteur Horaire (10%)
         next_pred = (ema * 0.7) + (global_mean * trend_factor * 0.2) + (global_mean * hour_factor * 0.1)
         
         # 5. Bornes et Confiance
-        lower_bound = max(1.0, next_pred - (self.margin_factor * global_std * 0.4))
-        upper_bound = next_pred + (self.margin_factor * global_std * 0.4)
+        lower_bound = np.maximum(1.0, next_pred - (margin_factor * global_std * 0.4))
+        upper_bound = next_pred + (margin_factor * global_std * 0.4)
         
-        volatility = global_std / global_mean if global_mean > 0 else 1
-        confidence = min(95, max(10, 100 - (volatility * 45)))
+        volatility = _ratio(global_std, global_mean, 1)
+        confidence = np.clip(100 - (volatility * 45), 10, 95)
         
         return lower_bound, upper_bound, confidence, next_pred
 
+    # --- Mode streaming (O(1) par tour) ---
+
+    def reset(self, history=(), timestamps=None):
+        """
+        Initialise l'état incrémental en une seule passe vectorisée sur l'historique.
+        `timestamps` (optionnel) alimente les statistiques par heure de la journée.
+        """
+        values = np.asarray(history, dtype=float)
+        n = len(values)
+        self._count = n
+        self._mean = float(values.mean()) if n else 0.0
+        # Somme des carrés des écarts (Welford)
+        self._m2 = float(((values - self._mean) ** 2).sum()) if n else 0.0
+        # EMA pandas (adjust=True) : numérateur et dénominateur récursifs
+        decay = 1.0 - self.ema_alpha
+        weights = decay ** np.arange(n - 1, -1, -1, dtype=float)
+        self._ema_num = float((weights * values).sum())
+        self._ema_den = float(weights.sum())
+        self._recent = deque(values[-self.recent_window:].tolist(), maxlen=self.recent_window)
+
+        self._hour_count = np.zeros(24, dtype=np.int64)
+        self._hour_sum = np.zeros(24, dtype=float)
+        if timestamps is not None and n:
+            stamps = pd.DatetimeIndex(pd.to_datetime(timestamps))
+            valid = ~stamps.isna()
+            hours = stamps[valid].hour.to_numpy()
+            np.add.at(self._hour_count, hours, 1)
+            np.add.at(self._hour_sum, hours, values[valid])
+
+    def set_hour_stats(self, counts, sums):
+        """Remplace les statistiques par heure de l'état streaming (p. ex. depuis les agrégats)."""
+        self._hour_count = np.asarray(counts, dtype=np.int64).copy()
+        self._hour_sum = np.asarray(sums, dtype=float).copy()
+
+    def update(self, multiplier, timestamp=None):
+        """Intègre un nouveau tour et renvoie (lower, upper, confidence, next) comme predict()."""
+        self._ingest(multiplier, timestamp)
+        return self.current_prediction()
+
+    def update_many(self, multipliers, timestamp=None):
+        self._ingest_many(multipliers, timestamp)
+        return self.current_prediction()
+
+    def _ingest(self, multiplier, timestamp=None):
+        x = float(multiplier)
+        self._count += 1
+        delta = x - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (x - self._mean)
+
+        decay = 1.0 - self.ema_alpha
+        self._ema_num = self._ema_num * decay + x
+        self._ema_den = self._ema_den * decay + 1.0
+        self._recent.append(x)
+
+        if timestamp is not None:
+            hour = pd.Timestamp(timestamp).hour
+            self._hour_count[hour] += 1
+            self._hour_sum[hour] += x
+
+    def _ingest_many(self, multipliers, timestamp=None):
+        """Équivalent de _ingest sur un lot, en une passe : fusion des moments (Chan) et EMA."""
+        values = np.asarray(multipliers, dtype=float)
+        k = len(values)
+        if k == 0:
+            return
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+        n = self._count + k
+        delta = batch_mean - self._mean
+        self._m2 += batch_m2 + delta * delta * self._count * k / n
+        self._mean += delta * k / n
+        self._count = n
+
+        decay = 1.0 - self.ema_alpha
+        weights = decay ** np.arange(k - 1, -1, -1, dtype=float)
+        self._ema_num = self._ema_num * decay ** k + float((weights * values).sum())
+        self._ema_den = self._ema_den * decay ** k + float(weights.sum())
+        self._recent.extend(values.tolist())
+
+        if timestamp is not None:
+            hour = pd.Timestamp(timestamp).hour
+            self._hour_count[hour] += k
+            self._hour_sum[hour] += float(values.sum())
+
+    def _moments(self):
+        """(moyenne, écart-type, facteur horaire) de l'état incrémental ; à partir de 5 tours."""
+        global_mean = self._mean
+        global_std = (self._m2 / (self._count - 1)) ** 0.5
+        hour_factor = 1.0
+        current_hour = datetime.now().hour
+        if self._hour_count[current_hour] >= 10:
+            hour_mean = self._hour_sum[current_hour] / self._hour_count[current_hour]
+            hour_factor = _ratio(hour_mean, global_mean, 1.0)
+        return global_mean, global_std, hour_factor
+
+    def current_prediction(self):
+        """Prédiction à partir de l'état incrémental courant, sans intégrer de nouveau tour."""
+        if self._count < 5:
+            return None, None, 0, None
+
+        global_mean, global_std, hour_factor = self._moments()
+        ema = self._ema_num / self._ema_den
+        recent_mean = sum(self._recent) / len(self._recent)
+        return self._combine(global_mean, global_std, ema, recent_mean, hour_factor)
+
+    def get_state(self):
+        return {
+            "strategy": "statistical",
+            "ema_alpha": self.ema_alpha,
+            "recent_window": self.recent_window,
+            "count": self._count,
+            "mean": self._mean,
+            "m2": self._m2,
+            "ema_num": self._ema_num,
+            "ema_den": self._ema_den,
+            "recent": list(self._recent),
+            "hour_count": self._hour_count.tolist(),
+            "hour_sum": self._hour_sum.tolist(),
+        }
+
+    def set_state(self, state):
+        # Un état calculé avec d'autres paramètres ne peut pas être réutilisé
+        if (state.get("strategy") != "statistical" or state.get("ema_alpha") != self.ema_alpha
+                or state.get("recent_window") != self.recent_window):
+            return False
+        self._count = state["count"]
+        self._mean = state["mean"]
+        self._m2 = state["m2"]
+        self._ema_num = state["ema_num"]
+        self._ema_den = state["ema_den"]
+        self._recent = deque(state["recent"], maxlen=self.recent_window)
+        self._hour_count = np.array(state["hour_count"], dtype=np.int64)
+        self._hour_sum = np.array(state["hour_sum"], dtype=float)
+        return True
+
+@register_strategy("martingale")
 class MartingaleStrategy(BaseStrategy):
+    def __init__(self):
+        self.reset()
+
     def predict(self, history, df_full=None):
-        if not history:
+        if len(history) == 0:
             return 1.2, 2.0, 50, 1.5
         recent_lows = sum(1 for x in history[-5:] if x < 1.5)
         if recent_lows >= 3:
             return 1.1, 1.4, 75, 1.25
         else:
             return 1.5, 3.0, 40, 2.1
+
+    def reset(self, history=(), timestamps=None):
+        self._recent = deque(list(history[-5:]), maxlen=5)
+
+    def update(self, multiplier, timestamp=None):
+        self._recent.append(float(multiplier))
+        return self.predict(list(self._recent))
+
+    def get_state(self):
+        return {"strategy": "martingale", "recent": list(self._recent)}
+
+    def set_state(self, state):
+        if state.get("strategy") != "martingale":
+            return False
+        self._recent = deque(state["recent"], maxlen=5)
+        return True
+
+
+class SequentialBatch:
+    """
+    Évaluateur groupé par défaut : update() de chaque instance tour à tour. Les
+    prédictions sont renvoyées en tableau (4, N) : lower, upper, confidence, next
+    (NaN tant qu'une stratégie n'a pas assez d'historique).
+    """
+
+    def __init__(self, strategies):
+        self.strategies = list(strategies)
+
+    def reset(self, history=(), timestamps=None):
+        for strategy in self.strategies:
+            strategy.reset(history, timestamps)
+
+    def update(self, multiplier, timestamp=None):
+        predictions = [strategy.update(multiplier, timestamp) for strategy in self.strategies]
+        return np.array(predictions, dtype=float).T
+
+    def update_many(self, multipliers, timestamp=None):
+        predictions = [strategy.update_many(multipliers, timestamp) for strategy in self.strategies]
+        return np.array(predictions, dtype=float).T
+
+    def set_hour_stats(self, counts, sums):
+        for strategy in self.strategies:
+            strategy.set_hour_stats(counts, sums)
+
+    def get_state(self):
+        return [strategy.get_state() for strategy in self.strategies]
+
+    def set_state(self, state):
+        if len(state) != len(self.strategies):
+            return False
+        return all(strategy.set_state(s) for strategy, s in zip(self.strategies, state))
+
+class StatisticalBatch:
+    """
+    N paramétrages de StatisticalStrategy évalués en un passage vectorisé par tour.
+    Moyenne, variance, fenêtre récente et statistiques horaires sont communes ; seules
+    les EMA (une par alpha distinct) et les moyennes récentes (une par fenêtre distincte)
+    sont tenues à part. Le coût par tour dépend du nombre de valeurs distinctes de ces
+    paramètres, pas du nombre de stratégies.
+    """
+
+    def __init__(self, strategies):
+        self.strategies = list(strategies)
+        self.margin = np.array([s.margin_factor for s in self.strategies], dtype=float)
+        self.alphas, self._alpha_idx = np.unique([s.ema_alpha for s in self.strategies], return_inverse=True)
+        self.windows, self._window_idx = np.unique([s.recent_window for s in self.strategies], return_inverse=True)
+        self._decay = 1.0 - self.alphas
+        # Porte l'état commun ; sa fenêtre récente couvre la plus grande fenêtre demandée
+        self._shared = StatisticalStrategy(ema_alpha=float(self.alphas[0]), recent_window=int(self.windows[-1]))
+        self.reset()
+
+    def reset(self, history=(), timestamps=None):
+        values = np.asarray(history, dtype=float)
+        self._shared.reset(values, timestamps)
+        self._ema_num = np.empty(len(self.alphas))
+        self._ema_den = np.empty(len(self.alphas))
+        for i, decay in enumerate(self._decay):
+            weights = decay ** np.arange(len(values) - 1, -1, -1, dtype=float)
+            self._ema_num[i] = (weights * values).sum()
+            self._ema_den[i] = weights.sum()
+
+    def set_hour_stats(self, counts, sums):
+        self._shared.set_hour_stats(counts, sums)
+
+    def update(self, multiplier, timestamp=None):
+        x = float(multiplier)
+        self._shared._ingest(x, timestamp)
+        self._ema_num = self._ema_num * self._decay + x
+        self._ema_den = self._ema_den * self._decay + 1.0
+        return self.current_predictions()
+
+    def update_many(self, multipliers, timestamp=None):
+        values = np.asarray(multipliers, dtype=float)
+        k = len(values)
+        self._shared._ingest_many(values, timestamp)
+        # Une EMA par alpha distinct : poids decay^(k-1-i) de chaque tour du lot
+        weights = self._decay[:, None] ** np.arange(k - 1, -1, -1, dtype=float)
+        self._ema_num = self._ema_num * self._decay ** k + weights @ values
+        self._ema_den = self._ema_den * self._decay ** k + weights.sum(axis=1)
+        return self.current_predictions()
+
+    def current_predictions(self):
+        n = len(self.strategies)
+        if self._shared._count < 5:
+            return np.array([np.full(n, np.nan), np.full(n, np.nan), np.zeros(n), np.full(n, np.nan)])
+        global_mean, global_std, hour_factor = self._shared._moments()
+        ema = (self._ema_num / self._ema_den)[self._alpha_idx]
+        # Moyennes des `w` derniers tours pour chaque fenêtre distincte, par somme cumulée
+        recent = np.fromiter(reversed(self._shared._recent), dtype=float)
+        sizes = np.minimum(self.windows, len(recent))
+        recent_mean = (np.cumsum(recent)[sizes - 1] / sizes)[self._window_idx]
+        predictions = self._shared._combine(global_mean, global_std, ema, recent_mean, hour_factor,
+                                            margin_factor=self.margin)
+        return np.array(np.broadcast_arrays(*predictions), dtype=float)
+
+    def get_state(self):
+        return {
+            "shared": self._shared.get_state(),
+            "alphas": self.alphas.tolist(),
+            "ema_num": self._ema_num.tolist(),
+            "ema_den": self._ema_den.tolist(),
+        }
+
+    def set_state(self, state):
+        if state.get("alphas") != self.alphas.tolist() or not self._shared.set_state(state["shared"]):
+            return False
+        self._ema_num = np.array(state["ema_num"], dtype=float)
+        self._ema_den = np.array(state["ema_den"], dtype=float)
+        return True
+
+def _optional(value):
+    return None if value != value else float(value)
+
+class StrategySet(BaseStrategy):
+    """
+    Stratégies nommées alimentées par le même flux de tours. Les instances d'une même
+    classe partagent l'évaluateur groupé de cette classe (batch()). update() renvoie la
+    prédiction de la stratégie principale ; predict_many() celles de toutes les stratégies.
+    """
+
+    def __init__(self, strategies, primary=None):
+        self.strategies = dict(strategies)
+        if not self.strategies:
+            raise ValueError("Aucune stratégie configurée")
+        self.primary = primary or next(iter(self.strategies))
+        if self.primary not in self.strategies:
+            raise ValueError(f"Stratégie principale inconnue : {self.primary}")
+        by_class = {}
+        for name, strategy in self.strategies.items():
+            by_class.setdefault(type(strategy), []).append(name)
+        self._groups = [(cls.batch([self.strategies[n] for n in names]), names)
+                        for cls, names in by_class.items()]
+        self.last_predictions = {}
+
+    def predict(self, history, df_full=None):
+        return self.strategies[self.primary].predict(history, df_full)
+
+    def reset(self, history=(), timestamps=None):
+        for batch, _ in self._groups:
+            batch.reset(history, timestamps)
+
+    def set_hour_stats(self, counts, sums):
+        for batch, _ in self._groups:
+            batch.set_hour_stats(counts, sums)
+
+    def _collect(self, evaluate):
+        predictions = {}
+        for batch, names in self._groups:
+            lower, upper, confidence, next_pred = evaluate(batch)
+            for i, name in enumerate(names):
+                predictions[name] = (_optional(lower[i]), _optional(upper[i]),
+                                     float(confidence[i]), _optional(next_pred[i]))
+        self.last_predictions = predictions
+        return predictions
+
+    def predict_many(self, multiplier, timestamp=None):
+        """Intègre un tour pour toutes les stratégies ; renvoie {nom: (lower, upper, confidence, next)}."""
+        return self._collect(lambda batch: batch.update(multiplier, timestamp))
+
+    def update(self, multiplier, timestamp=None):
+        return self.predict_many(multiplier, timestamp)[self.primary]
+
+    def update_many(self, multipliers, timestamp=None):
+        """Intègre un lot de tours en une mise à jour par évaluateur ; prédictions après le dernier."""
+        return self._collect(lambda batch: batch.update_many(multipliers, timestamp))[self.primary]
+
+    def specs(self):
+        return {name: {"type": strategy.name, **strategy.params()} for name, strategy in self.strategies.items()}
+
+    def get_state(self):
+        return {
+            "strategy": "set",
+            "members": self.specs(),
+            "groups": [batch.get_state() for batch, _ in self._groups],
+        }
+
+    def set_state(self, state):
+        # Toute stratégie ajoutée, retirée ou reparamétrée invalide l'état
+        if state.get("strategy") != "set" or state.get("members") != self.specs():
+            return False
+        return all(batch.set_state(s) for (batch, _), s in zip(self._groups, state["groups"]))
+
+def build_strategy_set(specs, primary=None):
+    """Construit un StrategySet depuis {nom: {"type": ..., **paramètres}} (section strategies de config.yaml)."""
+    members = {}
+    for name, spec in specs.items():
+        params = dict(spec or {})
+        members[name] = create_strategy(params.pop("type", name), **params)
+    return StrategySet(members, primary)
@@ -0,0 +1,186 @@
+"""
+Supervision des composants longue durée du bot (session navigateur, writer DB).
+
+Un composant en panne est arrêté puis relancé seul, avec un délai exponentiel entre
+deux tentatives. L'état en mémoire (RoundStore, stratégies, index) n'appartient à aucun
+composant : il survit aux relances de Chrome, sans relecture de l'historique en DB.
+Un chien de garde repère la boucle bloquée dans un appel WebDriver qui ne rend pas la main.
+"""
+import logging
+import random
+import threading
+import time
+
+from metrics import REGISTRY
+
+COMPONENT_RESTARTS = REGISTRY.counter("jetx_component_restarts_total", "Relances d'un composant par le superviseur")
+WATCHDOG_STALLS = REGISTRY.counter("jetx_watchdog_stalls_total", "Boucles bloquées détectées par le chien de garde")
+
+class Backoff:
+    """
+    Délai exponentiel avec gigue : initial, initial * factor, ... plafonné à `maximum`.
+    Un composant resté en marche plus de `reset_after` secondes repart du délai initial.
+    """
+
+    def __init__(self, initial=2.0, maximum=120.0, factor=2.0, jitter=0.2, reset_after=300.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.reset_after = reset_after
+        self.attempts = 0
+        self._started_at = None
+
+    def started(self):
+        self._started_at = time.monotonic()
+
+    def next_delay(self):
+        if self._started_at is not None and time.monotonic() - self._started_at >= self.reset_after:
+            self.attempts = 0
+        self._started_at = None
+        delay = min(self.maximum, self.initial * self.factor ** self.attempts)
+        self.attempts += 1
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+class Watchdog:
+    """
+    Thread qui appelle `on_stall(âge)` si `arm()` n'a pas été appelé depuis `timeout`
+    secondes, une seule fois par blocage. La boucle principale le réarme à chaque
+    itération et le désarme pendant le login et les relances, qui ne sont pas surveillés.
+    """
+
+    def __init__(self, timeout, on_stall):
+        self.timeout = timeout
+        self.on_stall = on_stall
+        self.stalled = False
+        self._armed = False
+        self._last_beat = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="watchdog", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def arm(self):
+        self.stalled = False
+        self._last_beat = time.monotonic()
+        self._armed = True
+
+    def disarm(self):
+        self._armed = False
+
+    def _run(self):
+        while not self._stop.wait(min(5.0, self.timeout / 4)):
+            age = time.monotonic() - self._last_beat
+            if self._armed and not self.stalled and age > self.timeout:
+                self.stalled = True
+                WATCHDOG_STALLS.inc()
+                logging.error(f"Chien de garde : boucle bloquée depuis {age:.0f} s.")
+                try:
+                    self.on_stall(age)
+                except Exception as e:
+                    logging.error(f"Chien de garde : {e}")
+
+class Component:
+    """
+    Composant supervisé : démarrage, arrêt et test de santé (facultatif) fournis par
+    l'appelant. Le test de santé peut lever une exception pour donner la raison de la relance.
+    """
+
+    def __init__(self, name, start, stop, healthy=None, backoff=None):
+        self.name = name
+        self._start = start
+        self._stop = stop
+        self._healthy = healthy
+        self.backoff = backoff or Backoff()
+        self.running = False
+        self.restarts = 0
+        self.last_error = None
+
+    def start(self):
+        self._start()
+        self.running = True
+        self.backoff.started()
+
+    def stop(self):
+        self.running = False
+        try:
+            self._stop()
+        except Exception as e:
+            logging.warning(f"Arrêt de {self.name} : {e}")
+
+    def healthy(self):
+        if not self.running:
+            return False
+        if self._healthy is None:
+            return True
+        try:
+            return bool(self._healthy())
+        except Exception as e:
+            self.last_error = e
+            return False
+
+class Supervisor:
+    """Démarre les composants dans l'ordre, relance ceux qui tombent, les arrête en ordre inverse."""
+
+    def __init__(self):
+        self.components = {}
+        self._stopping = threading.Event()
+
+    def add(self, component):
+        self.components[component.name] = component
+        return component
+
+    def start(self, name):
+        """Démarre le composant, en réessayant avec backoff jusqu'au succès (ou à l'arrêt)."""
+        component = self.components[name]
+        while not self._stopping.is_set():
+            try:
+                component.start()
+                return True
+            except Exception as e:
+                component.last_error = e
+                component.stop()
+                delay = component.backoff.next_delay()
+                logging.error(f"Démarrage de {name} impossible : {e} ; nouvel essai dans {delay:.0f} s.")
+                self._stopping.wait(delay)
+        return False
+
+    def start_all(self):
+        return all(self.start(name) for name in self.components)
+
+    def restart(self, name, reason):
+        component = self.components[name]
+        component.stop()
+        component.restarts += 1
+        COMPONENT_RESTARTS.inc(component=name)
+        delay = component.backoff.next_delay()
+        logging.warning(f"Relance de {name} dans {delay:.0f} s ({reason}).")
+        if self._stopping.wait(delay):
+            return False
+        return self.start(name)
+
+    def check(self, names=None):
+        """
+        Relance les composants en mauvaise santé (tous, ou seulement `names`) ; renvoie les
+        noms relancés. Une relance attend son backoff dans le thread appelant.
+        """
+        restarted = []
+        for name, component in self.components.items():
+            if names is not None and name not in names:
+                continue
+            if not self._stopping.is_set() and not component.healthy():
+                reason = component.last_error or "test de santé en échec"
+                component.last_error = None
+                self.restart(name, reason)
+                restarted.append(name)
+        return restarted
+
+    def stop_all(self):
+        self._stopping.set()
+        for component in reversed(list(self.components.values())):
+            component.stop()